@@ -1,42 +1,788 @@
+import logging
+
+from analysis_state import (
+    DevelopmentState,
+    fit_mack
+)
+
 from chainladder import Triangle
 
-from PyQt5.QtCore import Qt
+from engine import (
+    EXPOSURE_METHODS,
+    METHODS,
+    ReservingTask,
+    run_tasks
+)
+
+from PyQt5.QtCore import (
+    QAbstractTableModel,
+    QModelIndex,
+    Qt,
+    QThreadPool
+)
+
+from PyQt5.QtGui import QFont
 
 from PyQt5.QtWidgets import (
     QComboBox,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSpinBox,
+    QSplitter,
+    QTableView,
     QTabWidget,
-    QVBoxLayout
+    QVBoxLayout,
+    QWidget
 )
 
+from simulation import run_bootstrap
+
 from triangle_model import (
-    TriangleModel,
+    create_triangle_model,
+    SHADED_COLOR,
     TriangleView
 )
 
+from worker import Worker
+
+RESULT_HEADERS = ["LOB", "Method", "Latest", "Ultimate", "IBNR", "Mack S.E.", "Seconds"]
+
+SIMULATION_HEADERS = ["LOB", "Simulations", "Mean IBNR", "Std. Dev.", "CV", "75%", "95%", "99.5%", "Seconds"]
+
+# Rows below the origins of a LinkRatioModel, and columns after its factors.
+FACTOR_ROWS = ["Average", "Selected", "CDF"]
+ORIGIN_COLUMNS = ["Latest", "Ultimate", "IBNR", "Mack S.E."]
+
+
+class TriangleSlices:
+    """
+    Splits a triangle by the values of one of its index levels, e.g., LOB, and by column. A triangle without
+    that level, e.g., one saved for a single LOB, is a single slice named Total. The index is scanned
+    once, when the object is created; the slices and their DataFrames are then built on first use and kept, so
+    that asking for the same LOB and column again is a dictionary lookup. One instance can be shared by every
+    tab that shows the same source triangle.
+
+    slices = TriangleSlices(clrd, level="LOB")
+    slices.get("wkcomp", "CumPaidLoss")
+    """
+    def __init__(self, triangle: Triangle, level: str = "lob"):
+        self.triangle = triangle
+        self.columns = list(triangle.columns)
+
+        # Index labels are matched regardless of case, e.g., lob and LOB.
+        key_labels = [label.lower() for label in triangle.key_labels]
+
+        # Maps each value of the level to the positions of the index keys that have it.
+        self.positions = {}
+        if level.lower() in key_labels:
+            level_position = key_labels.index(level.lower())
+            self.level = triangle.key_labels[level_position]
+            for position, value in enumerate(triangle.kdims[:, level_position].tolist()):
+                self.positions.setdefault(value, []).append(position)
+        else:
+            self.level = None
+            self.positions["Total"] = list(range(len(triangle.kdims)))
+
+        self._column_positions = {column: i for i, column in enumerate(self.columns)}
+
+        self._slices = {}
+        self._totals = {}
+        self._frames = {}
+
+    @property
+    def lobs(self) -> list:
+        return list(self.positions)
+
+    def get(self, lob, column: str) -> Triangle:
+        """
+        Returns the part of the triangle with the given value of the level and the given column, i.e.,
+        triangle[triangle[level] == lob][column].
+        :param lob:
+        :param column:
+        :return:
+        """
+        key = (lob, column)
+
+        triangle = self._slices.get(key)
+        if triangle is None:
+            triangle = self.triangle.iloc[self.positions[lob], self._column_positions[column]]
+            self._slices[key] = triangle
+
+        return triangle
+
+    def total(self, lob, column: str) -> Triangle:
+        """
+        Returns the sum of the index keys of a slice, e.g., of every company writing the LOB. This is the triangle
+        that the link ratios and the engine's fits are based on, so it is also the one that is displayed.
+        :param lob:
+        :param column:
+        :return:
+        """
+        key = (lob, column)
+
+        triangle = self._totals.get(key)
+        if triangle is None:
+            triangle = self.get(lob, column).sum(axis=0)
+            self._totals[key] = triangle
+
+        return triangle
+
+    def frame(self, lob, column: str, key: int = 0):
+        """
+        Returns one index key of a slice, by position, as an origin by development DataFrame.
+        :param lob:
+        :param column:
+        :param key:
+        :return:
+        """
+        frame_key = (lob, column, key)
+
+        frame = self._frames.get(frame_key)
+        if frame is None:
+            frame = self.get(lob, column).iloc[key].to_frame()
+            self._frames[frame_key] = frame
+
+        return frame
+
+
+class ReserveResultsModel(QAbstractTableModel):
+    """
+    Table model holding one row per reserving result, totalled over origins. Rows are appended as results
+    arrive from the engine, rather than the model being reset, so that the view keeps its scroll position.
+    """
+    def __init__(self):
+        super(ReserveResultsModel, self).__init__()
+        self._rows = []
+
+    def add_result(self, result: dict):
+        """
+        Appends a result of engine.fit_task.
+        :param result:
+        :return:
+        """
+        if "error" in result:
+            totals = [result["error"], "", "", ""]
+        else:
+            totals = [
+                "{:,.0f}".format(sum(value for value in result.get(name, []) if value is not None))
+                for name in ("latest", "ultimate", "ibnr")
+            ]
+            # Only Mack fits have a standard error.
+            totals.append(
+                "{:,.0f}".format(result["total_mack_std_err"]) if "total_mack_std_err" in result else ""
+            )
+
+        row = [str(result["label"]), METHODS[result["method"]]] + totals + ["%.3f" % result["seconds"]]
+
+        position = len(self._rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.append(row)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self.endResetModel()
+
+    def data(self, index, role=None):
+        if role == Qt.DisplayRole:
+            return self._rows[index.row()][index.column()]
+
+        if role == Qt.TextAlignmentRole and index.column() >= 2:
+            return Qt.AlignRight
+
+    def rowCount(self, parent=None, *args, **kwargs):
+        return len(self._rows)
+
+    def columnCount(self, parent=None, *args, **kwargs):
+        return len(RESULT_HEADERS)
+
+    def headerData(self, p_int, qt_orientation, role=None):
+        if role == Qt.DisplayRole and qt_orientation == Qt.Horizontal:
+            return RESULT_HEADERS[p_int]
+
+
+class SimulationResultsModel(QAbstractTableModel):
+    """
+    Table model holding one row per bootstrap summary, i.e., the distribution of one LOB's total IBNR. Rows are
+    appended as each LOB's simulations complete.
+    """
+    def __init__(self):
+        super(SimulationResultsModel, self).__init__()
+        self._rows = []
+
+    def add_summary(self, summary: dict):
+        """
+        Appends a summary of simulation.run_bootstrap.
+        :param summary:
+        :return:
+        """
+        if "error" in summary:
+            row = [str(summary["label"]), summary["error"]] + [""] * (len(SIMULATION_HEADERS) - 3) + [
+                "%.2f" % summary["seconds"]
+            ]
+            self._append(row)
+            return
+
+        cv = summary["std"] / summary["mean"] if summary["mean"] else float("nan")
+
+        row = [
+            str(summary["label"]),
+            "{:,}".format(summary["n_sims"]),
+            "{:,.0f}".format(summary["mean"]),
+            "{:,.0f}".format(summary["std"]),
+            "{:.3f}".format(cv)
+        ] + [
+            "{:,.0f}".format(summary["percentiles"][percentile]) for percentile in (75, 95, 99.5)
+        ] + [
+            "%.2f" % summary["seconds"]
+        ]
+
+        self._append(row)
+
+    def _append(self, row: list):
+        position = len(self._rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.append(row)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self.endResetModel()
+
+    def data(self, index, role=None):
+        if role == Qt.DisplayRole:
+            return self._rows[index.row()][index.column()]
+
+        if role == Qt.TextAlignmentRole and index.column() >= 1:
+            return Qt.AlignRight
+
+    def rowCount(self, parent=None, *args, **kwargs):
+        return len(self._rows)
+
+    def columnCount(self, parent=None, *args, **kwargs):
+        return len(SIMULATION_HEADERS)
+
+    def headerData(self, p_int, qt_orientation, role=None):
+        if role == Qt.DisplayRole and qt_orientation == Qt.Horizontal:
+            return SIMULATION_HEADERS[p_int]
+
+
+class BootstrapPanel(QWidget):
+    """
+    Controls for bootstrap ODP simulations of every LOB, and the table their summaries stream into.
+    """
+    def __init__(self):
+        super().__init__()
+
+        self.sims_box = QSpinBox()
+        self.sims_box.setRange(100, 1000000)
+        self.sims_box.setSingleStep(1000)
+        self.sims_box.setValue(10000)
+        self.sims_box.setGroupSeparatorShown(True)
+
+        # simulations with the same seed are identical, whichever engine runs them
+        self.seed_box = QSpinBox()
+        self.seed_box.setRange(0, 2 ** 31 - 1)
+        self.seed_box.setValue(42)
+
+        self.simulate_button = QPushButton("Simulate")
+        self.simulate_button.setToolTip("Bootstrap the IBNR of every LOB of the current column.")
+
+        self.results_model = SimulationResultsModel()
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_model)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Simulations:"))
+        controls.addWidget(self.sims_box)
+        controls.addWidget(QLabel("Seed:"))
+        controls.addWidget(self.seed_box)
+        controls.addWidget(self.simulate_button)
+        controls.addStretch()
+
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.results_view)
+
+        self.setLayout(layout)
+
+
+class LinkRatioModel(QAbstractTableModel):
+    """
+    Table model displaying a DevelopmentState: link ratios by origin and age, followed by the average, selected
+    and cumulative factors of each age, and the latest, ultimate, IBNR and Mack standard error of each origin.
+    Excluding a link ratio or editing a selected factor updates the state in place, and only the cells that
+    changed are repainted, along with the Mack standard errors, which are refitted after every edit.
+    """
+    def __init__(self, state: DevelopmentState):
+        super(LinkRatioModel, self).__init__()
+        self.state = state
+
+        self.n_origins = len(state.origins)
+        self.n_factors = len(state.ages) - 1
+
+        self._column_headers = [
+            "%s-%s" % (age, next_age) for age, next_age in zip(state.ages[:-1], state.ages[1:])
+        ] + ORIGIN_COLUMNS
+        self._row_headers = list(state.origins) + FACTOR_ROWS
+
+        self._excluded_font = QFont()
+        self._excluded_font.setStrikeOut(True)
+        self._override_font = QFont()
+        self._override_font.setBold(True)
+
+    def data(self, index, role=None):
+        row = index.row()
+        column = index.column()
+
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            value = self._value(row, column)
+            if value is None or value != value:
+                return ""
+            if column >= self.n_factors:
+                return "{:,.0f}".format(value)
+            return "{:.3f}".format(value)
+
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight
+
+        if row < self.n_origins and column < self.n_factors and self.state.excluded[row, column]:
+            if role == Qt.FontRole:
+                return self._excluded_font
+            if role == Qt.BackgroundRole:
+                return SHADED_COLOR
+
+        if role == Qt.FontRole and row == self.n_origins + 1 and column in self.state.overrides:
+            return self._override_font
+
+    def setData(self, index, value, role=None):
+        # Only the selected factors can be edited. Clearing one reverts it to the average.
+        if role != Qt.EditRole or not self.flags(index) & Qt.ItemIsEditable:
+            return False
+
+        value = str(value).strip()
+
+        try:
+            changes = self.state.set_selected(index.column(), float(value) if value else None)
+        except ValueError:
+            return False
+
+        self.emit_changes(changes)
+
+        return True
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+        if index.row() == self.n_origins + 1 and index.column() < self.n_factors:
+            flags |= Qt.ItemIsEditable
+
+        return flags
+
+    def toggle_exclusion(self, index):
+        """
+        Excludes the link ratio at index from its average, or includes it again.
+        :param index:
+        :return:
+        """
+        row = index.row()
+        column = index.column()
+
+        if row >= self.n_origins or column >= self.n_factors or not self.state.observed[row, column]:
+            return
+
+        self.emit_changes(self.state.toggle_exclusion(row, column))
+
+    def emit_changes(self, changes: dict):
+        """
+        Repaints the cells changed by an edit of the state, i.e., the averages through CDFs of the ages
+        affected and the projections of the origins affected. Every sigma feeds the extrapolated ones, so an edit
+        changes the Mack standard error of nearly every origin; they are refitted and repainted in full.
+        :param changes: As returned by the DevelopmentState edit methods.
+        :return:
+        """
+        ages = changes["ages"]
+        origins = changes["origins"]
+
+        fit_mack([self.state])
+        mack_column = self.columnCount() - 1
+        # noinspection PyUnresolvedReferences
+        self.dataChanged.emit(self.index(0, mack_column), self.index(self.n_origins - 1, mack_column))
+        # noinspection PyUnresolvedReferences
+        self.headerDataChanged.emit(Qt.Horizontal, mack_column, mack_column)
+
+        if ages:
+            # noinspection PyUnresolvedReferences
+            self.dataChanged.emit(self.index(0, min(ages)), self.index(self.rowCount() - 1, max(ages)))
+
+        if origins:
+            # noinspection PyUnresolvedReferences
+            self.dataChanged.emit(
+                self.index(min(origins), self.n_factors),
+                self.index(max(origins), self.columnCount() - 1)
+            )
+
+    def rowCount(self, parent=None, *args, **kwargs):
+        return self.n_origins + len(FACTOR_ROWS)
+
+    def columnCount(self, parent=None, *args, **kwargs):
+        return self.n_factors + len(ORIGIN_COLUMNS)
+
+    def headerData(self, p_int, qt_orientation, role=None):
+        if role == Qt.DisplayRole:
+            if qt_orientation == Qt.Horizontal:
+                return self._column_headers[p_int]
+
+            if qt_orientation == Qt.Vertical:
+                return self._row_headers[p_int]
+
+        if role == Qt.ToolTipRole and qt_orientation == Qt.Horizontal and p_int == self.columnCount() - 1:
+            if not self.state.mack_is_current:
+                return None
+            return "Total Mack S.E.: {:,.0f}".format(self.state.total_mack_std_err)
+
+    def _value(self, row: int, column: int):
+        state = self.state
+
+        if row < self.n_origins:
+            if column < self.n_factors:
+                return state.link_ratios[row, column]
+            if column == self.columnCount() - 1:
+                # Fitted by the tab and after each edit, never while painting.
+                return state.mack_std_err[row] if state.mack_is_current else None
+            return (state.latest, state.ultimate, state.ibnr)[column - self.n_factors][row]
+
+        if column >= self.n_factors:
+            return None
+
+        return (state.averages, state.selected, state.cdf)[row - self.n_origins][column]
+
+
+class LinkRatioView(QTableView):
+    """
+    Table view of a LinkRatioModel. Double-clicking a link ratio excludes it from its average, or includes it
+    again; double-clicking a selected factor edits it.
+    """
+    def __init__(self):
+        super().__init__()
+
+        self.setEditTriggers(QTableView.DoubleClicked | QTableView.EditKeyPressed)
+
+        # noinspection PyUnresolvedReferences
+        self.doubleClicked.connect(self.toggle_exclusion)
+
+    def toggle_exclusion(self, index):
+        model = self.model()
+        if model is not None:
+            model.toggle_exclusion(index)
+
 
 class AnalysisTab(QTabWidget):
-    def __init__(self, triangle: Triangle = None, lob: str = None, column=None):
+    def __init__(
+            self,
+            triangle: Triangle = None,
+            lob: str = None,
+            column=None,
+            slices: TriangleSlices = None
+    ):
         super().__init__()
 
-        self.triangle = triangle
+        # Tabs opened on the same source triangle can share one TriangleSlices.
+        self.slices = slices or TriangleSlices(triangle)
+        self.triangle = self.slices.triangle
+
+        self.lob = lob if lob is not None else self.slices.lobs[0]
+        self.column = column if column is not None else self.slices.columns[0]
+
+        # Models are kept per LOB and column, so that switching back to one is a lookup. So are the development
+        # states, which keep the exclusions and selections made for each LOB and column, along with the Mack
+        # standard errors of their current fit.
+        self.models = {}
+        self.link_ratio_models = {}
 
         self.layout = QVBoxLayout()
 
+        # holds a list of the LOBs of the triangle
+        self.lob_box = QComboBox()
+        self.lob_box.setFixedWidth(200)
+        self.lob_box.addItems([str(lob) for lob in self.slices.lobs])
+        self.lob_box.setCurrentIndex(self.slices.lobs.index(self.lob))
+
         # holds a list of the columns of the triangle
         self.column_box = QComboBox()
         self.column_box.setFixedWidth(200)
-        self.column_box.addItems(list(self.triangle.columns))
+        self.column_box.addItems(self.slices.columns)
+        self.column_box.setCurrentIndex(self.slices.columns.index(self.column))
+
+        # reserving method fitted to every LOB by the run button
+        self.method_box = QComboBox()
+        self.method_box.setFixedWidth(200)
+        for method, display_name in METHODS.items():
+            if method != "development":
+                self.method_box.addItem(display_name, method)
 
-        self.triangle = triangle[triangle['lob'] == lob][column]
+        # column used as the exposure of the Bornhuetter-Ferguson and Cape Cod methods
+        self.exposure_box = QComboBox()
+        self.exposure_box.setFixedWidth(200)
+        self.exposure_box.addItems(self.slices.columns)
+        premium_columns = [column for column in self.slices.columns if "prem" in column.lower()]
+        if premium_columns:
+            self.exposure_box.setCurrentIndex(self.slices.columns.index(premium_columns[0]))
+
+        self.run_button = QPushButton("Run")
+        self.run_button.setToolTip("Fit the selected method to every LOB of the current column.")
+
+        # average of the link ratios, used for the selected factors that are not overridden
+        self.average_box = QComboBox()
+        self.average_box.setFixedWidth(200)
+        self.average_box.addItem("Volume-weighted", "volume")
+        self.average_box.addItem("Simple", "simple")
 
         self.triangle_view = TriangleView()
+        self.link_ratio_view = LinkRatioView()
+
+        self.results_model = ReserveResultsModel()
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_model)
+
+        self.bootstrap_panel = BootstrapPanel()
+
+        # reserving results and bootstrap simulations share the bottom of the tab
+        self.output_tabs = QTabWidget()
+        self.output_tabs.addTab(self.results_view, "Reserves")
+        self.output_tabs.addTab(self.bootstrap_panel, "Bootstrap")
+
+        self.worker = None
+        self.simulation_worker = None
+
+        self.show_slice(self.lob, self.column)
+
+        # noinspection PyUnresolvedReferences
+        self.lob_box.currentIndexChanged.connect(self.lob_changed)
+        # noinspection PyUnresolvedReferences
+        self.column_box.currentIndexChanged.connect(self.column_changed)
+        # noinspection PyUnresolvedReferences
+        self.average_box.currentIndexChanged.connect(self.average_changed)
+        # noinspection PyUnresolvedReferences
+        self.method_box.currentIndexChanged.connect(self.toggle_exposure)
+        # noinspection PyUnresolvedReferences
+        self.run_button.clicked.connect(self.run_all_lobs)
+        # noinspection PyUnresolvedReferences
+        self.bootstrap_panel.simulate_button.clicked.connect(self.simulate_all_lobs)
+
+        self.toggle_exposure()
 
-        self.triangle_frame = self.triangle.to_frame()
+        box_layout = QHBoxLayout()
+        box_layout.addWidget(self.lob_box)
+        box_layout.addWidget(self.column_box)
+        box_layout.addWidget(self.average_box)
+        box_layout.addWidget(self.method_box)
+        box_layout.addWidget(self.exposure_box)
+        box_layout.addWidget(self.run_button)
 
-        self.triangle_model = TriangleModel(self.triangle_frame)
-        self.triangle_view.setModel(self.triangle_model)
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.triangle_view)
+        splitter.addWidget(self.link_ratio_view)
+        splitter.addWidget(self.output_tabs)
+        splitter.setStretchFactor(0, 1)
 
-        self.layout.addWidget(self.column_box, alignment=Qt.AlignRight)
-        self.layout.addWidget(self.triangle_view)
+        self.layout.addLayout(box_layout)
+        self.layout.setAlignment(box_layout, Qt.AlignRight)
+        self.layout.addWidget(splitter)
 
         self.setLayout(self.layout)
+
+    def show_slice(self, lob, column: str):
+        """
+        Displays the triangle of an LOB and column, creating its model the first time it is shown.
+        :param lob:
+        :param column:
+        :return:
+        """
+        self.lob = lob
+        self.column = column
+
+        model = self.models.get((lob, column))
+        if model is None:
+            model = create_triangle_model(self.slices.total(lob, column))
+            self.models[(lob, column)] = model
+
+        self.triangle_model = model
+        self.triangle_view.setModel(model)
+
+        # The Mack standard errors of every LOB of the column are computed together, the first time the column is
+        # shown, so moving between its LOBs only shows results that are already there.
+        self.fit_mack(column)
+
+        self.link_ratio_model = self.get_link_ratio_model(lob, column)
+        self.link_ratio_view.setModel(self.link_ratio_model)
+
+    def get_link_ratio_model(self, lob, column: str) -> LinkRatioModel:
+        """
+        Returns the link ratio model of an LOB and column, creating its development state the first time.
+        :param lob:
+        :param column:
+        :return:
+        """
+        link_ratio_model = self.link_ratio_models.get((lob, column))
+        if link_ratio_model is None:
+            link_ratio_model = LinkRatioModel(
+                DevelopmentState(self.slices.get(lob, column), average=self.average_box.currentData())
+            )
+            self.link_ratio_models[(lob, column)] = link_ratio_model
+
+        return link_ratio_model
+
+    def fit_mack(self, column: str):
+        """
+        Computes the Mack standard errors of every LOB of a column in one stacked fit. LOBs whose fit has not
+        changed since their standard errors were computed are skipped.
+        :param column:
+        :return:
+        """
+        fit_mack([self.get_link_ratio_model(lob, column).state for lob in self.slices.lobs])
+
+    def lob_changed(self, index: int):
+        self.show_slice(self.slices.lobs[index], self.column)
+
+    def column_changed(self, index: int):
+        self.show_slice(self.lob, self.slices.columns[index])
+
+    def average_changed(self, index: int):
+        # Every LOB and column of the tab uses the same average.
+        for model in self.link_ratio_models.values():
+            model.beginResetModel()
+            model.state.set_average(self.average_box.itemData(index))
+
+        self.fit_mack(self.column)
+
+        for model in self.link_ratio_models.values():
+            model.endResetModel()
+
+    def toggle_exposure(self):
+        self.exposure_box.setEnabled(self.method_box.currentData() in EXPOSURE_METHODS)
+
+    def create_tasks(self) -> list:
+        """
+        Returns one task per LOB, fitting the selected method to the current column.
+        :return:
+        """
+        method = self.method_box.currentData()
+        exposure_column = self.exposure_box.currentText() if method in EXPOSURE_METHODS else None
+
+        return [
+            ReservingTask(
+                label=lob,
+                triangle=self.slices.get(lob, self.column),
+                method=method,
+                exposure=self.slices.get(lob, exposure_column) if exposure_column else None
+            )
+            for lob in self.slices.lobs
+        ]
+
+    def run_all_lobs(self):
+        """
+        Fits the selected method to every LOB on the engine chosen with Select Engine, off the GUI thread. Each
+        result is added to the results table as soon as it completes.
+        :return:
+        """
+        self.results_model.clear()
+        self.run_button.setEnabled(False)
+
+        tasks = self.create_tasks()
+
+        self.worker = self.start_task(
+            run_tasks,
+            tasks,
+            on_result=self.run_finished,
+            on_partial_result=self.results_model.add_result,
+            # Also when the engine fails, e.g., if a pool process dies, so that the fit can be run again.
+            on_finished=lambda: self.run_button.setEnabled(True),
+            message="Fitting %s to %s LOBs..." % (self.method_box.currentText(), len(tasks))
+        )
+
+    def simulate_all_lobs(self):
+        """
+        Runs bootstrap simulations of every LOB of the current column, with batches spread over the engine chosen
+        with Select Engine. Each LOB's summary is added to the bootstrap table as soon as its batches are done.
+        :return:
+        """
+        panel = self.bootstrap_panel
+        panel.results_model.clear()
+        panel.simulate_button.setEnabled(False)
+
+        segments = [(lob, self.slices.get(lob, self.column)) for lob in self.slices.lobs]
+
+        self.simulation_worker = self.start_task(
+            run_bootstrap,
+            segments,
+            n_sims=panel.sims_box.value(),
+            seed=panel.seed_box.value(),
+            on_partial_result=panel.results_model.add_summary,
+            on_finished=lambda: panel.simulate_button.setEnabled(True),
+            message="Simulating %s LOBs..." % len(segments)
+        )
+
+    def start_task(
+            self,
+            fn,
+            *args,
+            on_result=None,
+            on_partial_result=None,
+            on_finished=None,
+            message: str = None,
+            **kwargs
+    ):
+        """
+        Runs fn(*args, **kwargs) off the GUI thread, through the main window's run_task if the tab is in the
+        main window.
+        :param fn:
+        :param args:
+        :param on_result:
+        :param on_partial_result:
+        :param on_finished: Called once fn has returned or raised.
+        :param message: Status bar message displayed while the task runs.
+        :param kwargs:
+        :return: The worker.
+        """
+        main_window = self.window()
+
+        if hasattr(main_window, "run_task"):
+            return main_window.run_task(
+                fn,
+                *args,
+                on_result=on_result,
+                on_partial_result=on_partial_result,
+                on_finished=on_finished,
+                message=message,
+                **kwargs
+            )
+
+        # The tab is shown on its own, e.g., outside of the main window.
+        worker = Worker(fn, *args, **kwargs)
+        worker.setAutoDelete(False)
+        if on_partial_result is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.partial_result.connect(on_partial_result)
+        if on_result is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.result.connect(on_result)
+        if on_finished is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.finished.connect(on_finished)
+        QThreadPool.globalInstance().start(worker)
+
+        return worker
+
+    def run_finished(self, results: list):
+        errors = [result for result in results if "error" in result]
+        if errors:
+            logging.warning("%s of %s fits failed, e.g., %s: %s" % (
+                len(errors),
+                len(results),
+                errors[0]["label"],
+                errors[0]["error"]
+            ))
@@ -0,0 +1,252 @@
+"""
+Development analysis that is updated in place as the user edits it. The stages of a chainladder analysis depend
+on each other column by column:
+
+triangle -> link ratios -> averages -> selected LDFs -> CDFs -> ultimates -> IBNR
+
+Excluding a link ratio only changes the average of its own development column; overriding a selection only
+changes that column's selected factor. The CDFs of that age and the ages before it change, and so do the
+ultimates of the origins whose latest diagonal falls at one of those ages. DevelopmentState keeps every stage
+and, after an edit, recomputes only those parts, so an edit costs O(origins + ages) rather than a refit.
+
+Mack's standard errors depend on every stage, so they are not updated in place. fit_mack computes them for many
+states at once, e.g., every LOB of a review, and stores them with the revision of the development fit they came
+from; they are only computed again once an edit has changed that fit.
+
+This module does not import Qt. The table model that displays and edits a DevelopmentState is in analysis.py.
+"""
+import copy
+import numpy as np
+
+from native import (
+    AVERAGES,
+    cumulative_values,
+    diagonal_index,
+    mack_chainladder,
+    origin_labels,
+    segment_total
+)
+
+
+class DevelopmentState:
+    """
+    State of the development analysis of one segment, e.g., one LOB and column.
+
+    state = DevelopmentState(raa)
+    state.exclude("1982", 12)
+    state.override(24, 1.5)
+    state.ibnr
+    """
+    def __init__(self, triangle, average: str = "volume"):
+        if average not in AVERAGES:
+            raise ValueError("Unsupported average: " + str(average) + ". Expected one of " + ", ".join(AVERAGES))
+
+        self.average = average
+
+        self.origins = origin_labels(triangle)
+        self.ages = [int(age) for age in triangle.ddims]
+
+        self._origin_positions = {origin: i for i, origin in enumerate(self.origins)}
+        self._age_positions = {age: i for i, age in enumerate(self.ages)}
+
+        # Axes (origin, development).
+        self.values = segment_total(cumulative_values(triangle))
+
+        current = self.values[:, :-1]
+        following = self.values[:, 1:]
+
+        # Zero cells are treated as empty, as in chainladder. These stages never change.
+        self.observed = ~np.isnan(current) & ~np.isnan(following) & (current != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.link_ratios = np.where(self.observed, following / np.where(self.observed, current, 1), np.nan)
+
+        self.excluded = np.zeros(self.link_ratios.shape, dtype=bool)
+        self.overrides = {}
+
+        # Incremented by every edit, to tell whether the Mack standard errors are those of the current fit.
+        self.revision = 0
+        self.mack_revision = None
+        self.mack_std_err = np.full(len(self.origins), np.nan)
+        self.total_mack_std_err = np.nan
+
+        self.diagonal = diagonal_index(self.values)
+        latest = self.values[np.arange(len(self.origins)), self.diagonal]
+        self.latest = np.where(latest == 0, np.nan, latest)
+
+        n_factors = len(self.ages) - 1
+
+        self.averages = np.ones(n_factors)
+        self.selected = np.ones(n_factors)
+        self.cdf = np.ones(n_factors + 1)
+        self.ultimate = np.full(len(self.origins), np.nan)
+        self.ibnr = np.full(len(self.origins), np.nan)
+
+        self.recompute()
+
+    def recompute(self):
+        """
+        Recomputes every stage from the link ratios, e.g., after changing the average.
+        :return:
+        """
+        self.revision += 1
+
+        for age_position in range(len(self.averages)):
+            self._update_average(age_position)
+        self.selected[:] = self.averages
+        for age_position, value in self.overrides.items():
+            self.selected[age_position] = value
+        self._update_downstream(len(self.averages) - 1)
+
+        # Origins on the last age are fully developed, so no edit changes them after this.
+        self.ultimate[:] = self.latest * self.cdf[self.diagonal]
+        self.ibnr[:] = self.ultimate - self.latest
+
+    @property
+    def mack_is_current(self) -> bool:
+        return self.mack_revision == self.revision
+
+    def copy(self):
+        """
+        Returns a copy that does not share arrays with this state, e.g., to be read on a worker thread while this
+        one is edited.
+        :return:
+        """
+        state = copy.copy(self)
+        state.__dict__.update({
+            name: value.copy() for name, value in vars(self).items() if isinstance(value, (np.ndarray, dict))
+        })
+        return state
+
+    def set_average(self, average: str):
+        if average not in AVERAGES:
+            raise ValueError("Unsupported average: " + str(average) + ". Expected one of " + ", ".join(AVERAGES))
+
+        self.average = average
+        self.recompute()
+
+    def exclude(self, origin, age: int, excluded: bool = True) -> dict:
+        """
+        Excludes the link ratio of an origin starting at an age, e.g., the 12-24 factor of 1982, from the average
+        of its column, or includes it again.
+        :param origin: e.g., '1982'
+        :param age: Starting age of the factor, e.g., 12.
+        :param excluded:
+        :return: The positions of the origins and ages whose values changed, see _update_downstream.
+        """
+        return self.set_excluded(self._origin_positions[str(origin)], self._age_positions[int(age)], excluded)
+
+    def override(self, age: int, value: float = None) -> dict:
+        """
+        Selects a factor for an age instead of the average, or, if value is None, reverts to the average.
+        :param age: Starting age of the factor, e.g., 12.
+        :param value:
+        :return: The positions of the origins and ages whose values changed, see _update_downstream.
+        """
+        return self.set_selected(self._age_positions[int(age)], value)
+
+    def set_excluded(self, origin_position: int, age_position: int, excluded: bool = True) -> dict:
+        """
+        As exclude, by position in the link ratio matrix.
+        :param origin_position:
+        :param age_position:
+        :param excluded:
+        :return:
+        """
+        if self.excluded[origin_position, age_position] == excluded:
+            return {"origins": [], "ages": []}
+
+        self.excluded[origin_position, age_position] = excluded
+        self.revision += 1
+        self._update_average(age_position)
+
+        if age_position in self.overrides:
+            # The selection does not follow the average, so nothing downstream changes.
+            return {"origins": [], "ages": [age_position]}
+
+        self.selected[age_position] = self.averages[age_position]
+
+        return self._update_downstream(age_position)
+
+    def toggle_exclusion(self, origin_position: int, age_position: int) -> dict:
+        return self.set_excluded(
+            origin_position,
+            age_position,
+            excluded=not self.excluded[origin_position, age_position]
+        )
+
+    def set_selected(self, age_position: int, value: float = None) -> dict:
+        """
+        As override, by position in the link ratio matrix.
+        :param age_position:
+        :param value:
+        :return:
+        """
+        self.revision += 1
+
+        if value is None:
+            self.overrides.pop(age_position, None)
+            self.selected[age_position] = self.averages[age_position]
+        else:
+            self.overrides[age_position] = float(value)
+            self.selected[age_position] = float(value)
+
+        return self._update_downstream(age_position)
+
+    def _update_average(self, age_position: int):
+        used = self.observed[:, age_position] & ~self.excluded[:, age_position]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.average == "volume":
+                average = (
+                    self.values[used, age_position + 1].sum() / self.values[used, age_position].sum()
+                )
+            else:
+                average = self.link_ratios[used, age_position].sum() / used.sum()
+
+        # Columns with every factor excluded get a factor of 1, as in native.fit_development.
+        self.averages[age_position] = average if np.isfinite(average) else 1.0
+
+    def _update_downstream(self, age_position: int) -> dict:
+        # The CDFs of this age and the ages before it change, and with them the ultimates of the origins whose
+        # latest diagonal is at one of those ages.
+        following_cdf = self.cdf[age_position + 1]
+        self.cdf[:age_position + 1] = np.cumprod(self.selected[age_position::-1])[::-1] * following_cdf
+
+        origins = np.nonzero(self.diagonal <= age_position)[0]
+        self.ultimate[origins] = self.latest[origins] * self.cdf[self.diagonal[origins]]
+        self.ibnr[origins] = self.ultimate[origins] - self.latest[origins]
+
+        return {"origins": origins.tolist(), "ages": list(range(age_position + 1))}
+
+
+def fit_mack(states: list) -> list:
+    """
+    Computes Mack's standard errors of the states whose development fit changed since they were last computed.
+    States with the same average and shape, e.g., the LOBs of one column, are stacked and fitted in one pass.
+    Exclusions are left out of the sigmas, as chainladder's drop is, and the selected factors are used to project.
+    :param states: DevelopmentStates
+    :return: The states that were fitted.
+    """
+    groups = {}
+    for state in states:
+        if not state.mack_is_current:
+            groups.setdefault((state.average, state.values.shape), []).append(state)
+
+    fitted = []
+    for (average, shape), group in groups.items():
+        results = mack_chainladder(
+            np.stack([state.values for state in group]),
+            average=average,
+            excluded=np.stack([state.excluded for state in group]),
+            ldf=np.stack([state.selected for state in group]),
+            diagonal=np.stack([state.diagonal for state in group])
+        )
+
+        for position, state in enumerate(group):
+            state.mack_std_err = results["mack_std_err"][position]
+            state.total_mack_std_err = float(results["total_mack_std_err"][position])
+            state.mack_revision = state.revision
+
+        fitted.extend(group)
+
+    return fitted
@@ -1,9 +1,23 @@
 import configparser
+import logging
 import os
+import profiler
 import schema
 import sqlalchemy as sa
+import threading
+import time
+
+from constants import (
+    CONFIG_PATH,
+    DEFAULT_SQLITE_PROFILE,
+    QT_FILEPATH_OPTION,
+    SQLITE_JOURNAL_MODES,
+    SQLITE_PRAGMAS,
+    SQLITE_PROFILES,
+    SQLITE_SYNCHRONOUS_LEVELS
+)
 
-from constants import CONFIG_PATH, QT_FILEPATH_OPTION
+from functools import partial
 
 from schema import (
     CountryTable,
@@ -11,13 +25,6 @@ from schema import (
     StateTable,
 )
 
-from project_item import ProjectItem
-
-from PyQt5.Qt import (
-    QColor,
-    QStandardItem
-)
-
 from PyQt5.QtWidgets import (
     QDialog,
     QDialogButtonBox,
@@ -29,6 +36,14 @@ from PyQt5.QtWidgets import (
 
 from sqlalchemy.orm import sessionmaker
 
+from sqlalchemy.pool import QueuePool
+
+# Engines and session factories are created once per database file and shared by the whole process, so that
+# repeated project operations reuse pooled connections.
+_engines = {}
+_session_factories = {}
+_registry_lock = threading.Lock()
+
 
 class ConnectionDialog(QDialog):
 
@@ -77,28 +92,24 @@ class ConnectionDialog(QDialog):
 
         db_filename = filename[0]
 
-        if os.path.isfile(db_filename):
-            os.remove(db_filename)
-
-        if not db_filename == "":
-            engine = sa.create_engine(
-                'sqlite:///' + filename[0],
-                echo=True
+        if db_filename != "":
+            main_window.run_task(
+                create_db,
+                db_filename,
+                on_result=lambda result: ConnectionDialog.db_created(main_window=main_window),
+                message="Creating " + db_filename + "..."
             )
-            # session = sessionmaker(bind=engine)
-            schema.Base.metadata.create_all(engine)
-            # session = session()
-            connection = engine.connect()
-            connection.close()
 
             self.close()
 
-        if db_filename != "":
-            main_window.connection_established = True
-            main_window.toggle_project_actions()
-
         return db_filename
 
+    @staticmethod
+    def db_created(main_window):
+        main_window.statusBar().showMessage("Database created.", 5000)
+        main_window.connection_established = True
+        main_window.menu_bar.toggle_project_actions()
+
     def open_existing_db(self, main_window):
         db_filename = QFileDialog.getOpenFileName(
             self,
@@ -116,88 +127,278 @@ class ConnectionDialog(QDialog):
 
 
 def populate_project_tree(db_filename, main_window):
+    """
+    Loads the countries of a database into the project tree. The query runs on the main window's thread
+    pool; states and LOBs are read later, as their parents are expanded.
+    :param db_filename:
+    :param main_window:
+    :return:
+    """
+    start_time = time.perf_counter()
+
+    def build(countries):
+        with profiler.span("ProjectTreeModel.set_database", category="model", countries=len(countries)):
+            main_window.project_model.set_database(db_filename, countries)
+
+        elapsed = time.perf_counter() - start_time
+        message = "Loaded %s countries in %.3f seconds." % (len(countries), elapsed)
+        logging.info(message)
+        main_window.statusBar().showMessage(message, 5000)
+
+        main_window.db = db_filename
+        main_window.connection_established = True
+        main_window.menu_bar.toggle_project_actions()
+
+    main_window.run_task(
+        fetch_project_nodes,
+        db_filename,
+        0,
+        on_result=build,
+        message="Opening " + db_filename + "..."
+    )
 
-    session, connection = connect_db(db_path=db_filename)
 
-    countries = session.query(
-        CountryTable.country_id,
-        CountryTable.country_name,
-        CountryTable.project_tree_uuid
-    ).all()
+def fetch_project_nodes(db_filename, level: int, country_id: int = None, state_id: int = None) -> list:
+    """
+    Returns the (id, name, project_tree_uuid, has_children) rows of one level of the project tree: all
+    countries (level 0), the states of a country (level 1) or the LOBs of a state (level 2). has_children is
+    determined with an EXISTS subquery, so children are not read. Safe to call from a worker thread.
+    :param db_filename:
+    :param level:
+    :param country_id:
+    :param state_id:
+    :return:
+    """
+    with profiler.span("fetch_project_nodes", category="db", level=level):
+        return _fetch_project_nodes(db_filename, level, country_id, state_id)
 
-    for country_id, country, country_uuid in countries:
 
-        country_item = ProjectItem(
-            country,
-            set_bold=True
-        )
+def _fetch_project_nodes(db_filename, level: int, country_id: int = None, state_id: int = None) -> list:
+    session, connection = connect_db(db_path=db_filename)
 
-        country_row = [
-            country_item,
-            QStandardItem(country_uuid)
-        ]
+    if level == 0:
+        has_states = sa.exists().where(StateTable.country_id == CountryTable.country_id)
+        query = session.query(
+            CountryTable.country_id,
+            CountryTable.country_name,
+            CountryTable.project_tree_uuid,
+            has_states
+        ).order_by(
+            CountryTable.country_id
+        )
 
-        states = session.query(
+    elif level == 1:
+        has_lobs = sa.exists().where(
+            LOBTable.country_id == StateTable.country_id
+        ).where(
+            LOBTable.state_id == StateTable.state_id
+        )
+        query = session.query(
             StateTable.state_id,
             StateTable.state_name,
-            StateTable.project_tree_uuid
+            StateTable.project_tree_uuid,
+            has_lobs
         ).filter(
             StateTable.country_id == country_id
+        ).order_by(
+            StateTable.state_id
         )
 
-        for state_id, state, state_uuid in states:
+    else:
+        query = session.query(
+            LOBTable.lob_id,
+            LOBTable.lob_type,
+            LOBTable.project_tree_uuid,
+            sa.false()
+        ).filter(
+            LOBTable.country_id == country_id
+        ).filter(
+            LOBTable.state_id == state_id
+        ).order_by(
+            LOBTable.lob_id
+        )
 
-            state_item = ProjectItem(
-                state,
-            )
+    rows = [tuple(row) for row in query.all()]
+
+    session.close()
+    connection.close()
 
-            state_row = [state_item, QStandardItem(state_uuid)]
+    return rows
 
-            lobs = session.query(
-                LOBTable.lob_type, LOBTable.project_tree_uuid
-            ).filter(
-                LOBTable.country_id == country_id
-            ).filter(
-                LOBTable.state_id == state_id
+
+def create_db(db_filename):
+    """
+    Creates a new, empty project database, replacing any file with the same name. Safe to call from a worker
+    thread.
+    :param db_filename:
+    :return:
+    """
+    if os.path.isfile(db_filename):
+        dispose_engine(db_path=db_filename)
+        os.remove(db_filename)
+
+    engine = get_engine(db_path=db_filename)
+    schema.Base.metadata.create_all(engine)
+
+
+def connect_db(db_path: str):
+    """
+    Returns a new session and a connection, both drawn from the shared engine of the database. Closing them
+    returns their connections to the pool.
+    :param db_path:
+    :return:
+    """
+    session = get_session_factory(db_path=db_path)()
+    connection = get_engine(db_path=db_path).connect()
+    return session, connection
+
+
+def get_engine(db_path: str, echo=False):
+    """
+    Returns the engine of a database file, creating it on first use. Connections are pooled and have the
+    pragmas in SQLITE_PRAGMAS, followed by those of the connection profile in the configuration file, applied
+    when they are opened. Files from earlier versions are upgraded to the current schema when their engine is
+    created.
+    :param db_path:
+    :param echo: Whether to log every statement, only taken into account when the engine is created.
+    :return:
+    """
+    db_path = os.path.abspath(db_path)
+
+    with _registry_lock:
+        engine = _engines.get(db_path)
+
+        if engine is None:
+            engine = sa.create_engine(
+                'sqlite:///' + db_path,
+                echo=echo,
+                poolclass=QueuePool,
+                pool_size=5,
+                max_overflow=10,
+                # Pooled connections may be handed to a different thread than the one that created them.
+                connect_args={'check_same_thread': False}
             )
+            pragmas = dict(SQLITE_PRAGMAS, **get_database_config(CONFIG_PATH)["pragmas"])
+            sa.event.listen(engine, "connect", partial(set_sqlite_pragmas, pragmas=pragmas))
+            if profiler.is_enabled():
+                profiler.instrument_engine(engine)
+            _engines[db_path] = engine
 
-            for lob, lob_uuid in lobs:
-                lob_item = ProjectItem(
-                    lob,
-                    text_color=QColor(155, 0, 0)
-                )
+            schema.upgrade_schema(engine)
 
-                lob_row = [lob_item, QStandardItem(lob_uuid)]
+    return engine
 
-                state_item.appendRow(lob_row)
 
-            country_item.appendRow(state_row)
+def get_session_factory(db_path: str):
+    """
+    Returns the session factory bound to the shared engine of a database file.
+    :param db_path:
+    :return:
+    """
+    db_path = os.path.abspath(db_path)
 
-        main_window.project_root.appendRow(country_row)
+    factory = _session_factories.get(db_path)
 
-    main_window.project_pane.expandAll()
+    if factory is None:
+        engine = get_engine(db_path=db_path)
+        with _registry_lock:
+            factory = _session_factories.setdefault(db_path, sessionmaker(bind=engine))
 
-    connection.close()
+    return factory
 
-    main_window.connection_established = True
-    main_window.menu_bar.toggle_project_actions()
 
+def dispose_engine(db_path: str):
+    """
+    Closes the pooled connections of a database file and removes it from the registry, e.g., before the file
+    is deleted or replaced.
+    :param db_path:
+    :return:
+    """
+    db_path = os.path.abspath(db_path)
 
-def connect_db(db_path: str):
-    engine = sa.create_engine(
-        'sqlite:///' + db_path,
-        echo=True
-    )
-    session = sessionmaker(bind=engine)()
-    connection = engine.connect()
-    return session, connection
+    with _registry_lock:
+        engine = _engines.pop(db_path, None)
+        _session_factories.pop(db_path, None)
+
+    if engine is not None:
+        engine.dispose()
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record=None, pragmas: dict = None):
+    # Listener for the engine's connect event. Works on sqlite3 connections too.
+    cursor = dbapi_connection.cursor()
+    for pragma, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        cursor.execute("PRAGMA %s = %s" % (pragma, value))
+    cursor.close()
 
 
-def get_startup_db_path():
-    config_path = CONFIG_PATH
+def get_database_config(config_path: str = CONFIG_PATH) -> dict:
+    """
+    Returns the SQLite connection profile of the configuration file, see SQLITE_PROFILES. Pragmas set in the
+    DATABASE section override those of the profile. Files written before the section existed, and invalid
+    values, get the defaults.
+    :param config_path:
+    :return: profile, and the pragmas to apply to each connection.
+    """
     config = configparser.ConfigParser()
     config.read(config_path)
-    config.sections()
-    startup_db = config['STARTUP_CONNECTION']['startup_db']
 
-    return startup_db
+    profile = config.get("DATABASE", "profile", fallback=DEFAULT_SQLITE_PROFILE)
+    if profile not in SQLITE_PROFILES:
+        logging.warning("Unknown database profile %s, using %s." % (profile, DEFAULT_SQLITE_PROFILE))
+        profile = DEFAULT_SQLITE_PROFILE
+
+    pragmas = dict(SQLITE_PROFILES[profile])
+
+    for pragma in pragmas:
+        if not config.has_option("DATABASE", pragma):
+            continue
+
+        value = config.get("DATABASE", pragma).strip()
+
+        # Values end up in PRAGMA statements, so only known ones are let through.
+        if pragma == "journal_mode":
+            valid = value.upper() in SQLITE_JOURNAL_MODES
+        elif pragma == "synchronous":
+            valid = value.upper() in SQLITE_SYNCHRONOUS_LEVELS
+        else:
+            valid = value.lstrip("-").isdigit()
+
+        if valid:
+            pragmas[pragma] = value.upper() if pragma in ("journal_mode", "synchronous") else int(value)
+        else:
+            logging.warning("Invalid %s in the database settings: %s." % (pragma, value))
+
+    return {
+        "profile": profile,
+        "pragmas": pragmas
+    }
+
+
+def set_database_config(profile: str, pragmas: dict = None, config_path: str = CONFIG_PATH):
+    """
+    Saves the SQLite connection profile, and any pragmas that override it. Engines created from then on use
+    them; those already open keep their settings until the application is restarted.
+    :param profile: One of SQLITE_PROFILES.
+    :param pragmas: e.g., {"busy_timeout": 10000}
+    :param config_path:
+    :return:
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError("Unsupported database profile: " + str(profile))
+
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    # The section is rewritten, so that overrides from an earlier profile do not carry over.
+    config.remove_section("DATABASE")
+    config.add_section("DATABASE")
+
+    config["DATABASE"]["profile"] = profile
+    for pragma, value in (pragmas or {}).items():
+        if pragma not in SQLITE_PROFILES[profile]:
+            raise ValueError("Unsupported database setting: " + str(pragma))
+        config["DATABASE"][pragma] = str(value)
+
+    with open(config_path, 'w') as configfile:
+        config.write(configfile)
@@ -1,22 +1,79 @@
 import os
 from os.path import dirname
-from PyQt5.QtWidgets import QFileDialog
 
 BUILD_VERSION = "0.0.0"
 
-if "PYCHARM_HOSTED" in os.environ:
-    QT_FILEPATH_OPTION = QFileDialog.DontUseNativeDialog
-else:
-    QT_FILEPATH_OPTION = QFileDialog.ShowDirsOnly
+
+def __getattr__(name):
+    # QT_FILEPATH_OPTION is looked up on first use, so that modules without a GUI, e.g., engine.py in worker
+    # processes, can import the constants without loading Qt.
+    if name == "QT_FILEPATH_OPTION":
+        from PyQt5.QtWidgets import QFileDialog
+
+        if "PYCHARM_HOSTED" in os.environ:
+            return QFileDialog.DontUseNativeDialog
+        return QFileDialog.ShowDirsOnly
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 SETTINGS_LIST = [
     "Startup",
+    "Database",
     "User"
 ]
 
+# Applied to every new SQLite connection, whatever its profile.
+SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY"
+}
+
+# Connection profiles, chosen in the DATABASE section of the configuration file, whose pragmas are applied after
+# SQLITE_PRAGMAS. busy_timeout is in milliseconds, a negative cache_size is in KiB, and mmap_size is in bytes.
+# personal: the settings used before profiles were added, i.e., a rollback journal and a 16 MB cache, plus a
+# busy timeout, for one user.
+# shared: write-ahead logging, so that readers do not block the writer or each other, for several users of a
+# database on the local disk of the machine they run on.
+# network_share: a rollback journal, since write-ahead logging needs shared memory that network file systems do
+# not provide, and a long busy timeout, so that users wait for each other's locks rather than fail.
+SQLITE_PROFILES = {
+    "personal": {
+        "busy_timeout": 5000,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 0
+    },
+    "shared": {
+        "busy_timeout": 30000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 268435456
+    },
+    "network_share": {
+        "busy_timeout": 60000,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -64000,
+        "mmap_size": 0
+    }
+}
+
+DEFAULT_SQLITE_PROFILE = "personal"
+
+SQLITE_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "WAL")
+
+SQLITE_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
 ROOT_PATH = dirname(dirname(os.path.realpath(__file__)))
 
 CONFIG_PATH = os.path.join(ROOT_PATH, 'faslr.ini')
 
+# Directory of the on-disk triangle cache, see triangle_cache.py, and the size it is trimmed to.
+CACHE_PATH = os.path.join(ROOT_PATH, 'cache')
+
+CACHE_MAX_BYTES = 1 << 30
+
 TEMPLATES_PATH = os.path.join(dirname(os.path.realpath(__file__)), 'templates')
@@ -0,0 +1,357 @@
+"""
+Execution backends for reserving. A fit of one method to one segment, e.g., one LOB and column, is a task, and
+an engine runs a list of tasks either in the calling thread, on a thread pool or on a pool of processes, yielding
+each result as soon as it completes. Processes sidestep the GIL for chainladder's pure-Python overhead, so a
+portfolio of LOBs can use every core of the machine. The native backend runs in the calling thread, but fits the
+methods that native.py implements with NumPy instead of chainladder, which is the quickest option for interactive
+use.
+
+This module does not import Qt, so that worker processes start quickly. The dialog for choosing the engine is in
+engine_dialog.py.
+"""
+import configparser
+import multiprocessing
+import os
+import threading
+import time
+
+from concurrent.futures import (
+    as_completed,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
+)
+
+from constants import CONFIG_PATH
+
+from functools import partial
+
+from native import (
+    fit_triangle,
+    NATIVE_METHODS
+)
+
+# Available backends, as (config value, display name).
+BACKENDS = {
+    "in_process": "In-process",
+    "native": "Native (NumPy)",
+    "thread": "Thread pool",
+    "process": "Process pool"
+}
+
+DEFAULT_BACKEND = "in_process"
+
+# Backends that fit tasks on a pool of workers.
+POOL_BACKENDS = ("thread", "process")
+
+# Reserving methods that can be fitted by an engine, as (name, display name).
+METHODS = {
+    "development": "Development",
+    "chainladder": "Chainladder",
+    "bornhuetter_ferguson": "Bornhuetter-Ferguson",
+    "cape_cod": "Cape Cod",
+    "mack": "Mack Chainladder"
+}
+
+# Methods that need an exposure, e.g., earned premium, passed as the sample_weight of chainladder.
+EXPOSURE_METHODS = ("bornhuetter_ferguson", "cape_cod")
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+class ReservingTask:
+    """
+    One method to fit to one segment. The triangle must be picklable to run on a process pool, which chainladder
+    triangles and ArrayTriangles are.
+    """
+    __slots__ = ("label", "triangle", "method", "exposure", "params")
+
+    def __init__(self, label, triangle, method: str = "chainladder", exposure=None, params: dict = None):
+        if method not in METHODS:
+            raise ValueError("Unknown method: " + str(method) + ". Expected one of " + ", ".join(METHODS))
+
+        self.label = label
+        self.triangle = triangle
+        self.method = method
+        self.exposure = exposure
+        self.params = params or {}
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class ReservingEngine:
+    """
+    Runs reserving tasks on one of the BACKENDS.
+
+    engine = ReservingEngine(backend="process")
+    for result in engine.run(tasks):
+        print(result["label"], result["ibnr"])
+    """
+    def __init__(self, backend: str = DEFAULT_BACKEND, max_workers: int = None):
+        if backend not in BACKENDS:
+            raise ValueError("Unknown backend: " + str(backend) + ". Expected one of " + ", ".join(BACKENDS))
+
+        self.backend = backend
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def run(self, tasks: list):
+        """
+        Yields the result of each task as it completes, which for the pool backends need not be the order of
+        tasks. A task that raises does not stop the others; its result has an error entry instead.
+        :param tasks:
+        :return:
+        """
+        return self.map(partial(fit_task, native=self.backend == "native"), tasks)
+
+    def map(self, fn, items: list):
+        """
+        Yields fn(item) for each item as it completes. On the process backend, fn must be a top-level function,
+        or a partial of one, and items must be picklable.
+        :param fn:
+        :param items:
+        :return:
+        """
+        items = list(items)
+
+        if self.backend not in POOL_BACKENDS or len(items) <= 1:
+            for item in items:
+                yield fn(item)
+            return
+
+        executor = self._get_executor()
+        futures = [executor.submit(fn, item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def shutdown(self):
+        """
+        Stops the pool's workers. The engine can still be used afterwards, with a new pool.
+        :return:
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _get_executor(self):
+        # The pool is created on first use and reused, since starting worker processes is slow.
+        with self._lock:
+            if self._executor is None:
+                if self.backend == "thread":
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                else:
+                    # Workers are spawned rather than forked, since forking a process running Qt is unsafe.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+            return self._executor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        return False
+
+
+def fit_task(task: ReservingTask, native: bool = False) -> dict:
+    """
+    Fits a task's method and summarizes the result by origin. Errors are returned rather than raised, so that
+    they can be reported alongside the results of other tasks.
+    :param task:
+    :param native: Use native.py for the methods it implements, and chainladder for the others.
+    :return: A dictionary with the task's label and method, and per-origin lists of latest, ultimate and ibnr.
+    Development fits have ldf and cdf instead, and Mack fits also include mack_std_err.
+    """
+    start_time = time.perf_counter()
+
+    result = {
+        "label": task.label,
+        "method": task.method,
+        "pid": os.getpid()
+    }
+
+    try:
+        if native and task.method in NATIVE_METHODS:
+            result.update(_fit_native(task))
+        else:
+            result.update(_fit(task))
+    except Exception as error:
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+
+    result["seconds"] = time.perf_counter() - start_time
+
+    return result
+
+
+def run_tasks(
+        tasks: list,
+        engine: ReservingEngine = None,
+        progress_callback=None,
+        partial_result_callback=None
+) -> list:
+    """
+    Runs tasks on an engine and collects their results. Meant to be run with MainWindow.run_task, which passes
+    the callbacks, so that each result is shown as soon as it is available.
+    :param tasks:
+    :param engine: Defaults to the engine selected in the configuration file.
+    :param progress_callback: Called with (tasks completed, total tasks).
+    :param partial_result_callback: Called with each result as it completes.
+    :return: The results, in the order in which they completed.
+    """
+    tasks = list(tasks)
+    engine = engine or get_reserving_engine()
+
+    results = []
+    for result in engine.run(tasks):
+        results.append(result)
+        if partial_result_callback is not None:
+            partial_result_callback(result)
+        if progress_callback is not None:
+            progress_callback(len(results), len(tasks))
+
+    return results
+
+
+def get_reserving_engine(config_path: str = CONFIG_PATH) -> ReservingEngine:
+    """
+    Returns the engine selected in the configuration file. The engine is shared, so that its pool, and the
+    chainladder import in each of its worker processes, are reused across runs. It is replaced when the
+    configuration changes.
+    :param config_path:
+    :return:
+    """
+    global _shared_engine
+
+    config = get_engine_config(config_path)
+    max_workers = config["max_workers"] or None
+
+    with _shared_engine_lock:
+        engine = _shared_engine
+        if (
+                engine is None or
+                engine.backend != config["backend"] or
+                engine.max_workers != (max_workers or os.cpu_count() or 1)
+        ):
+            if engine is not None:
+                engine.shutdown()
+            engine = ReservingEngine(backend=config["backend"], max_workers=max_workers)
+            _shared_engine = engine
+
+    return engine
+
+
+def get_engine_config(config_path: str = CONFIG_PATH) -> dict:
+    """
+    Returns the engine settings of the configuration file. Files written before the ENGINE section existed
+    get the defaults.
+    :param config_path:
+    :return: backend and max_workers, where 0 means one worker per CPU.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    backend = config.get("ENGINE", "backend", fallback=DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        backend = DEFAULT_BACKEND
+
+    return {
+        "backend": backend,
+        "max_workers": config.getint("ENGINE", "max_workers", fallback=0)
+    }
+
+
+def set_engine_config(backend: str, max_workers: int = 0, config_path: str = CONFIG_PATH):
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    if not config.has_section("ENGINE"):
+        config.add_section("ENGINE")
+
+    config["ENGINE"]["backend"] = backend
+    config["ENGINE"]["max_workers"] = str(max_workers)
+
+    with open(config_path, 'w') as configfile:
+        config.write(configfile)
+
+
+def _fit(task: ReservingTask) -> dict:
+    import chainladder as cl
+
+    triangle = _to_chainladder(task.triangle)
+
+    # A segment with several index keys, e.g., the companies of an LOB, is fitted on its total.
+    if triangle.shape[0] > 1:
+        triangle = triangle.sum()
+
+    if task.method in EXPOSURE_METHODS and task.exposure is None:
+        raise ValueError(METHODS[task.method] + " requires an exposure.")
+
+    params = dict(task.params)
+
+    exposure = None
+    if task.method in EXPOSURE_METHODS:
+        exposure = _to_chainladder(task.exposure)
+        if exposure.shape[0] > 1:
+            exposure = exposure.sum()
+        # chainladder expects one exposure per origin, e.g., earned premium at the latest valuation.
+        if exposure.shape[-1] > 1:
+            exposure = exposure.latest_diagonal
+
+    if task.method == "development":
+        model = cl.Development(**params).fit(triangle)
+        return {
+            "origins": [],
+            "ldf": model.ldf_.values[0, 0, 0].tolist(),
+            "cdf": model.cdf_.values[0, 0, 0].tolist()
+        }
+
+    if task.method == "chainladder":
+        model = cl.Chainladder(**params).fit(triangle)
+    elif task.method == "mack":
+        model = cl.MackChainladder(**params).fit(triangle)
+    elif task.method == "bornhuetter_ferguson":
+        params.setdefault("apriori", 1.0)
+        model = cl.BornhuetterFerguson(**params).fit(triangle, sample_weight=exposure)
+    else:
+        model = cl.CapeCod(**params).fit(triangle, sample_weight=exposure)
+
+    summary = {
+        "origins": [str(origin) for origin in triangle.origin],
+        "latest": _first_segment(triangle.latest_diagonal),
+        "ultimate": _first_segment(model.ultimate_),
+        "ibnr": _first_segment(model.ibnr_)
+    }
+
+    if task.method == "mack":
+        summary["mack_std_err"] = _first_segment(model.mack_std_err_)
+        summary["total_mack_std_err"] = float(model.total_mack_std_err_.values.ravel()[0])
+
+    return summary
+
+
+def _fit_native(task: ReservingTask) -> dict:
+    params = {name: task.params[name] for name in ("average", "apriori") if name in task.params}
+
+    return fit_triangle(task.triangle, method=task.method, exposure=task.exposure, **params)
+
+
+def _to_chainladder(triangle):
+    # ArrayTriangles, e.g., from the triangle cache or store, are converted in the worker.
+    if hasattr(triangle, "to_chainladder"):
+        return triangle.to_chainladder()
+    return triangle
+
+
+def _first_segment(triangle) -> list:
+    # Values of the first index key and column at the last development age, by origin. Empty cells become None.
+    values = triangle.values[0, 0, :, -1]
+    return [None if value != value else float(value) for value in values.tolist()]
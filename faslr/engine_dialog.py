@@ -0,0 +1,79 @@
+import os
+
+from constants import CONFIG_PATH
+
+from engine import (
+    BACKENDS,
+    get_engine_config,
+    POOL_BACKENDS,
+    set_engine_config
+)
+
+from PyQt5.QtWidgets import (
+    QComboBox,
+    QDialog,
+    QDialogButtonBox,
+    QFormLayout,
+    QSpinBox
+)
+
+
+class EngineDialog(QDialog):
+    """
+    Dialog box for selecting the backend that reserving methods are fitted on, and its number of workers.
+    """
+    def __init__(self, parent=None, config_path: str = CONFIG_PATH):
+        super().__init__(parent)
+
+        self.config_path = config_path
+        config = get_engine_config(config_path)
+
+        self.setWindowTitle("Select Engine")
+
+        self.backend_box = QComboBox()
+        for backend, display_name in BACKENDS.items():
+            self.backend_box.addItem(display_name, backend)
+        self.backend_box.setCurrentIndex(list(BACKENDS).index(config["backend"]))
+
+        # 0 is shown as Automatic, i.e., one worker per CPU.
+        self.workers_box = QSpinBox()
+        self.workers_box.setRange(0, 4 * (os.cpu_count() or 1))
+        self.workers_box.setSpecialValueText("Automatic (%s)" % (os.cpu_count() or 1))
+        self.workers_box.setValue(config["max_workers"])
+
+        self.layout = QFormLayout()
+        self.layout.addRow("Backend:", self.backend_box)
+        self.layout.addRow("Workers:", self.workers_box)
+
+        button_layout = QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+
+        self.button_box = QDialogButtonBox(button_layout)
+        # noinspection PyUnresolvedReferences
+        self.button_box.accepted.connect(self.save_engine)
+        # noinspection PyUnresolvedReferences
+        self.button_box.rejected.connect(self.reject)
+
+        # noinspection PyUnresolvedReferences
+        self.backend_box.currentIndexChanged.connect(self.toggle_workers)
+        self.toggle_workers()
+
+        self.layout.addWidget(self.button_box)
+
+        self.setLayout(self.layout)
+
+    def toggle_workers(self):
+        # only the pool backends have workers
+        self.workers_box.setEnabled(self.backend_box.currentData() in POOL_BACKENDS)
+
+    def save_engine(self):
+        set_engine_config(
+            backend=self.backend_box.currentData(),
+            max_workers=self.workers_box.value(),
+            config_path=self.config_path
+        )
+
+        parent = self.parent()
+        if parent is not None and hasattr(parent, "statusBar"):
+            parent.statusBar().showMessage("Reserving engine set to " + self.backend_box.currentText() + ".", 5000)
+
+        self.accept()
@@ -0,0 +1,595 @@
+"""
+Export of analyses to Parquet, CSV or Excel. An export is made of four long-format tables:
+
+triangles    cumulative values by origin and age
+link_ratios  age-to-age link ratios, and whether each one is excluded from its average
+selections   average, selected and cumulative factors by age
+results      latest diagonal, ultimate, IBNR and Mack standard error by origin
+
+Rows are produced one segment at a time, e.g., one LOB and column of an analysis tab or one triangle of the
+project database, and handed to the writer in chunks of CHUNK_SIZE rows, so that the tables are never held in
+memory in full. CSV and Parquet exports write one file per table, next to the chosen path; Excel exports write one
+workbook with a sheet per table. Parquet needs pyarrow and Excel needs openpyxl, both imported on first use.
+
+export_project(db_path, "review.parquet", "parquet")
+"""
+import csv
+import json
+import logging
+import numpy as np
+import os
+import profiler
+import time
+
+from analysis_state import fit_mack
+
+from connection import get_session_factory
+
+from constants import QT_FILEPATH_OPTION
+
+from native import (
+    cumulative_values,
+    mack_chainladder
+)
+
+from PyQt5.QtWidgets import QFileDialog
+
+from schema import (
+    CountryTable,
+    LOBTable,
+    StateTable,
+    TriangleTable
+)
+
+from triangle_store import triangle_from_row
+
+# File dialog filter of each export format.
+EXPORT_FORMATS = {
+    "parquet": "Parquet (*.parquet)",
+    "csv": "CSV (*.csv)",
+    "xlsx": "Excel (*.xlsx)"
+}
+
+# Rows handed to the writer at a time, i.e., the size of a Parquet row group.
+CHUNK_SIZE = 50000
+
+# Rows of an Excel sheet, below the header. Longer tables continue on another sheet.
+EXCEL_MAX_ROWS = 1048575
+
+# Columns of each exported table, and their Parquet types.
+TABLES = {
+    "triangles": (
+        ("source", "string"),
+        ("key", "string"),
+        ("column", "string"),
+        ("origin", "string"),
+        ("development", "int64"),
+        ("value", "float64")
+    ),
+    "link_ratios": (
+        ("source", "string"),
+        ("key", "string"),
+        ("column", "string"),
+        ("origin", "string"),
+        ("development", "int64"),
+        ("link_ratio", "float64"),
+        ("excluded", "bool")
+    ),
+    "selections": (
+        ("source", "string"),
+        ("key", "string"),
+        ("column", "string"),
+        ("development", "int64"),
+        ("average", "float64"),
+        ("selected", "float64"),
+        ("cdf", "float64"),
+        ("overridden", "bool")
+    ),
+    "results": (
+        ("source", "string"),
+        ("key", "string"),
+        ("column", "string"),
+        ("origin", "string"),
+        ("latest", "float64"),
+        ("ultimate", "float64"),
+        ("ibnr", "float64"),
+        ("mack_std_err", "float64")
+    )
+}
+
+
+def write_export(
+        segments,
+        path: str,
+        export_format: str,
+        total: int = None,
+        chunk_size: int = CHUNK_SIZE,
+        progress_callback=None
+) -> dict:
+    """
+    Writes the tables of an export, see TABLES, from an iterable of segments.
+    :param segments: Dicts of arrays, as made by state_segments and project_segments. Consumed one at a time.
+    :param path: The workbook of an Excel export, or the path the file of each table is named after, e.g.,
+    review.csv becomes review_triangles.csv, review_link_ratios.csv, etc.
+    :param export_format: One of EXPORT_FORMATS.
+    :param total: Number of segments, for the progress callback.
+    :param chunk_size: Rows per chunk.
+    :param progress_callback: Called with (segments written, total).
+    :return: The files written and the number of rows of each table.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError("Unsupported export format: " + str(export_format))
+
+    start_time = time.perf_counter()
+
+    writer = EXPORT_WRITERS[export_format](path)
+
+    buffers = {table: [] for table in TABLES}
+    row_counts = {table: 0 for table in TABLES}
+
+    try:
+        with profiler.span("write export", category="db", format=export_format):
+            n_segments = 0
+            for n_segments, segment in enumerate(segments, start=1):
+                for table, rows in segment_rows(segment).items():
+                    buffer = buffers[table]
+                    buffer.extend(rows)
+                    while len(buffer) >= chunk_size:
+                        writer.write(table, buffer[:chunk_size])
+                        row_counts[table] += chunk_size
+                        del buffer[:chunk_size]
+
+                if progress_callback is not None:
+                    progress_callback(n_segments, total or n_segments)
+
+            for table, buffer in buffers.items():
+                if buffer or not row_counts[table]:
+                    writer.write(table, buffer)
+                    row_counts[table] += len(buffer)
+    finally:
+        writer.close()
+
+    summary = {
+        "files": writer.files,
+        "segments": n_segments,
+        "rows": row_counts,
+        "seconds": time.perf_counter() - start_time
+    }
+
+    logging.info("Exported %s rows of %s segments to %s in %.3f seconds." % (
+        sum(row_counts.values()),
+        n_segments,
+        ", ".join(writer.files),
+        summary["seconds"]
+    ))
+
+    return summary
+
+
+def export_analysis(states: dict, path: str, export_format: str, progress_callback=None) -> dict:
+    """
+    Writes the development states of an analysis tab, see state_segments. Meant to be run with
+    MainWindow.run_task, on copies of the states, see DevelopmentState.copy.
+    :param states:
+    :param path:
+    :param export_format:
+    :param progress_callback:
+    :return:
+    """
+    segments = state_segments(states)
+
+    return write_export(
+        segments,
+        path,
+        export_format,
+        total=len(segments),
+        progress_callback=progress_callback
+    )
+
+
+def export_project(db_path: str, path: str, export_format: str, progress_callback=None) -> dict:
+    """
+    Writes every triangle of a project database, see project_segments. Safe to call from a worker thread.
+    :param db_path:
+    :param path:
+    :param export_format:
+    :param progress_callback:
+    :return:
+    """
+    session = get_session_factory(db_path)()
+    try:
+        triangle_ids = [row.triangle_id for row in session.query(TriangleTable.triangle_id).all()]
+
+        return write_export(
+            project_segments(session, triangle_ids),
+            path,
+            export_format,
+            total=len(triangle_ids),
+            progress_callback=progress_callback
+        )
+    finally:
+        session.close()
+
+
+def state_segments(states: dict) -> list:
+    """
+    Returns one segment per development state of an analysis, with its exclusions and selections. The Mack
+    standard errors of states whose fit changed are computed first, so this is best run off the GUI thread, on
+    copies of the states.
+    :param states: DevelopmentStates by (LOB, column), e.g., from the link ratio models of an AnalysisTab.
+    :return:
+    """
+    fit_mack(list(states.values()))
+
+    segments = []
+    for (lob, column), state in states.items():
+        overridden = np.zeros(len(state.selected), dtype=bool)
+        overridden[list(state.overrides)] = True
+
+        segments.append({
+            "source": str(lob),
+            "keys": [""],
+            "columns": [str(column)],
+            "origins": list(state.origins),
+            "ages": list(state.ages),
+            "values": state.values[np.newaxis].copy(),
+            "link_ratios": state.link_ratios[np.newaxis].copy(),
+            "excluded": state.excluded[np.newaxis].copy(),
+            "averages": state.averages[np.newaxis].copy(),
+            "selected": state.selected[np.newaxis].copy(),
+            "cdf": state.cdf[np.newaxis].copy(),
+            "overridden": overridden[np.newaxis],
+            "latest": state.latest[np.newaxis].copy(),
+            "ultimate": state.ultimate[np.newaxis].copy(),
+            "ibnr": state.ibnr[np.newaxis].copy(),
+            "mack_std_err": state.mack_std_err[np.newaxis].copy()
+        })
+
+    return segments
+
+
+def project_segments(session, triangle_ids: list):
+    """
+    Yields one segment per triangle of the project database, holding every index key and column of the
+    triangle. Triangles are read one at a time, and each one is fitted in a single pass with volume-weighted
+    factors and no exclusions. Segments are named after the triangle's place in the project tree, e.g.,
+    USA/Texas/Auto, or after the triangle if it has no LOB.
+    :param session:
+    :param triangle_ids:
+    :return:
+    """
+    lob_paths = {
+        lob_id: "/".join(str(name) for name in (country, state, lob) if name)
+        for lob_id, country, state, lob in session.query(
+            LOBTable.lob_id,
+            CountryTable.country_name,
+            StateTable.state_name,
+            LOBTable.lob_type
+        ).outerjoin(
+            CountryTable,
+            CountryTable.country_id == LOBTable.country_id
+        ).outerjoin(
+            StateTable,
+            StateTable.state_id == LOBTable.state_id
+        ).all()
+    }
+
+    for triangle_id in triangle_ids:
+        row = session.query(TriangleTable).filter(TriangleTable.triangle_id == triangle_id).one()
+        triangle = triangle_from_row(row)
+
+        # The session would otherwise keep every triangle's values in memory until the export is done.
+        session.expunge(row)
+
+        # Axes (key and column, origin, development).
+        values = cumulative_values(triangle)
+        n_keys, n_columns = values.shape[:2]
+        values = values.reshape((-1,) + values.shape[2:])
+
+        results = mack_chainladder(values)
+
+        current = values[..., :-1]
+        following = values[..., 1:]
+        observed = ~np.isnan(current) & ~np.isnan(following) & (current != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            link_ratios = np.where(observed, following / np.where(observed, current, 1), np.nan)
+
+        cdf = np.ones(results["ldf"].shape[:-1] + (values.shape[-1],))
+        cdf[..., :-1] = np.cumprod(results["ldf"][..., ::-1], axis=-1)[..., ::-1]
+
+        yield {
+            "source": lob_paths.get(row.lob_id) or row.name or str(triangle_id),
+            "keys": [json.dumps(key) for key in triangle.kdims.tolist() for _ in range(n_columns)],
+            "columns": [str(column) for column in triangle.vdims] * n_keys,
+            "origins": list(triangle.origin_labels),
+            "ages": [int(age) for age in triangle.ddims],
+            "values": values,
+            "link_ratios": link_ratios,
+            "excluded": np.zeros(link_ratios.shape, dtype=bool),
+            "averages": results["ldf"],
+            "selected": results["ldf"],
+            "cdf": cdf,
+            "overridden": np.zeros(results["ldf"].shape, dtype=bool),
+            "latest": results["latest"],
+            "ultimate": results["ultimate"],
+            "ibnr": results["ibnr"],
+            "mack_std_err": results["mack_std_err"]
+        }
+
+
+def segment_rows(segment: dict) -> dict:
+    """
+    Returns the rows of each table of a segment, as tuples in the order of TABLES. Empty cells are left out
+    of the triangles and link_ratios tables, and origins without a latest diagonal out of the results.
+    :param segment:
+    :return:
+    """
+    source = segment["source"]
+    labels = np.array(list(zip(segment["keys"], segment["columns"])), dtype=object)
+    origins = np.array(segment["origins"], dtype=object)
+    ages = np.array(segment["ages"])
+
+    values = segment["values"]
+    positions = np.nonzero(~np.isnan(values))
+    triangle_rows = _zip_rows(
+        source,
+        labels[positions[0]],
+        origins[positions[1]],
+        ages[positions[2]],
+        values[positions]
+    )
+
+    link_ratios = segment["link_ratios"]
+    positions = np.nonzero(~np.isnan(link_ratios))
+    link_ratio_rows = _zip_rows(
+        source,
+        labels[positions[0]],
+        origins[positions[1]],
+        ages[positions[2]],
+        link_ratios[positions],
+        segment["excluded"][positions]
+    )
+
+    # Selections are by starting age, as are link ratios.
+    positions = np.nonzero(np.ones(segment["selected"].shape, dtype=bool))
+    selection_rows = _zip_rows(
+        source,
+        labels[positions[0]],
+        ages[positions[1]],
+        segment["averages"][positions],
+        segment["selected"][positions],
+        segment["cdf"][..., :-1][positions],
+        segment["overridden"][positions]
+    )
+
+    positions = np.nonzero(~np.isnan(segment["latest"]))
+    result_rows = _zip_rows(
+        source,
+        labels[positions[0]],
+        origins[positions[1]],
+        segment["latest"][positions],
+        segment["ultimate"][positions],
+        segment["ibnr"][positions],
+        segment["mack_std_err"][positions]
+    )
+
+    return {
+        "triangles": triangle_rows,
+        "link_ratios": link_ratio_rows,
+        "selections": selection_rows,
+        "results": result_rows
+    }
+
+
+class CsvExport:
+    """
+    Writes each table to its own CSV file, appending one chunk at a time.
+    """
+    def __init__(self, path: str):
+        self.files = []
+        self._paths = {table: table_path(path, table, ".csv") for table in TABLES}
+        self._handles = {}
+        self._writers = {}
+
+    def write(self, table: str, rows: list):
+        writer = self._writers.get(table)
+        if writer is None:
+            handle = open(self._paths[table], "w", newline="", encoding="utf-8")
+            self._handles[table] = handle
+            self.files.append(self._paths[table])
+            writer = csv.writer(handle)
+            writer.writerow([name for name, _ in TABLES[table]])
+            self._writers[table] = writer
+
+        writer.writerows(rows)
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+
+
+class ParquetExport:
+    """
+    Writes each table to its own Parquet file, one row group per chunk.
+    """
+    def __init__(self, path: str):
+        self.pa, self.pq = _import_pyarrow()
+
+        self.files = []
+        self._paths = {table: table_path(path, table, ".parquet") for table in TABLES}
+        self._writers = {}
+
+    def write(self, table: str, rows: list):
+        pa = self.pa
+        schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in TABLES[table]])
+
+        writer = self._writers.get(table)
+        if writer is None:
+            writer = self.pq.ParquetWriter(self._paths[table], schema)
+            self._writers[table] = writer
+            self.files.append(self._paths[table])
+
+        columns = list(zip(*rows)) if rows else [[] for _ in TABLES[table]]
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema
+        ))
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+
+class ExcelExport:
+    """
+    Writes one workbook with a sheet per table, in openpyxl's write-only mode, which streams rows to disk.
+    Tables longer than an Excel sheet continue on sheets numbered from 2, e.g., triangles_2.
+    """
+    def __init__(self, path: str):
+        openpyxl = _import_openpyxl()
+
+        self.path = path
+        self.files = [path]
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheets = {}
+        self._sheet_rows = {}
+        self._sheet_counts = {}
+
+    def write(self, table: str, rows: list):
+        if table not in self._sheets:
+            self._add_sheet(table)
+
+        while rows:
+            space = EXCEL_MAX_ROWS - self._sheet_rows[table]
+            if space == 0:
+                self._add_sheet(table)
+                continue
+
+            sheet = self._sheets[table]
+            for row in rows[:space]:
+                sheet.append(row)
+            self._sheet_rows[table] += len(rows[:space])
+            rows = rows[space:]
+
+    def close(self):
+        self._workbook.save(self.path)
+
+    def _add_sheet(self, table: str):
+        count = self._sheet_counts.get(table, 0) + 1
+        self._sheet_counts[table] = count
+
+        sheet = self._workbook.create_sheet(table if count == 1 else "%s_%s" % (table, count))
+        sheet.append([name for name, _ in TABLES[table]])
+
+        self._sheets[table] = sheet
+        self._sheet_rows[table] = 0
+
+
+EXPORT_WRITERS = {
+    "parquet": ParquetExport,
+    "csv": CsvExport,
+    "xlsx": ExcelExport
+}
+
+
+def table_path(path: str, table: str, extension: str) -> str:
+    """
+    Returns the file a table of an export is written to, e.g., review_triangles.csv for review.csv.
+    :param path:
+    :param table:
+    :param extension:
+    :return:
+    """
+    root, _ = os.path.splitext(path)
+    return "%s_%s%s" % (root, table, extension)
+
+
+def open_export_dialog(main_window, scope: str = "analysis"):
+    """
+    Asks for a file and exports the current analysis tab, or every triangle of the project database, on the main
+    window's thread pool. Progress is shown in the status bar.
+    :param main_window:
+    :param scope: analysis or project
+    :return:
+    """
+    if scope == "analysis":
+        tab = main_window.analysis_pane.currentWidget()
+        if not hasattr(tab, "link_ratio_models"):
+            main_window.statusBar().showMessage("Open an analysis to export it.", 10000)
+            return
+
+    path, selected_filter = QFileDialog.getSaveFileName(
+        main_window,
+        'Export Project' if scope == "project" else 'Export Analysis',
+        '',
+        ";;".join(EXPORT_FORMATS.values()),
+        options=QT_FILEPATH_OPTION
+    )
+
+    if path == "":
+        return
+
+    export_format = os.path.splitext(path)[1].lower().lstrip(".")
+    if export_format not in EXPORT_FORMATS:
+        export_format = [name for name, file_filter in EXPORT_FORMATS.items() if file_filter == selected_filter][0]
+        path += "." + export_format
+
+    if scope == "project":
+        main_window.run_task(
+            export_project,
+            main_window.db,
+            path,
+            export_format,
+            on_result=lambda result: export_finished(main_window=main_window, result=result),
+            message="Exporting project to " + path + "..."
+        )
+    else:
+        # Copied on the GUI thread, so that the tab can be edited while the export runs. The Mack standard errors
+        # are computed by the worker.
+        states = {key: model.state.copy() for key, model in tab.link_ratio_models.items()}
+
+        main_window.run_task(
+            export_analysis,
+            states,
+            path,
+            export_format,
+            on_result=lambda result: export_finished(main_window=main_window, result=result),
+            message="Exporting analysis to " + path + "..."
+        )
+
+
+def export_finished(main_window, result: dict):
+    main_window.statusBar().showMessage(
+        "Exported %s rows to %s in %.2f seconds." % (
+            "{:,}".format(sum(result["rows"].values())),
+            ", ".join(os.path.basename(file) for file in result["files"]),
+            result["seconds"]
+        ),
+        10000
+    )
+
+
+def _zip_rows(source: str, labels: np.ndarray, *columns) -> list:
+    # Tuples of (source, key, column, *columns). NaN becomes None, i.e., an empty cell in every format.
+    columns = [
+        np.where(np.isnan(column), None, column).tolist() if column.dtype.kind == "f" else column.tolist()
+        for column in columns
+    ]
+    return [(source, key, column, *values) for (key, column), *values in zip(labels.tolist(), *columns)]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Exporting to Parquet requires pyarrow, e.g., pip install pyarrow.")
+    return pyarrow, pyarrow.parquet
+
+
+def _import_openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("Exporting to Excel requires openpyxl, e.g., pip install openpyxl.")
+    return openpyxl
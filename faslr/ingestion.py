@@ -0,0 +1,299 @@
+"""
+Builds triangles from claim-level transaction files. The file is read in chunks, and each chunk is reduced to
+sums by index key, origin period and development period before the next one is read, so memory use depends on
+the size of the triangle rather than on the number of transactions.
+
+triangle = ingest_claims_csv(
+    "claims.csv",
+    origin="Accident Date",
+    development="Transaction Date",
+    columns=["Paid", "Incurred"],
+    index=["LOB"],
+    origin_grain="Q",
+    development_grain="Q"
+)
+"""
+import logging
+import numpy as np
+import os
+import pandas as pd
+import profiler
+
+from triangle_store import ArrayTriangle
+
+# Maps FASLR's grain codes, which are those of chainladder, to pandas period frequencies.
+GRAINS = {
+    "Y": "Y",
+    "Q": "Q",
+    "M": "M"
+}
+
+# Months per period of each grain.
+GRAIN_MONTHS = {
+    "Y": 12,
+    "Q": 3,
+    "M": 1
+}
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+
+def aggregate_claims_csv(
+        path: str,
+        origin: str,
+        development: str,
+        columns: list,
+        index: list = None,
+        origin_grain: str = "Y",
+        development_grain: str = "Y",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        date_format: str = None,
+        progress_callback=None,
+        **read_csv_kwargs
+) -> pd.DataFrame:
+    """
+    Streams a transaction file and returns its incremental amounts summed by index key, origin period and
+    development period, as a long DataFrame with one row per non-empty cell. Only the columns named in the
+    arguments are read. Rows with a missing or unparseable date are dropped and counted in the log.
+    :param path:
+    :param origin: Column holding the origin date of each transaction, e.g., the accident date.
+    :param development: Column holding the date on which each transaction took place.
+    :param columns: Amount columns to sum, e.g., paid and incurred.
+    :param index: Columns identifying separate triangles, e.g., line of business.
+    :param origin_grain: Y, Q or M.
+    :param development_grain: Y, Q or M, no coarser than origin_grain.
+    :param chunk_size: Number of rows read at a time.
+    :param date_format: Format of both date columns, e.g., %Y-%m-%d. Inferred if omitted, which is slower.
+    :param progress_callback: Called with (bytes read, total bytes) after each chunk.
+    :param read_csv_kwargs: Passed on to pandas.read_csv, e.g., sep or encoding.
+    :return:
+    """
+    _check_grains(origin_grain, development_grain)
+
+    index = list(index or [])
+    columns = list(columns)
+    keys = index + ["origin", "development"]
+
+    aggregate = None
+    rows_read = 0
+    rows_dropped = 0
+
+    total_bytes = os.path.getsize(path)
+
+    # The file is opened inside the with statement, so that it is closed if read_csv rejects the header.
+    with profiler.span("aggregate_claims_csv", category="ingestion", path=path), open(path, 'rb') as csv_file, \
+            pd.read_csv(
+                csv_file,
+                usecols=index + [origin, development] + columns,
+                chunksize=chunk_size,
+                **read_csv_kwargs
+            ) as reader:
+        for chunk in reader:
+            rows_read += len(chunk)
+
+            origin_dates = pd.to_datetime(chunk[origin], format=date_format, errors="coerce")
+            development_dates = pd.to_datetime(chunk[development], format=date_format, errors="coerce")
+            valid = origin_dates.notna().to_numpy() & development_dates.notna().to_numpy()
+            rows_dropped += int((~valid).sum())
+
+            frame = chunk.loc[valid, index + columns]
+            frame["origin"] = origin_dates[valid].dt.to_period(GRAINS[origin_grain])
+            frame["development"] = development_dates[valid].dt.to_period(GRAINS[development_grain])
+
+            partial = frame.groupby(keys, sort=False, observed=True)[columns].sum()
+
+            # The running total has one row per triangle cell, so merging each chunk into it is cheap.
+            if aggregate is None:
+                aggregate = partial
+            else:
+                aggregate = pd.concat([aggregate, partial]).groupby(level=keys, sort=False).sum()
+
+            if progress_callback is not None:
+                progress_callback(csv_file.tell(), total_bytes)
+
+    if rows_dropped:
+        logging.warning("Dropped %s of %s rows of %s with a missing date." % (rows_dropped, rows_read, path))
+
+    if aggregate is None:
+        return pd.DataFrame(columns=keys + columns)
+
+    return aggregate.sort_index().reset_index()
+
+
+def ingest_claims_csv(
+        path: str,
+        origin: str,
+        development: str,
+        columns: list,
+        index: list = None,
+        origin_grain: str = "Y",
+        development_grain: str = "Y",
+        cumulative: bool = True,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        date_format: str = None,
+        progress_callback=None,
+        as_array: bool = False,
+        **read_csv_kwargs
+):
+    """
+    Streams a transaction file into a triangle with the given origin and development grains. See
+    aggregate_claims_csv for the arguments shared with it.
+    :param path:
+    :param origin:
+    :param development:
+    :param columns:
+    :param index:
+    :param origin_grain:
+    :param development_grain:
+    :param cumulative: Whether to return cumulative rather than incremental amounts.
+    :param chunk_size:
+    :param date_format:
+    :param progress_callback:
+    :param as_array: Return an ArrayTriangle, which can be saved with triangle_store, instead of a chainladder
+    Triangle.
+    :param read_csv_kwargs:
+    :return:
+    """
+    cells = aggregate_claims_csv(
+        path,
+        origin=origin,
+        development=development,
+        columns=columns,
+        index=index,
+        origin_grain=origin_grain,
+        development_grain=development_grain,
+        chunk_size=chunk_size,
+        date_format=date_format,
+        progress_callback=progress_callback,
+        **read_csv_kwargs
+    )
+
+    with profiler.span("build triangle", category="ingestion", cells=len(cells)):
+        triangle = cells_to_triangle(
+            cells,
+            columns=columns,
+            index=index,
+            origin_grain=origin_grain,
+            development_grain=development_grain,
+            cumulative=cumulative
+        )
+
+        if not as_array:
+            triangle = triangle.to_chainladder()
+
+    return triangle
+
+
+def cells_to_triangle(
+        cells: pd.DataFrame,
+        columns: list,
+        index: list = None,
+        origin_grain: str = "Y",
+        development_grain: str = "Y",
+        cumulative: bool = True
+) -> ArrayTriangle:
+    """
+    Scatters the output of aggregate_claims_csv into a dense (index, column, origin, development) array. Ages
+    are in months, at the end of each development period. Cells beyond the latest development period in the
+    data are left empty.
+    :param cells:
+    :param columns:
+    :param index:
+    :param origin_grain:
+    :param development_grain:
+    :param cumulative:
+    :return:
+    """
+    index = list(index or [])
+    columns = list(columns)
+
+    if cells.empty:
+        raise ValueError("No claims with valid dates to build a triangle from.")
+
+    origin_freq = GRAINS[origin_grain]
+    development_freq = GRAINS[development_grain]
+
+    origin_periods = pd.PeriodIndex(cells["origin"], freq=origin_freq)
+    development_periods = pd.PeriodIndex(cells["development"], freq=development_freq)
+
+    # Months from the start of the origin period to the end of the development period.
+    origin_starts = origin_periods.start_time
+    development_ends = development_periods.end_time
+    ages = _month_number(development_ends) - _month_number(origin_starts) + 1
+
+    if (ages <= 0).any():
+        raise ValueError("Transactions dated before their origin period, e.g., with a development date before "
+                         "the accident date, cannot be placed in a triangle.")
+
+    all_origins = pd.period_range(origin_periods.min(), origin_periods.max(), freq=origin_freq)
+
+    # Ages run up to that of the oldest origin at the latest valuation, as in chainladder, even if the oldest
+    # origins have no transactions that late. Origin periods start on a development period boundary, so every
+    # age is a whole number of development periods.
+    origin_months = _month_number(all_origins.start_time)
+    latest_month = _month_number(pd.DatetimeIndex([development_ends.max()]))[0]
+    step = GRAIN_MONTHS[development_grain]
+    first_age = int(ages.min())
+    all_ages = np.arange(first_age, latest_month - origin_months[0] + 2, step)
+
+    if index:
+        key_frame = cells[index].drop_duplicates().sort_values(index)
+        keys = key_frame.values.tolist()
+        key_positions = {tuple(key): i for i, key in enumerate(keys)}
+        key_index = np.array([key_positions[tuple(key)] for key in cells[index].values.tolist()], dtype=int)
+        key_labels = index
+    else:
+        keys = [["Total"]]
+        key_index = np.zeros(len(cells), dtype=int)
+        key_labels = ["Total"]
+
+    origin_index = (_month_number(origin_starts) - origin_months[0]) // GRAIN_MONTHS[origin_grain]
+    age_index = (ages - first_age) // step
+
+    values = np.zeros((len(keys), len(columns), len(all_origins), len(all_ages)))
+
+    for position, column in enumerate(columns):
+        np.add.at(
+            values[:, position],
+            (key_index, origin_index, age_index),
+            cells[column].to_numpy(dtype=float)
+        )
+
+    if cumulative:
+        values = np.cumsum(values, axis=-1)
+
+    # Blank out the cells after the latest valuation, i.e., the bottom right of the triangle. Valuations are
+    # compared as month numbers, at the last month of each development period.
+    future = origin_months[:, np.newaxis] + all_ages[np.newaxis, :] - 1 > latest_month
+    values[..., future] = np.nan
+
+    # chainladder stores empty cells, including those before the first transaction of an origin, as NaN
+    # rather than zero.
+    values[values == 0] = np.nan
+
+    return ArrayTriangle(
+        values=values,
+        key_labels=key_labels,
+        keys=keys,
+        columns=columns,
+        origins=all_origins.start_time.to_numpy(),
+        origin_labels=[str(origin) for origin in all_origins],
+        developments=[int(age) for age in all_ages],
+        origin_grain=origin_grain,
+        development_grain=development_grain,
+        is_cumulative=cumulative
+    )
+
+
+def _month_number(dates: pd.DatetimeIndex) -> np.ndarray:
+    # Months elapsed since year 0, so that month differences can be taken with integer arithmetic.
+    return np.asarray(dates.year * 12 + dates.month - 1, dtype=int)
+
+
+def _check_grains(origin_grain: str, development_grain: str):
+    for grain in (origin_grain, development_grain):
+        if grain not in GRAINS:
+            raise ValueError("Unsupported grain: " + str(grain) + ". Expected one of " + ", ".join(GRAINS))
+
+    if GRAIN_MONTHS[development_grain] > GRAIN_MONTHS[origin_grain]:
+        raise ValueError("The development grain cannot be coarser than the origin grain.")
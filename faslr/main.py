@@ -1,14 +1,9 @@
-import chainladder as cl
 import logging
 import os
 import platform
+import profiler
 import sys
 
-from connection import (
-    get_startup_db_path,
-    populate_project_tree
-)
-
 from constants import (
     CONFIG_PATH,
     ROOT_PATH,
@@ -19,22 +14,24 @@ from menu import (
     MainMenuBar
 )
 
-from project import (
+from project_tree import (
+    LOB,
+    ProjectTreeModel,
     ProjectTreeView
 )
 
-from PyQt5.Qt import (
-    QStandardItemModel
-)
-
 from PyQt5.QtCore import (
+    QEvent,
     QModelIndex,
-    Qt
+    Qt,
+    QThreadPool,
+    QTimer
 )
 
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
+    QProgressBar,
     QSplitter,
     QStatusBar,
     QHBoxLayout,
@@ -43,39 +40,22 @@ from PyQt5.QtWidgets import (
     QWidget
 )
 
-from shutil import copyfile
+from settings import get_startup_db_path
 
-from triangle_model import (
-    TriangleModel,
-    TriangleView
-)
-
-# Get OS information from the user.
-os_name = platform.platform()
-
-# Initialize logging
-logging.basicConfig(
-    filename=os.path.join(ROOT_PATH, 'faslr.log'),
-    filemode='w',
-    format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
-    datefmt='%H:%M:%S',
-    level=logging.DEBUG)
-
-logging.info("Begin logging.")
-logging.info("FASLR initialized on " + os_name)
+from shutil import copyfile
 
-# initialize configuration file if it does not exist
-if not os.path.exists(CONFIG_PATH):
-    logging.info("No configuration file detected. Initializing a new one from template.")
-    config_template_path = os.path.join(TEMPLATES_PATH, 'config_template.ini')
-    copyfile(config_template_path, CONFIG_PATH)
+from worker import Worker
 
-# If a startup db has been indicated, get the path.
-startup_db = get_startup_db_path()
+# Sample triangles opened in the analysis pane at startup, as (tab label, chainladder sample name). Each one is
+# loaded the first time its tab is shown, so that nothing heavy is imported before the window appears.
+SAMPLE_TABS = [
+    ("RAA", "raa"),
+    ("ABC", "abc")
+]
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, startup_db: str = "None"):
         super().__init__()
         logging.info("Main window initialized.")
 
@@ -84,6 +64,9 @@ class MainWindow(QMainWindow):
         self.connection_established = False
         self.db = None
 
+        # Set once the window has been painted for the first time, see event.
+        self.first_painted = False
+
         self.resize(2500, 900)
 
         self.setWindowTitle("FASLR - Free Actuarial System for Loss Reserving")
@@ -96,6 +79,17 @@ class MainWindow(QMainWindow):
 
         self.setStatusBar(QStatusBar(self))
 
+        # Database work runs on this pool, see run_task. The progress bar in the status bar shows while any
+        # task is running.
+        self.thread_pool = QThreadPool()
+        self.active_workers = set()
+
+        self.task_progress = QProgressBar()
+        self.task_progress.setMaximumWidth(200)
+        self.task_progress.setTextVisible(False)
+        self.task_progress.hide()
+        self.statusBar().addPermanentWidget(self.task_progress)
+
         self.menu_bar.toggle_project_actions()
 
         # navigation pane for project hierarchy
@@ -104,12 +98,15 @@ class MainWindow(QMainWindow):
         self.project_pane.setHeaderHidden(False)
 
         # noinspection PyUnresolvedReferences
-        self.project_pane.doubleClicked.connect(self.get_value)
-
-        self.project_model = QStandardItemModel()
-        self.project_model.setHorizontalHeaderLabels(["Project", "Project_UUID"])
+        self.project_pane.doubleClicked.connect(self.open_analysis)
+        # noinspection PyUnresolvedReferences
+        self.project_pane.new_analysis_action.triggered.connect(
+            lambda: self.open_analysis(self.project_pane.currentIndex())
+        )
 
-        self.project_root = self.project_model.invisibleRootItem()
+        # Nodes are read from the database as they are expanded. The model's nodes attribute indexes them by
+        # project_tree_uuid.
+        self.project_model = ProjectTreeModel(run_task=self.run_task)
 
         self.project_pane.setModel(self.project_model)
 
@@ -118,29 +115,20 @@ class MainWindow(QMainWindow):
 
         # triangle placeholder
 
-        self.raa_table = TriangleView()
+        self.analysis_pane = QTabWidget()
+        self.analysis_pane.setTabsClosable(True)
+        self.analysis_pane.setMovable(True)
 
-        raa_triangle = cl.load_sample('raa')
-        raa_triangle = raa_triangle.to_frame()
+        # Maps each placeholder widget to the name of the sample it is to be replaced with.
+        self.pending_samples = {}
 
-        self.raa_model = TriangleModel(raa_triangle)
-        self.raa_table.setModel(self.raa_model)
-        # noinspection PyUnresolvedReferences
-        self.raa_table.doubleClicked.connect(self.get_value)
+        for label, sample in SAMPLE_TABS:
+            placeholder = QWidget()
+            self.pending_samples[placeholder] = sample
+            self.analysis_pane.addTab(placeholder, label)
 
-        self.abc_table = TriangleView()
-        abc_triangle = cl.load_sample('abc')
-        abc_triangle = abc_triangle.to_frame()
-        self.abc_model = TriangleModel(abc_triangle)
-        self.abc_table.setModel(self.abc_model)
         # noinspection PyUnresolvedReferences
-        self.abc_table.doubleClicked.connect(self.get_value)
-
-        self.analysis_pane = QTabWidget()
-        self.analysis_pane.setTabsClosable(True)
-        self.analysis_pane.setMovable(True)
-        self.analysis_pane.addTab(self.raa_table, "RAA")
-        self.analysis_pane.addTab(self.abc_table, "ABC")
+        self.analysis_pane.currentChanged.connect(self.load_sample_tab)
 
         # This styling is mostly done to add a border right beneath the tab
         self.analysis_pane.setStyleSheet(
@@ -189,8 +177,117 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(self.main_container)
 
-        if startup_db != "None":
-            populate_project_tree(db_filename=startup_db, main_window=self)
+        # Deferred until the window has been painted, see event, so that it appears before anything heavy is
+        # loaded.
+        self.startup_db = startup_db
+        self.pending_startup = True
+
+    def finish_startup(self):
+        """
+        Builds the visible sample tab and starts loading the startup database, if any.
+        :return:
+        """
+        # The database is read on the thread pool, so start it before building the tab on this thread.
+        if self.startup_db != "None":
+            self.open_startup_db(self.startup_db)
+
+        self.load_sample_tab(self.analysis_pane.currentIndex())
+
+        self.pending_startup = False
+
+    def open_startup_db(self, db_filename: str):
+        # Imported here so that SQLAlchemy is not loaded before the window appears.
+        with profiler.span("import connection", category="startup"):
+            from connection import populate_project_tree
+
+        populate_project_tree(db_filename=db_filename, main_window=self)
+
+    def load_sample_tab(self, index: int):
+        """
+        Replaces a placeholder tab in the analysis pane with its sample triangle the first time it is shown.
+        :param index:
+        :return:
+        """
+        placeholder = self.analysis_pane.widget(index)
+        sample = self.pending_samples.pop(placeholder, None)
+        if sample is None:
+            return
+
+        from triangle_cache import get_sample_triangle
+        from triangle_model import (
+            create_triangle_model,
+            TriangleView
+        )
+
+        # The sample is read from the triangle cache when possible, in which case chainladder is not imported.
+        with profiler.span("load sample tab", category="model", sample=sample):
+            table = TriangleView()
+            table.setModel(create_triangle_model(get_sample_triangle(sample)))
+        # noinspection PyUnresolvedReferences
+        table.doubleClicked.connect(self.get_value)
+
+        label = self.analysis_pane.tabText(index)
+
+        # Block currentChanged so that swapping the widget does not re-enter this method.
+        self.analysis_pane.blockSignals(True)
+        self.analysis_pane.removeTab(index)
+        self.analysis_pane.insertTab(index, table, label)
+        self.analysis_pane.setCurrentIndex(index)
+        self.analysis_pane.blockSignals(False)
+
+        placeholder.deleteLater()
+
+    def event(self, event):
+        handled = super().event(event)
+
+        if not self.first_painted and event.type() == QEvent.Paint:
+            self.first_painted = True
+            profiler.instant("first paint", category="startup")
+            QTimer.singleShot(0, self.finish_startup)
+
+        return handled
+
+    def quit_when_idle(self):
+        """
+        Quits the application once the window has been painted and no background task is running. Used with
+        --profile-exit to time startup from the command line.
+        :return:
+        """
+        if self.first_painted and not self.active_workers and not self.pending_startup:
+            logging.info("Startup complete, exiting.")
+            QApplication.instance().quit()
+
+    def open_analysis(self, index: QModelIndex):
+        """
+        Opens an analysis of the triangle saved for an LOB of the project tree. The triangle is read and rebuilt on
+        the thread pool.
+        :param index:
+        :return:
+        """
+        node = self.project_model.node_from_index(index)
+        if node.level != LOB:
+            return
+
+        from project import open_lob_triangle
+
+        self.run_task(
+            open_lob_triangle,
+            self.db,
+            node.node_id,
+            on_result=lambda result: self.analysis_opened(node.name, result),
+            message="Opening " + node.name + "..."
+        )
+
+    def analysis_opened(self, lob_name: str, result):
+        if result is None:
+            self.statusBar().showMessage("No triangle has been saved for " + lob_name + ".", 10000)
+            return
+
+        from analysis import AnalysisTab
+
+        name, triangle = result
+        tab = AnalysisTab(triangle)
+        self.analysis_pane.setCurrentIndex(self.analysis_pane.addTab(tab, name or lob_name))
 
     def get_value(self, val: QModelIndex):
         # Just some scaffolding that helps me navigate positions within the ProjectTreeView model
@@ -203,19 +300,138 @@ class MainWindow(QMainWindow):
         # print(ix_col_0.data())
         # print(self.table.selectedIndexes())
 
+    def run_task(
+            self,
+            fn,
+            *args,
+            on_result=None,
+            on_partial_result=None,
+            on_finished=None,
+            message: str = None,
+            **kwargs
+    ) -> Worker:
+        """
+        Runs fn(*args, **kwargs) on the thread pool and shows a busy indicator in the status bar until it
+        completes. on_result is called on the GUI thread with the return value of fn.
+        :param fn:
+        :param args:
+        :param on_result:
+        :param on_partial_result: Called on the GUI thread with each intermediate result, if fn accepts a
+        partial_result_callback.
+        :param on_finished: Called on the GUI thread once fn has returned or raised, after on_result.
+        :param message: Status bar message displayed while the task runs.
+        :param kwargs:
+        :return:
+        """
+        worker = Worker(fn, *args, **kwargs)
+
+        # Keep the worker alive until it finishes, rather than letting the pool delete it.
+        worker.setAutoDelete(False)
+        self.active_workers.add(worker)
+
+        if on_result is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.result.connect(on_result)
+        if on_partial_result is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.partial_result.connect(on_partial_result)
+        # noinspection PyUnresolvedReferences
+        worker.signals.error.connect(self.task_failed)
+        # noinspection PyUnresolvedReferences
+        worker.signals.progress.connect(self.task_progressed)
+        if on_finished is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.finished.connect(on_finished)
+        # noinspection PyUnresolvedReferences
+        worker.signals.finished.connect(lambda: self.task_finished(worker))
+
+        if message is not None:
+            self.statusBar().showMessage(message)
+
+        self.task_progress.setRange(0, 0)
+        self.task_progress.show()
+
+        self.thread_pool.start(worker)
+
+        return worker
+
+    def task_progressed(self, completed: int, total: int):
+        self.task_progress.setRange(0, total)
+        self.task_progress.setValue(completed)
+
+    def task_failed(self, error: Exception):
+        self.statusBar().showMessage("Error: " + str(error), 10000)
+
+    def task_finished(self, worker: Worker):
+        self.active_workers.discard(worker)
+        if not self.active_workers:
+            self.task_progress.hide()
+
     def remove_tab(self, index: int):
         """
         Deletes an open tab from the analysis pane.
         :param index:
         :return:
         """
+        widget = self.analysis_pane.widget(index)
+        self.pending_samples.pop(widget, None)
         self.analysis_pane.removeTab(index)
 
 
-app = QApplication(sys.argv)
+def main():
+    # Profiling is off unless requested with --profile, --profile-exit or FASLR_PROFILE, see profiler.py. To
+    # profile without a display, also pass -platform offscreen.
+    profiler.enable_from_environment(sys.argv)
+
+    with profiler.span("configure", category="startup"):
+        # Get OS information from the user.
+        os_name = platform.platform()
+
+        # Initialize logging
+        logging.basicConfig(
+            filename=os.path.join(ROOT_PATH, 'faslr.log'),
+            filemode='w',
+            format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
+            datefmt='%H:%M:%S',
+            level=logging.DEBUG)
+
+        logging.info("Begin logging.")
+        logging.info("FASLR initialized on " + os_name)
+
+        if profiler.is_enabled():
+            logging.info("Profiling enabled.")
+
+        # initialize configuration file if it does not exist
+        if not os.path.exists(CONFIG_PATH):
+            logging.info("No configuration file detected. Initializing a new one from template.")
+            config_template_path = os.path.join(TEMPLATES_PATH, 'config_template.ini')
+            copyfile(config_template_path, CONFIG_PATH)
+
+        # If a startup db has been indicated, get the path.
+        startup_db = get_startup_db_path()
+
+    with profiler.span("QApplication", category="startup"):
+        app = QApplication(sys.argv)
+
+    with profiler.span("MainWindow.__init__", category="startup"):
+        window = MainWindow(startup_db=startup_db)
+
+    with profiler.span("MainWindow.show", category="startup"):
+        window.show()
+
+    if "--profile-exit" in sys.argv:
+        exit_timer = QTimer()
+        # noinspection PyUnresolvedReferences
+        exit_timer.timeout.connect(window.quit_when_idle)
+        exit_timer.start(50)
+
+    exit_code = app.exec_()
+
+    if profiler.is_enabled():
+        profiler.write_trace()
 
-window = MainWindow()
+    sys.exit(exit_code)
 
-window.show()
 
-app.exec_()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,8 @@ Contains the menu bar of the main window i.e., the horizontal bar that has stuff
 """
 from about import AboutDialog
 
-from connection import ConnectionDialog
-
 from constants import CONFIG_PATH
 
-from project import ProjectDialog
-
 from settings import SettingsDialog
 
 from PyQt5.QtGui import (
@@ -43,10 +39,30 @@ class MainMenuBar(QMenuBar):
         self.import_action = QAction("&Import Project")
         self.import_action.setShortcut(QKeySequence("Ctrl+Shift+i"))
         self.import_action.setStatusTip("Import a project from another data source.")
+        # noinspection PyUnresolvedReferences
+        self.import_action.triggered.connect(self.import_projects)
+
+        self.export_analysis_action = QAction("&Export Analysis")
+        self.export_analysis_action.setShortcut(QKeySequence("Ctrl+Shift+x"))
+        self.export_analysis_action.setStatusTip("Export the current analysis to Parquet, CSV or Excel.")
+        # noinspection PyUnresolvedReferences
+        self.export_analysis_action.triggered.connect(self.export_analysis)
+
+        self.export_project_action = QAction("Export &Project")
+        self.export_project_action.setStatusTip("Export every triangle in the project to Parquet, CSV or Excel.")
+        # noinspection PyUnresolvedReferences
+        self.export_project_action.triggered.connect(self.export_project)
+
+        self.portfolio_action = QAction("&Reserve Portfolio")
+        self.portfolio_action.setStatusTip("Fit development and project ultimates for every triangle in the project.")
+        # noinspection PyUnresolvedReferences
+        self.portfolio_action.triggered.connect(self.reserve_portfolio)
 
         self.engine_action = QAction("&Select Engine")
         self.engine_action.setShortcut("Ctrl+shift+e")
         self.engine_action.setStatusTip("Select a reserving engine.")
+        # noinspection PyUnresolvedReferences
+        self.engine_action.triggered.connect(self.select_engine)
 
         self.settings_action = QAction("&Settings")
         self.settings_action.setShortcut("Ctrl+Shift+t")
@@ -68,15 +84,21 @@ class MainMenuBar(QMenuBar):
         file_menu.addAction(self.connection_action)
         file_menu.addAction(self.new_action)
         file_menu.addAction(self.import_action)
+        file_menu.addAction(self.export_analysis_action)
+        file_menu.addAction(self.export_project_action)
         file_menu.addAction(self.settings_action)
 
         tools_menu.addAction(self.engine_action)
+        tools_menu.addAction(self.portfolio_action)
 
         help_menu.addAction(self.about_action)
 
     def edit_connection(self):
         # function triggers the connection dialog box to connect to a database
-        dlg = ConnectionDialog(self)
+        # Database modules are imported on first use so that SQLAlchemy is not loaded at startup.
+        from connection import ConnectionDialog
+
+        dlg = ConnectionDialog(self.parent)
         dlg.exec_()
 
     def display_about(self):
@@ -86,7 +108,40 @@ class MainMenuBar(QMenuBar):
 
     def new_project(self):
         # function to display new project dialog box
-        dlg = ProjectDialog(self)
+        from project import ProjectDialog
+
+        dlg = ProjectDialog(self.parent)
+        dlg.exec_()
+
+    def import_projects(self):
+        # function to bulk import projects from a manifest file
+        from project_import import open_import_dialog
+
+        open_import_dialog(self.parent)
+
+    def export_analysis(self):
+        # function to export the triangles, selections and results of the current analysis tab
+        from export import open_export_dialog
+
+        open_export_dialog(self.parent, scope="analysis")
+
+    def export_project(self):
+        # function to export every triangle in the database, with its development and results
+        from export import open_export_dialog
+
+        open_export_dialog(self.parent, scope="project")
+
+    def reserve_portfolio(self):
+        # function to run batch reserving on every triangle in the database
+        from portfolio import start_portfolio_run
+
+        start_portfolio_run(self.parent)
+
+    def select_engine(self):
+        # function to choose where reserving methods are fitted, e.g., on a pool of processes
+        from engine_dialog import EngineDialog
+
+        dlg = EngineDialog(self.parent, config_path=CONFIG_PATH)
         dlg.exec_()
 
     def display_settings(self):
@@ -98,5 +153,11 @@ class MainMenuBar(QMenuBar):
         # disable project-based menu items until connection is established
         if self.parent.connection_established:
             self.new_action.setEnabled(True)
+            self.import_action.setEnabled(True)
+            self.export_project_action.setEnabled(True)
+            self.portfolio_action.setEnabled(True)
         else:
             self.new_action.setEnabled(False)
+            self.import_action.setEnabled(False)
+            self.export_project_action.setEnabled(False)
+            self.portfolio_action.setEnabled(False)
@@ -0,0 +1,453 @@
+"""
+NumPy implementations of the deterministic reserving methods: development factors, chainladder,
+Bornhuetter-Ferguson and Cape Cod, along with Mack's standard errors of the chainladder. They work on plain arrays
+with axes (..., origin, development), taken once from a chainladder Triangle or an ArrayTriangle, so a fit is a
+handful of vectorized operations rather than a pass through chainladder's general-purpose Triangle machinery.
+Results match chainladder's default settings, i.e., no tail, no trend and no exclusions, which
+tests/10_native_test.py and tests/13_mack_test.py check against the bundled samples.
+
+chainladder is not imported, so this is also the fastest engine to start.
+"""
+import numpy as np
+
+AVERAGES = ("volume", "simple")
+
+# Methods with a native implementation.
+NATIVE_METHODS = ("development", "chainladder", "bornhuetter_ferguson", "cape_cod", "mack")
+
+# Exponent of the cumulative value in the variance of a link ratio, as in chainladder's WeightedRegression.
+AVERAGE_EXPONENTS = {"volume": 1, "simple": 2}
+
+
+def to_cumulative(values: np.ndarray) -> np.ndarray:
+    """
+    Converts incremental values with axes (..., origin, development) to cumulative ones. Cells after the last
+    non-empty cell of each origin stay empty.
+    :param values:
+    :return:
+    """
+    last_index, has_values = latest_index(values)
+    cumulative = np.nancumsum(values, axis=-1)
+    ages = np.arange(values.shape[-1])
+    cumulative[(ages > last_index[..., np.newaxis]) | ~has_values[..., np.newaxis]] = np.nan
+    return cumulative
+
+
+def fit_development(values: np.ndarray, average: str = "volume") -> tuple:
+    """
+    Returns the age-to-age factors, with shape (..., development - 1), and the age-to-ultimate factors, with
+    shape (..., development), of cumulative values with axes (..., origin, development). Factors are averaged
+    over the origins observed at both ages, either weighted by volume or as a simple average of link ratios.
+    Ages without any such origin get a factor of 1. There is no tail, so the last age-to-ultimate factor is 1.
+    :param values:
+    :param average: volume or simple
+    :return: (ldf, cdf)
+    """
+    if average not in AVERAGES:
+        raise ValueError("Unsupported average: " + str(average) + ". Expected one of " + ", ".join(AVERAGES))
+
+    current = values[..., :-1]
+    following = values[..., 1:]
+
+    # Zero cells are treated as empty, as in chainladder.
+    observed = ~np.isnan(current) & ~np.isnan(following) & (current != 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if average == "volume":
+            ldf = (
+                np.where(observed, following, 0).sum(axis=-2) / np.where(observed, current, 0).sum(axis=-2)
+            )
+        else:
+            link_ratios = np.where(observed, following / np.where(observed, current, 1), 0)
+            ldf = link_ratios.sum(axis=-2) / observed.sum(axis=-2)
+
+    ldf = np.where(np.isfinite(ldf), ldf, 1.0)
+
+    cdf = np.ones(ldf.shape[:-1] + (ldf.shape[-1] + 1,))
+    cdf[..., :-1] = np.cumprod(ldf[..., ::-1], axis=-1)[..., ::-1]
+
+    return ldf, cdf
+
+
+def latest_index(values: np.ndarray) -> tuple:
+    """
+    Returns the position of the last non-empty development cell of each origin, and whether the origin has any
+    non-empty cell at all.
+    :param values:
+    :return: (index, has_values), both with axes (..., origin)
+    """
+    present = ~np.isnan(values) & (values != 0)
+    has_values = present.any(axis=-1)
+    index = values.shape[-1] - 1 - np.argmax(present[..., ::-1], axis=-1)
+    return index, has_values
+
+
+def diagonal_index(values: np.ndarray) -> np.ndarray:
+    """
+    Returns the position of the latest diagonal, i.e., of the current valuation, in each origin of values with
+    axes (..., origin, development). It is the last age observed in the origin across all leading axes, so an
+    index key or column with no recent activity still has its latest diagonal at the current valuation.
+    :param values:
+    :return: Positions with axes (origin,)
+    """
+    index, has_values = latest_index(values.reshape((-1,) + values.shape[-2:]))
+    return np.where(has_values, index, -1).max(axis=0).clip(min=0)
+
+
+def project_ultimates(values: np.ndarray, cdf: np.ndarray, diagonal: np.ndarray = None) -> dict:
+    """
+    Develops the latest diagonal of cumulative values with axes (..., origin, development) to ultimate. Origins
+    that are empty on the latest diagonal have no ultimate, as in chainladder.
+    :param values:
+    :param cdf: Age-to-ultimate factors with axes (..., development), e.g., from fit_development.
+    :param diagonal: Positions of the latest diagonal with axes broadcastable to (..., origin). Defaults to
+    diagonal_index(values).
+    :return: Arrays with axes (..., origin): latest, index of the latest age, cdf, ultimate and ibnr.
+    """
+    if diagonal is None:
+        diagonal = diagonal_index(values)
+
+    index = np.broadcast_to(diagonal, values.shape[:-1])
+
+    latest = np.take_along_axis(values, index[..., np.newaxis], axis=-1)[..., 0]
+    latest_cdf = np.take_along_axis(
+        np.broadcast_to(cdf[..., np.newaxis, :], values.shape),
+        index[..., np.newaxis],
+        axis=-1
+    )[..., 0]
+
+    # Zero cells are treated as empty, as in chainladder.
+    latest = np.where(latest == 0, np.nan, latest)
+    ultimate = latest * latest_cdf
+
+    return {
+        "latest": latest,
+        "index": index,
+        "cdf": np.where(np.isnan(latest), np.nan, latest_cdf),
+        "ultimate": ultimate,
+        "ibnr": ultimate - latest
+    }
+
+
+def bornhuetter_ferguson(
+        values: np.ndarray,
+        cdf: np.ndarray,
+        exposure: np.ndarray,
+        apriori=1.0,
+        diagonal: np.ndarray = None
+) -> dict:
+    """
+    Projects ultimates with the Bornhuetter-Ferguson method, i.e., the latest diagonal plus the unreported
+    share, 1 - 1 / cdf, of the expected losses, apriori * exposure.
+    :param values: Cumulative values with axes (..., origin, development).
+    :param cdf: Age-to-ultimate factors with axes (..., development).
+    :param exposure: Exposure with axes broadcastable to (..., origin), e.g., earned premium.
+    :param apriori: Expected loss ratio, a scalar or an array broadcastable to (..., origin).
+    :param diagonal: See project_ultimates.
+    :return: As project_ultimates, plus apriori.
+    """
+    results = project_ultimates(values, cdf, diagonal=diagonal)
+
+    expected = np.asarray(apriori, dtype=float) * exposure
+    ultimate = results["latest"] + (1 - 1 / results["cdf"]) * expected
+
+    results["apriori"] = np.broadcast_to(np.asarray(apriori, dtype=float), results["latest"].shape)
+    results["ultimate"] = ultimate
+    results["ibnr"] = ultimate - results["latest"]
+
+    return results
+
+
+def cape_cod(values: np.ndarray, cdf: np.ndarray, exposure: np.ndarray, diagonal: np.ndarray = None) -> dict:
+    """
+    Projects ultimates with the Cape Cod, or Stanard-Buhlmann, method. The expected loss ratio is the latest
+    diagonal divided by the used-up exposure, exposure / cdf, summed over origins, with no trend or decay.
+    :param values: Cumulative values with axes (..., origin, development).
+    :param cdf: Age-to-ultimate factors with axes (..., development).
+    :param exposure: Exposure with axes broadcastable to (..., origin).
+    :param diagonal: See project_ultimates.
+    :return: As bornhuetter_ferguson.
+    """
+    results = project_ultimates(values, cdf, diagonal=diagonal)
+
+    used_up = np.broadcast_to(exposure, results["latest"].shape) / results["cdf"]
+    reported = ~np.isnan(results["latest"])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        apriori = (
+            np.where(reported, results["latest"], 0).sum(axis=-1) / np.where(reported, used_up, 0).sum(axis=-1)
+        )
+
+    return bornhuetter_ferguson(values, cdf, exposure, apriori=apriori[..., np.newaxis], diagonal=diagonal)
+
+
+def fit_mack(values: np.ndarray, average: str = "volume", excluded: np.ndarray = None) -> dict:
+    """
+    Fits the age-to-age factors of cumulative values with axes (..., origin, development) along with Mack's
+    sigma of each age and the standard error of each factor, as chainladder.Development does. Sigmas that cannot
+    be estimated, e.g., of the last age, which has a single link ratio, are extrapolated log-linearly from the
+    others.
+    :param values:
+    :param average: volume or simple
+    :param excluded: Link ratios left out of the fit, a boolean array broadcastable to (..., origin,
+    development - 1).
+    :return: ldf, sigma and std_err, each with axes (..., development - 1).
+    """
+    if average not in AVERAGES:
+        raise ValueError("Unsupported average: " + str(average) + ". Expected one of " + ", ".join(AVERAGES))
+
+    exponent = AVERAGE_EXPONENTS[average]
+
+    current = values[..., :-1]
+    following = values[..., 1:]
+
+    used = ~np.isnan(current) & ~np.isnan(following) & (current != 0)
+    if excluded is not None:
+        used = used & ~excluded
+
+    # A weighted regression through the origin of each age's values on the previous age's.
+    x = np.where(used, current, 1.0)
+    y = np.where(used, following, 0.0)
+    weights = np.where(used, x ** -float(exponent), 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = (weights * x ** 2).sum(axis=-2)
+        ldf = (weights * x * y).sum(axis=-2) / denominator
+
+        residuals = np.where(used, y - ldf[..., np.newaxis, :] * x, 0.0)
+        n_used = used.sum(axis=-2)
+        variance = np.where(n_used > 1, (weights * residuals ** 2).sum(axis=-2) / (n_used - 1), np.nan)
+
+        sigma = _loglinear_fill(np.sqrt(variance))
+        std_err = np.sqrt(variance / denominator)
+
+        # Ages without a standard error take the sigma scaled by the first origin's value.
+        first = values[..., 0, :-1]
+        std_err = np.where(np.isnan(std_err), sigma / np.sqrt(first ** (2 - exponent)), std_err)
+
+    return {
+        "ldf": np.where(np.isfinite(ldf), ldf, 1.0),
+        "sigma": np.nan_to_num(sigma),
+        "std_err": np.nan_to_num(std_err)
+    }
+
+
+def mack_chainladder(
+        values: np.ndarray,
+        average: str = "volume",
+        excluded: np.ndarray = None,
+        ldf: np.ndarray = None,
+        diagonal: np.ndarray = None
+) -> dict:
+    """
+    Projects cumulative values with axes (..., origin, development) with the chainladder and estimates the
+    standard error of each origin's ultimate, and of their total, with Mack's recursive formulas, as
+    chainladder.MackChainladder does. Every leading axis is fitted at once, so the segments of a review, e.g.,
+    its LOBs, can be stacked into one array and fitted in a single pass.
+    :param values:
+    :param average: volume or simple
+    :param excluded: See fit_mack.
+    :param ldf: Selected age-to-age factors with axes (..., development - 1). Defaults to the fitted ones. The
+    sigmas and standard errors are always those of the fit.
+    :param diagonal: See project_ultimates.
+    :return: As project_ultimates, plus the process risk, parameter risk and mack_std_err of each origin, with
+    axes (..., origin), and the total_process_risk, total_parameter_risk and total_mack_std_err, with the
+    leading axes.
+    """
+    fit = fit_mack(values, average=average, excluded=excluded)
+
+    if ldf is None:
+        ldf = fit["ldf"]
+    ldf = np.broadcast_to(ldf, fit["ldf"].shape)
+
+    cdf = np.ones(ldf.shape[:-1] + (ldf.shape[-1] + 1,))
+    cdf[..., :-1] = np.cumprod(ldf[..., ::-1], axis=-1)[..., ::-1]
+
+    results = project_ultimates(values, cdf, diagonal=diagonal)
+
+    # The projected cumulative values of every origin at every age from its latest diagonal on.
+    index = results["index"][..., np.newaxis]
+    ages = np.arange(values.shape[-1])
+    projected = results["latest"][..., np.newaxis] * results["cdf"][..., np.newaxis] / cdf[..., np.newaxis, :]
+    projected = np.where(ages >= index, np.nan_to_num(projected), 0.0)
+
+    exponent = AVERAGE_EXPONENTS[average]
+    sigma = fit["sigma"][..., np.newaxis, :]
+    std_err = fit["std_err"][..., np.newaxis, :]
+    factors = ldf[..., np.newaxis, :]
+
+    process_risk = np.zeros(results["latest"].shape)
+    parameter_risk = np.zeros(results["latest"].shape)
+    total_parameter_risk = np.zeros(process_risk.shape[:-1])
+
+    # Projections can be negative, e.g., after salvage, and the extrapolated sigmas of sparse segments can be
+    # too large to square. Errors that come out infinite are returned as empty, like those that cannot be
+    # estimated.
+    with np.errstate(over='ignore', invalid='ignore'):
+        for age in range(values.shape[-1] - 1):
+            current = projected[..., age]
+            process_risk = np.sqrt(
+                (sigma[..., age] * np.abs(current) ** (exponent / 2)) ** 2 + (factors[..., age] * process_risk) ** 2
+            )
+            parameter_risk = np.sqrt(
+                (std_err[..., age] * current) ** 2 + (factors[..., age] * parameter_risk) ** 2
+            )
+            total_parameter_risk = np.sqrt(
+                (fit["std_err"][..., age] * current.sum(axis=-1)) ** 2
+                + (ldf[..., age] * total_parameter_risk) ** 2
+            )
+
+        total_process_risk = np.sqrt((process_risk ** 2).sum(axis=-1))
+        total_mack_std_err = np.sqrt(total_process_risk ** 2 + total_parameter_risk ** 2)
+
+        mack_std_err = np.sqrt(process_risk ** 2 + parameter_risk ** 2)
+
+    # As with the IBNR, chainladder reports the errors of fully developed origins, which are zero, as empty.
+    empty = (mack_std_err == 0) | ~np.isfinite(mack_std_err)
+    total_empty = ~np.isfinite(total_mack_std_err)
+
+    results.update({
+        "ldf": ldf,
+        "sigma": fit["sigma"],
+        "std_err": fit["std_err"],
+        "process_risk": np.where(empty, np.nan, process_risk),
+        "parameter_risk": np.where(empty, np.nan, parameter_risk),
+        "mack_std_err": np.where(empty, np.nan, mack_std_err),
+        "total_process_risk": np.where(total_empty, np.nan, total_process_risk)[()],
+        "total_parameter_risk": np.where(total_empty, np.nan, total_parameter_risk)[()],
+        "total_mack_std_err": np.where(total_empty, np.nan, total_mack_std_err)[()]
+    })
+
+    return results
+
+
+def cumulative_values(triangle) -> np.ndarray:
+    """
+    Returns the cumulative values of a chainladder Triangle or an ArrayTriangle as a float array with axes
+    (index, column, origin, development).
+    :param triangle:
+    :return:
+    """
+    values = np.asarray(triangle.values, dtype=float)
+
+    if not triangle.is_cumulative:
+        values = to_cumulative(values)
+
+    return values
+
+
+def fit_triangle(
+        triangle,
+        method: str = "chainladder",
+        exposure=None,
+        average: str = "volume",
+        apriori=1.0
+) -> dict:
+    """
+    Fits a method to the total of a triangle's index keys, for its first column, and summarizes the result by
+    origin in the same form as engine.fit_task.
+    :param triangle: A chainladder Triangle or an ArrayTriangle.
+    :param method: One of NATIVE_METHODS.
+    :param exposure: A triangle of exposures, required for bornhuetter_ferguson and cape_cod. Its latest
+    diagonal is used.
+    :param average: volume or simple
+    :param apriori: Expected loss ratio of the Bornhuetter-Ferguson method.
+    :return:
+    """
+    if method not in NATIVE_METHODS:
+        raise ValueError("No native implementation of " + str(method) + ".")
+
+    values = segment_total(cumulative_values(triangle))
+
+    if method == "mack":
+        results = mack_chainladder(values, average=average)
+        return {
+            "origins": origin_labels(triangle),
+            "latest": _to_list(results["latest"]),
+            "ultimate": _to_list(results["ultimate"]),
+            "ibnr": _to_list(np.where(results["ibnr"] == 0, np.nan, results["ibnr"])),
+            "mack_std_err": _to_list(results["mack_std_err"]),
+            "total_mack_std_err": float(results["total_mack_std_err"])
+        }
+
+    ldf, cdf = fit_development(values, average=average)
+
+    if method == "development":
+        return {
+            "origins": [],
+            "ldf": ldf.tolist(),
+            "cdf": cdf[:-1].tolist()
+        }
+
+    if method == "chainladder":
+        results = project_ultimates(values, cdf)
+    else:
+        if exposure is None:
+            raise ValueError(method + " requires an exposure.")
+
+        exposure_values = segment_total(cumulative_values(exposure))
+        index, has_values = latest_index(exposure_values)
+        exposure_values = np.where(
+            has_values,
+            np.take_along_axis(exposure_values, index[:, np.newaxis], axis=-1)[:, 0],
+            np.nan
+        )
+
+        if method == "bornhuetter_ferguson":
+            results = bornhuetter_ferguson(values, cdf, exposure_values, apriori=apriori)
+        else:
+            results = cape_cod(values, cdf, exposure_values)
+
+    # chainladder reports the IBNR of fully developed origins, which is zero, as empty.
+    ibnr = np.where(results["ibnr"] == 0, np.nan, results["ibnr"])
+
+    return {
+        "origins": origin_labels(triangle),
+        "latest": _to_list(results["latest"]),
+        "ultimate": _to_list(results["ultimate"]),
+        "ibnr": _to_list(ibnr)
+    }
+
+
+def segment_total(values: np.ndarray) -> np.ndarray:
+    """
+    Sums the index keys of the first column of values with axes (index, column, origin, development). Cells
+    that are empty in every key stay empty.
+    :param values:
+    :return: Values with axes (origin, development).
+    """
+    values = values[:, 0]
+    total = np.nansum(values, axis=0)
+    total[np.isnan(values).all(axis=0)] = np.nan
+    return total
+
+
+def origin_labels(triangle) -> list:
+    # Origins as strings, e.g., '1998', for both chainladder Triangles and ArrayTriangles.
+    if hasattr(triangle, "origin_labels"):
+        return list(triangle.origin_labels)
+    return [str(origin) for origin in triangle.origin]
+
+
+def _to_list(values: np.ndarray) -> list:
+    return [None if value != value else float(value) for value in values.tolist()]
+
+
+def _loglinear_fill(sigma: np.ndarray) -> np.ndarray:
+    # Fills the missing sigmas of each segment by regressing the log of the others on their position, as
+    # chainladder's log-linear sigma interpolation does. Zero sigmas are kept in the regression as tiny values.
+    known = ~np.isnan(sigma)
+    log_sigma = np.log(np.where(sigma == 0, 1e-320, np.where(known, sigma, 1.0)))
+    position = np.arange(1, sigma.shape[-1] + 1, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        n_known = known.sum(axis=-1, keepdims=True)
+        mean_position = np.where(known, position, 0).sum(axis=-1, keepdims=True) / n_known
+        mean_log = np.where(known, log_sigma, 0).sum(axis=-1, keepdims=True) / n_known
+        slope = (
+            np.where(known, (position - mean_position) * (log_sigma - mean_log), 0).sum(axis=-1, keepdims=True)
+            / np.where(known, (position - mean_position) ** 2, 0).sum(axis=-1, keepdims=True)
+        )
+        fill = np.exp(mean_log + slope * (position - mean_position))
+
+    return np.where(known, sigma, fill)
@@ -0,0 +1,253 @@
+"""
+Batch reserving of every triangle in a project database. Triangles with the same origin and development axes
+are stacked into one array of segments, i.e., every index key and column of every triangle, and development
+factors, ultimates and IBNR are computed for all of them at once with the broadcast operations of native.py.
+The results are written back to the development_factor and reserve_result tables in one transaction.
+"""
+import json
+import logging
+import numpy as np
+import profiler
+import time
+
+from datetime import datetime
+
+from connection import (
+    get_engine,
+    get_session_factory
+)
+
+from native import (
+    diagonal_index,
+    fit_development,
+    project_ultimates,
+    to_cumulative
+)
+
+from schema import (
+    DevelopmentFactorTable,
+    ReserveResultTable,
+    TriangleTable
+)
+
+from triangle_store import triangle_from_row
+
+from uuid import uuid4
+
+
+def run_portfolio(db_path: str, average: str = "volume", progress_callback=None) -> dict:
+    """
+    Fits development and projects ultimates for every triangle in a database, and writes the factors and
+    results under a new run id. Safe to call from a worker thread.
+    :param db_path:
+    :param average: volume or simple
+    :param progress_callback: Called with (groups completed, total groups).
+    :return: A summary of the run.
+    """
+    start_time = time.perf_counter()
+    run_id = str(uuid4())
+    method = "chainladder_" + average
+    # Formatted as SQLAlchemy stores DateTime columns in SQLite, since rows are inserted through the driver.
+    created_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    with profiler.span("load portfolio", category="db"):
+        session = get_session_factory(db_path)()
+        rows = session.query(TriangleTable).all()
+        triangles = [(row.triangle_id, row.lob_id, triangle_from_row(row)) for row in rows]
+        session.close()
+
+    # Triangles can only be stacked if they have the same origins and ages.
+    groups = {}
+    for triangle_id, lob_id, triangle in triangles:
+        signature = (tuple(triangle.origin_labels), tuple(int(age) for age in triangle.ddims))
+        groups.setdefault(signature, []).append((triangle_id, lob_id, triangle))
+
+    factor_rows = []
+    result_rows = []
+    n_segments = 0
+    total_ibnr = 0.0
+
+    with profiler.span("fit portfolio", category="model", triangles=len(triangles)):
+        for completed, ((origins, ages), members) in enumerate(groups.items(), start=1):
+
+            values = []
+            diagonals = []
+            segments = []
+            for triangle_id, lob_id, triangle in members:
+                triangle_values = np.asarray(triangle.values, dtype=float)
+                if not triangle.is_cumulative:
+                    triangle_values = to_cumulative(triangle_values)
+                triangle_values = triangle_values.reshape((-1,) + triangle_values.shape[2:])
+                values.append(triangle_values)
+                # Triangles in a group can have different valuation dates.
+                diagonals.append(
+                    np.broadcast_to(diagonal_index(triangle_values), triangle_values.shape[:-1])
+                )
+                for key in triangle.kdims.tolist():
+                    key_json = json.dumps(key)
+                    for column in triangle.vdims:
+                        segments.append((triangle_id, lob_id, key_json, str(column)))
+
+            # Axes (segment, origin, development).
+            values = np.concatenate(values, axis=0)
+
+            ldf, cdf = fit_development(values, average=average)
+            results = project_ultimates(values, cdf, diagonal=np.concatenate(diagonals, axis=0))
+
+            n_segments += len(segments)
+            total_ibnr += float(np.nansum(results["ibnr"]))
+
+            factor_rows.extend(_factor_rows(run_id, method, created_on, segments, ages, ldf, cdf))
+            result_rows.extend(_result_rows(run_id, method, created_on, segments, origins, ages, results))
+
+            if progress_callback is not None:
+                progress_callback(completed, len(groups))
+
+    with profiler.span("write portfolio results", category="db", rows=len(factor_rows) + len(result_rows)):
+        with get_engine(db_path).begin() as connection:
+            if factor_rows:
+                _insert_rows(connection, DevelopmentFactorTable, FACTOR_COLUMNS, factor_rows)
+            if result_rows:
+                _insert_rows(connection, ReserveResultTable, RESULT_COLUMNS, result_rows)
+
+    summary = {
+        "run_id": run_id,
+        "triangles": len(triangles),
+        "segments": n_segments,
+        "ibnr": total_ibnr,
+        "seconds": time.perf_counter() - start_time
+    }
+
+    logging.info(
+        "Portfolio run %s: %s segments of %s triangles in %.3f seconds." % (
+            run_id,
+            n_segments,
+            len(triangles),
+            summary["seconds"]
+        )
+    )
+
+    return summary
+
+
+def start_portfolio_run(main_window):
+    """
+    Runs run_portfolio on the main window's thread pool.
+    :param main_window:
+    :return:
+    """
+    main_window.run_task(
+        run_portfolio,
+        main_window.db,
+        on_result=lambda result: portfolio_run_finished(main_window=main_window, result=result),
+        message="Reserving all triangles..."
+    )
+
+
+def portfolio_run_finished(main_window, result: dict):
+    main_window.statusBar().showMessage(
+        "Reserved %s segments of %s triangles in %.2f seconds. Total IBNR: %s." % (
+            result["segments"],
+            result["triangles"],
+            result["seconds"],
+            "{:,.0f}".format(result["ibnr"])
+        ),
+        10000
+    )
+
+
+# Columns written by run_portfolio, in the order of the tuples built by _factor_rows and _result_rows.
+FACTOR_COLUMNS = (
+    "run_id",
+    "triangle_id",
+    "lob_id",
+    "method",
+    "key",
+    "column",
+    "development",
+    "ldf",
+    "cdf",
+    "created_on"
+)
+
+RESULT_COLUMNS = (
+    "run_id",
+    "triangle_id",
+    "lob_id",
+    "method",
+    "key",
+    "column",
+    "origin",
+    "development",
+    "latest",
+    "cdf",
+    "ultimate",
+    "ibnr",
+    "created_on"
+)
+
+
+def _factor_rows(
+        run_id: str,
+        method: str,
+        created_on: str,
+        segments: list,
+        ages: tuple,
+        ldf: np.ndarray,
+        cdf: np.ndarray
+) -> list:
+    # The last age has no age-to-age factor. SQLite stores NaN as NULL.
+    ldf = np.concatenate([ldf, np.full(ldf.shape[:-1] + (1,), np.nan)], axis=-1)
+
+    segment_rows = [segment for segment in segments for _ in ages]
+
+    return [
+        (run_id, triangle_id, lob_id, method, key, column, age, age_ldf, age_cdf, created_on)
+        for (triangle_id, lob_id, key, column), age, age_ldf, age_cdf in zip(
+            segment_rows,
+            list(ages) * len(segments),
+            ldf.ravel().tolist(),
+            cdf.ravel().tolist()
+        )
+    ]
+
+
+def _result_rows(
+        run_id: str,
+        method: str,
+        created_on: str,
+        segments: list,
+        origins: tuple,
+        ages: tuple,
+        results: dict
+) -> list:
+    # Origins without a latest diagonal are left out.
+    positions = np.nonzero(~np.isnan(results["latest"]))
+    segment_positions, origin_positions = positions
+
+    ages = np.asarray(ages)
+    origins = np.asarray(origins, dtype=object)
+
+    return [
+        (run_id, *segments[segment], method, origin, age, latest, cdf, ultimate, ibnr, created_on)
+        for segment, origin, age, latest, cdf, ultimate, ibnr in zip(
+            segment_positions.tolist(),
+            origins[origin_positions].tolist(),
+            ages[results["index"][positions]].tolist(),
+            results["latest"][positions].tolist(),
+            results["cdf"][positions].tolist(),
+            results["ultimate"][positions].tolist(),
+            results["ibnr"][positions].tolist()
+        )
+    ]
+
+
+def _insert_rows(connection, table, columns: tuple, rows: list):
+    # Tuples are passed straight to the driver's executemany, which avoids SQLAlchemy's per-row processing of
+    # dictionaries. This matters for the hundreds of thousands of rows of a large portfolio.
+    statement = "INSERT INTO %s (%s) VALUES (%s)" % (
+        table.__tablename__,
+        ", ".join('"%s"' % column for column in columns),
+        ", ".join("?" for _ in columns)
+    )
+    connection.exec_driver_sql(statement, rows)
@@ -0,0 +1,271 @@
+"""
+Wall-clock profiling of the application, for tracking startup and interaction time from release to release.
+Profiling is off unless FASLR is started with --profile or the FASLR_PROFILE environment variable is set, in
+which case spans are recorded for startup phases, database queries, model construction and painting, and
+written on exit as a Chrome trace that can be opened in chrome://tracing, Perfetto or speedscope.
+
+python main.py --profile=faslr_trace.json --profile-exit -platform offscreen
+
+--profile-exit quits as soon as the window has been painted and the startup database has loaded, and
+-platform offscreen runs Qt without a display, e.g., on a build server.
+
+While profiling is off, span() returns a shared no-op context manager, so instrumented code pays for little
+more than a function call.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from constants import ROOT_PATH
+
+DEFAULT_TRACE_PATH = os.path.join(ROOT_PATH, 'faslr_trace.json')
+
+# Longest SQL statement text kept in the arguments of a query span.
+MAX_STATEMENT_LENGTH = 200
+
+_enabled = False
+_trace_path = None
+_events = []
+_events_lock = threading.Lock()
+_thread_names = {}
+_origin_ns = time.perf_counter_ns()
+
+
+class _Span:
+    """
+    Records a complete ("X") trace event covering the body of a with block.
+    """
+    __slots__ = ("name", "category", "args", "start_ns")
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        add_event(
+            name=self.name,
+            category=self.category,
+            start_ns=self.start_ns,
+            end_ns=time.perf_counter_ns(),
+            args=self.args
+        )
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(trace_path: str = None):
+    """
+    Turns profiling on. Events recorded from this point on are written to trace_path by write_trace.
+    :param trace_path:
+    :return:
+    """
+    global _enabled, _trace_path
+
+    _enabled = True
+    _trace_path = trace_path or DEFAULT_TRACE_PATH
+
+
+def enable_from_environment(argv: list) -> bool:
+    """
+    Turns profiling on if --profile[=path] or --profile-exit is among the command-line arguments or
+    FASLR_PROFILE is set. The environment variable may hold the trace path, or 1 to use the default one.
+    :param argv:
+    :return: Whether profiling was turned on.
+    """
+    trace_path = None
+    requested = False
+
+    for arg in argv:
+        if arg in ("--profile", "--profile-exit"):
+            requested = True
+        elif arg.startswith("--profile="):
+            requested = True
+            trace_path = arg.split("=", 1)[1]
+
+    environment_value = os.environ.get("FASLR_PROFILE", "")
+    if environment_value and environment_value != "0":
+        requested = True
+        if trace_path is None and environment_value != "1":
+            trace_path = environment_value
+
+    if requested:
+        enable(trace_path)
+
+    return requested
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, category: str = "app", **args):
+    """
+    Context manager recording the time spent in its body.
+
+    with profiler.span("build tree", category="model", countries=50):
+        ...
+    :param name:
+    :param category: Trace category, e.g., startup, db, model or paint.
+    :param args: Extra values shown alongside the event in the trace viewer.
+    :return:
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def instant(name: str, category: str = "app", **args):
+    """
+    Records a point in time, e.g., the first paint of the main window.
+    :param name:
+    :param category:
+    :param args:
+    :return:
+    """
+    if not _enabled:
+        return
+
+    now = time.perf_counter_ns()
+    add_event(name=name, category=category, start_ns=now, end_ns=None, args=args)
+
+
+def add_event(name: str, category: str, start_ns: int, end_ns: int = None, args: dict = None):
+    """
+    Appends an event, with times taken from time.perf_counter_ns. An event without an end is an instant.
+    :param name:
+    :param category:
+    :param start_ns:
+    :param end_ns:
+    :param args:
+    :return:
+    """
+    thread = threading.current_thread()
+    thread_id = threading.get_ident()
+
+    event = {
+        "name": name,
+        "cat": category,
+        "ts": (start_ns - _origin_ns) / 1000,
+        "pid": os.getpid(),
+        "tid": thread_id
+    }
+
+    if end_ns is None:
+        event["ph"] = "i"
+        event["s"] = "t"
+    else:
+        event["ph"] = "X"
+        event["dur"] = (end_ns - start_ns) / 1000
+
+    if args:
+        event["args"] = {key: _to_json(value) for key, value in args.items()}
+
+    with _events_lock:
+        _events.append(event)
+        # Threads started by Qt rather than by Python show up as Dummy-n.
+        _thread_names.setdefault(
+            thread_id,
+            "Worker-" + thread.name.split("-")[-1] if thread.name.startswith("Dummy") else thread.name
+        )
+
+
+def instrument_engine(engine):
+    """
+    Records a span for every statement executed through a SQLAlchemy engine.
+    :param engine:
+    :return:
+    """
+    from sqlalchemy import event
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiler_start_ns", []).append(time.perf_counter_ns())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_ns = conn.info["profiler_start_ns"].pop()
+        add_event(
+            name=statement.split(None, 1)[0].upper() if statement.strip() else "SQL",
+            category="db",
+            start_ns=start_ns,
+            end_ns=time.perf_counter_ns(),
+            args={
+                "statement": statement[:MAX_STATEMENT_LENGTH],
+                "executemany": executemany
+            }
+        )
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def get_trace() -> dict:
+    """
+    Returns the recorded events in Chrome trace format, with thread names as metadata events.
+    :return:
+    """
+    with _events_lock:
+        events = list(_events)
+        thread_names = dict(_thread_names)
+
+    metadata = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": thread_id,
+            "args": {"name": thread_name}
+        } for thread_id, thread_name in thread_names.items()
+    ]
+
+    return {
+        "traceEvents": metadata + events,
+        "displayTimeUnit": "ms",
+        "otherData": {"application": "FASLR"}
+    }
+
+
+def write_trace(trace_path: str = None) -> str:
+    """
+    Writes the recorded events to a JSON file.
+    :param trace_path: Defaults to the path given to enable.
+    :return: The path written to.
+    """
+    trace_path = trace_path or _trace_path or DEFAULT_TRACE_PATH
+
+    with open(trace_path, 'w') as trace_file:
+        json.dump(get_trace(), trace_file)
+
+    logging.info("Wrote profiling trace to " + trace_path)
+
+    return trace_path
+
+
+def clear():
+    with _events_lock:
+        _events.clear()
+        _thread_names.clear()
+
+
+def _to_json(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
@@ -7,26 +7,15 @@ from schema import (
     StateTable
 )
 
-from project_item import ProjectItem
-
-from PyQt5.QtCore import Qt
-
-from PyQt5.QtGui import (
-    QColor,
-    QKeySequence,
-    QStandardItem
-)
-
 from PyQt5.QtWidgets import (
-    QAction,
     QDialog,
     QDialogButtonBox,
     QFormLayout,
-    QLineEdit,
-    QMenu,
-    QTreeView
+    QLineEdit
 )
 
+from triangle_store import load_lob_triangle
+
 from uuid import uuid4
 
 
@@ -60,127 +49,157 @@ class ProjectDialog(QDialog):
 
     def make_project(self, main_window):
 
-        # connect to the database
-        print(main_window.db)
-        session, connection = connect_db(db_path=main_window.db)
-
         country_text = self.country_edit.text()
         state_text = self.state_edit.text()
         lob_text = self.lob_edit.text()
 
-        country = ProjectItem(
+        main_window.run_task(
+            create_project,
+            main_window.db,
             country_text,
-            set_bold=True
-        )
-
-        state = ProjectItem(
             state_text,
-        )
-
-        lob = ProjectItem(
             lob_text,
-            text_color=QColor(155, 0, 0)
+            on_result=lambda result: add_project_items(main_window=main_window, result=result),
+            message="Creating project..."
         )
 
-        country_query = session.query(CountryTable).filter(CountryTable.country_name == country_text)
+        self.close()
+
+
+def create_project(db_path, country_text, state_text, lob_text) -> dict:
+    """
+    Writes a new project to the database, creating the country and state if they do not already exist. Safe
+    to call from a worker thread. Returns the ids, names and UUIDs of the country, state and LOB, along with
+    which of them were created, for add_project_items.
+    :param db_path:
+    :param country_text:
+    :param state_text:
+    :param lob_text:
+    :return:
+    """
+    session, connection = connect_db(db_path=db_path)
+
+    country_query = session.query(CountryTable).filter(CountryTable.country_name == country_text)
+
+    new_project = ProjectTable()
+
+    existing_country = country_query.first()
+
+    if existing_country is None:
+
+        country_uuid = str(uuid4())
+        state_uuid = str(uuid4())
+        lob_uuid = str(uuid4())
+
+        new_country = CountryTable(country_name=country_text, project_tree_uuid=country_uuid)
+        new_state = StateTable(state_name=state_text, project_tree_uuid=state_uuid)
+        new_lob = LOBTable(lob_type=lob_text, project_tree_uuid=lob_uuid)
+
+        new_country.state = [new_state]
+        new_lob.country = new_country
+        new_lob.state = new_state
 
-        new_project = ProjectTable()
+        new_project.lob = new_lob
 
-        if country_query.first() is None:
+        created = "country"
 
-            country_uuid = str(uuid4())
+    else:
+        country_id = existing_country.country_id
+        country_uuid = existing_country.project_tree_uuid
+        existing_state = session.query(StateTable).filter(
+            StateTable.state_name == state_text
+        ).filter(
+            StateTable.country_id == country_id
+        ).first()
+
+        if existing_state is None:
             state_uuid = str(uuid4())
             lob_uuid = str(uuid4())
-
-            new_country = CountryTable(country_name=country_text, project_tree_uuid=country_uuid)
             new_state = StateTable(state_name=state_text, project_tree_uuid=state_uuid)
+            new_state.country = existing_country
             new_lob = LOBTable(lob_type=lob_text, project_tree_uuid=lob_uuid)
-
-            new_country.state = [new_state]
-            new_lob.country = new_country
+            new_lob.country = existing_country
             new_lob.state = new_state
 
             new_project.lob = new_lob
 
-            country.appendRow([state, QStandardItem(state_uuid)])
-            state.appendRow([lob, QStandardItem(lob_uuid)])
-
-            main_window.project_root.appendRow([country, QStandardItem(country_uuid)])
+            created = "state"
 
         else:
-            existing_country = country_query.first()
-            country_id = existing_country.country_id
-            country_uuid = existing_country.project_tree_uuid
-            state_query = session.query(StateTable).filter(
-                StateTable.state_name == state_text
-            ).filter(
-                StateTable.country_id == country_id
-            )
-
-            if state_query.first() is None:
-                state_uuid = str(uuid4())
-                lob_uuid = str(uuid4())
-                new_state = StateTable(state_name=state_text, project_tree_uuid=state_uuid)
-                new_state.country = existing_country
-                new_lob = LOBTable(lob_type=lob_text, project_tree_uuid=lob_uuid)
-                new_lob.country = existing_country
-                new_lob.state = new_state
-
-                new_project.lob = new_lob
-
-                country_tree_item = main_window.project_model.findItems(country_uuid, Qt.MatchExactly, 1)
-                if country_tree_item:
-                    ix = main_window.project_model.indexFromItem(country_tree_item[0])
-                    ix_col_0 = main_window.project_model.sibling(ix.row(), 0, ix)
-                    it_col_0 = main_window.project_model.itemFromIndex(ix_col_0)
-                    it_col_0.appendRow([state, QStandardItem(state_uuid)])
-                    state.appendRow([lob, QStandardItem(lob_uuid)])
-
-            else:
-                existing_state = state_query.first()
-                state_uuid = existing_state.project_tree_uuid
-                lob_uuid = str(uuid4())
-                new_lob = LOBTable(lob_type=lob_text, project_tree_uuid=lob_uuid)
-                new_lob.country = existing_country
-                new_lob.state = existing_state
-
-                new_project.lob = new_lob
-                state_tree_item = main_window.project_model.findItems(state_uuid, Qt.MatchRecursive, 1)
-                # state_tree_item = country_tree_item.findItems(state_uuid, Qt.MatchExactly, 1)
-                if state_tree_item:
-                    ix = main_window.project_model.indexFromItem(state_tree_item[0])
-                    ix_col_0 = main_window.project_model.sibling(ix.row(), 0, ix)
-                    it_col_0 = main_window.project_model.itemFromIndex(ix_col_0)
-                    it_col_0.appendRow([lob, QStandardItem(lob_uuid)])
-
-        session.add(new_project)
-
-        session.commit()
+            state_uuid = existing_state.project_tree_uuid
+            lob_uuid = str(uuid4())
+            new_lob = LOBTable(lob_type=lob_text, project_tree_uuid=lob_uuid)
+            new_lob.country = existing_country
+            new_lob.state = existing_state
+
+            new_project.lob = new_lob
+
+            created = "lob"
+
+    session.add(new_project)
 
+    session.commit()
+
+    result = {
+        "created": created,
+        "country": (new_lob.country_id, country_text, country_uuid),
+        "state": (new_lob.state_id, state_text, state_uuid),
+        "lob": (new_lob.lob_id, lob_text, lob_uuid)
+    }
+
+    session.close()
+    connection.close()
+
+    return result
+
+
+def open_lob_triangle(db_path, lob_id: int):
+    """
+    Reads the triangle saved for an LOB and rebuilds it as a chainladder Triangle for an AnalysisTab. Safe to
+    call from a worker thread, which is where the conversion should happen.
+    :param db_path:
+    :param lob_id:
+    :return: The name and triangle, or None if no triangle has been saved for the LOB.
+    """
+    session, connection = connect_db(db_path=db_path)
+
+    try:
+        stored = load_lob_triangle(session, lob_id)
+    finally:
+        session.close()
         connection.close()
 
-        # main_window.project_pane.expandAll()
+    if stored is None:
+        return None
 
-        print("new project created")
+    name, triangle = stored
 
-        self.close()
+    return name, triangle.to_chainladder()
+
+
+def add_project_items(main_window, result: dict):
+    """
+    Adds the nodes created by create_project to the project tree.
+    :param main_window:
+    :param result:
+    :return:
+    """
+    model = main_window.project_model
 
+    country_id, country_text, country_uuid = result["country"]
+    state_id, state_text, state_uuid = result["state"]
+    lob_id, lob_text, lob_uuid = result["lob"]
 
-class ProjectTreeView(QTreeView):
-    def __init__(self):
-        super().__init__()
+    if result["created"] == "country":
+        model.add_node(model.root, country_id, country_text, country_uuid)
 
-        self.new_analysis_action = QAction("&New Analysis", self)
-        self.new_analysis_action.setShortcut(QKeySequence("Ctrl+Shit+a"))
-        self.new_analysis_action.setStatusTip("Create a new reserve analysis.")
+    if result["created"] in ("country", "state"):
+        country = model.nodes.get(country_uuid)
+        if country is not None:
+            model.add_node(country, state_id, state_text, state_uuid)
 
+    state = model.nodes.get(state_uuid)
+    if state is not None:
+        model.add_node(state, lob_id, lob_text, lob_uuid)
 
-    def contextMenuEvent(self, event):
-        """
-        When right clicking a cell, activate context menu.
-        :param event:
-        :return:
-        """
-        menu = QMenu()
-        menu.addAction(self.new_analysis_action)
-        menu.exec(event.globalPos())
+    main_window.statusBar().showMessage("New project created.", 5000)
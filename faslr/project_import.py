@@ -0,0 +1,340 @@
+"""
+Bulk import of projects from a CSV or Excel manifest with one country, state and line of business per row.
+Each row becomes a new project, as if it had been entered in the New Project dialog, but the whole manifest
+is written in a single transaction: countries and states are looked up in dictionaries loaded once up front,
+ids are assigned in Python, and rows are inserted in batches of executemany statements.
+"""
+import csv
+import logging
+import os
+import profiler
+import sqlalchemy as sa
+import time
+
+from connection import (
+    get_engine,
+    populate_project_tree
+)
+
+from constants import QT_FILEPATH_OPTION
+
+from schema import (
+    CountryTable,
+    LOBTable,
+    ProjectTable,
+    StateTable
+)
+
+from PyQt5.QtWidgets import QFileDialog
+
+from uuid import uuid4
+
+# Accepted (lowercase) header names for each manifest column.
+MANIFEST_COLUMNS = {
+    "country": ("country", "country_name"),
+    "state": ("state", "state_name"),
+    "lob": ("lob", "lob_type", "line of business", "line_of_business")
+}
+
+# Rows written per executemany statement, and the number of manifest rows between progress reports.
+BATCH_SIZE = 5000
+
+
+def read_manifest(manifest_path: str):
+    """
+    Yields the (country, state, lob) rows of a manifest one at a time, so that the file is never held in memory
+    as a whole. CSV files are read with the csv module, xlsx files with openpyxl in read-only mode. The first
+    row must be a header naming the country, state and LOB columns, see MANIFEST_COLUMNS.
+    :param manifest_path:
+    :return:
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+
+    if extension in (".xlsx", ".xlsm"):
+        rows = _read_excel_rows(manifest_path)
+    elif extension in (".csv", ".txt"):
+        rows = _read_csv_rows(manifest_path)
+    else:
+        raise ValueError("Unsupported manifest type: " + extension)
+
+    header = next(rows, None)
+    if header is None:
+        return
+
+    positions = _get_column_positions(header)
+
+    for line_number, row in enumerate(rows, start=2):
+        values = [_clean(row[position]) if position < len(row) else "" for position in positions]
+
+        if not any(values):
+            continue
+
+        if not all(values):
+            raise ValueError(
+                "Row %s of %s is missing a country, state or line of business." % (line_number, manifest_path)
+            )
+
+        yield tuple(values)
+
+
+def count_manifest_rows(manifest_path: str) -> int:
+    """
+    Returns the number of data rows in a manifest, for progress reporting. CSV files are scanned in binary
+    blocks rather than parsed. For Excel files, the sheet dimensions are used.
+    :param manifest_path:
+    :return:
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+
+    if extension in (".xlsx", ".xlsm"):
+        openpyxl = _import_openpyxl()
+        workbook = openpyxl.load_workbook(manifest_path, read_only=True)
+        n_rows = workbook.active.max_row or 0
+        workbook.close()
+    else:
+        n_rows = 0
+        last_block = b""
+        with open(manifest_path, 'rb') as manifest:
+            for block in iter(lambda: manifest.read(1 << 20), b""):
+                n_rows += block.count(b"\n")
+                last_block = block
+        if last_block and not last_block.endswith(b"\n"):
+            n_rows += 1
+
+    return max(n_rows - 1, 0)
+
+
+def import_projects(
+        db_path: str,
+        manifest_path: str,
+        progress_callback=None,
+        batch_size: int = BATCH_SIZE
+) -> dict:
+    """
+    Writes every row of a manifest to the database as a new project, creating countries and states that do not
+    exist yet. Either all rows are imported or, if any of them fails, none are. Safe to call from a worker
+    thread.
+    :param db_path:
+    :param manifest_path:
+    :param progress_callback: Called with (rows imported, total rows) after each batch.
+    :param batch_size:
+    :return: Counts of the rows read and of the countries, states and LOBs created.
+    """
+    start_time = time.perf_counter()
+
+    total = count_manifest_rows(manifest_path) if progress_callback is not None else 0
+
+    engine = get_engine(db_path=db_path)
+
+    with profiler.span("import_projects", category="db", manifest=manifest_path), engine.begin() as connection:
+
+        # The driver only begins a transaction at the first insert, so the write lock is taken explicitly, before
+        # the caches and ids below are read. Otherwise another user could insert the same rows or ids in between.
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+        # Get-or-create caches, keyed by name, holding (id, project_tree_uuid).
+        countries = {
+            name: (country_id, uuid) for country_id, name, uuid in connection.execute(
+                sa.select(CountryTable.country_id, CountryTable.country_name, CountryTable.project_tree_uuid)
+            )
+        }
+        states = {
+            (country_id, name): (state_id, uuid) for state_id, country_id, name, uuid in connection.execute(
+                sa.select(
+                    StateTable.state_id,
+                    StateTable.country_id,
+                    StateTable.state_name,
+                    StateTable.project_tree_uuid
+                )
+            )
+        }
+
+        # Ids are assigned here rather than by SQLite, so that rows can be inserted in batches and still be
+        # referenced by the rows that depend on them. The write lock is held, so no one else can take them.
+        next_ids = {}
+        for table, column in (
+                (CountryTable, CountryTable.country_id),
+                (StateTable, StateTable.state_id),
+                (LOBTable, LOBTable.lob_id),
+                (ProjectTable, ProjectTable.project_id)
+        ):
+            next_ids[table] = (connection.execute(sa.select(sa.func.max(column))).scalar() or 0) + 1
+
+        pending = {
+            CountryTable: [],
+            StateTable: [],
+            LOBTable: [],
+            ProjectTable: []
+        }
+
+        counts = {
+            "rows": 0,
+            "countries": 0,
+            "states": 0,
+            "lobs": 0
+        }
+
+        for country_name, state_name, lob_type in read_manifest(manifest_path):
+
+            country = countries.get(country_name)
+            if country is None:
+                country = (next_ids[CountryTable], str(uuid4()))
+                next_ids[CountryTable] += 1
+                countries[country_name] = country
+                pending[CountryTable].append({
+                    "country_id": country[0],
+                    "country_name": country_name,
+                    "project_tree_uuid": country[1]
+                })
+                counts["countries"] += 1
+
+            country_id = country[0]
+
+            state = states.get((country_id, state_name))
+            if state is None:
+                state = (next_ids[StateTable], str(uuid4()))
+                next_ids[StateTable] += 1
+                states[(country_id, state_name)] = state
+                pending[StateTable].append({
+                    "state_id": state[0],
+                    "country_id": country_id,
+                    "state_name": state_name,
+                    "project_tree_uuid": state[1]
+                })
+                counts["states"] += 1
+
+            lob_id = next_ids[LOBTable]
+            next_ids[LOBTable] += 1
+            pending[LOBTable].append({
+                "lob_id": lob_id,
+                "country_id": country_id,
+                "state_id": state[0],
+                "lob_type": lob_type,
+                "project_tree_uuid": str(uuid4())
+            })
+            counts["lobs"] += 1
+
+            pending[ProjectTable].append({
+                "project_id": next_ids[ProjectTable],
+                "lob_id": lob_id
+            })
+            next_ids[ProjectTable] += 1
+
+            counts["rows"] += 1
+
+            if counts["rows"] % batch_size == 0:
+                _flush(connection, pending)
+                if progress_callback is not None:
+                    progress_callback(counts["rows"], max(total, counts["rows"]))
+
+        _flush(connection, pending)
+
+    # Blank rows are counted in the total, so report completion explicitly.
+    if progress_callback is not None:
+        progress_callback(counts["rows"], counts["rows"])
+
+    counts["seconds"] = time.perf_counter() - start_time
+
+    logging.info(
+        "Imported %s projects from %s in %.3f seconds." % (counts["rows"], manifest_path, counts["seconds"])
+    )
+
+    return counts
+
+
+def open_import_dialog(main_window):
+    """
+    Asks for a manifest and imports it on the main window's thread pool. The project tree is reloaded once the
+    import is complete.
+    :param main_window:
+    :return:
+    """
+    manifest_path = QFileDialog.getOpenFileName(
+        main_window,
+        'Import Projects',
+        '',
+        "Project Manifest (*.csv *.xlsx)",
+        options=QT_FILEPATH_OPTION)[0]
+
+    if manifest_path == "":
+        return
+
+    main_window.run_task(
+        import_projects,
+        main_window.db,
+        manifest_path,
+        on_result=lambda result: projects_imported(main_window=main_window, result=result),
+        message="Importing projects from " + manifest_path + "..."
+    )
+
+
+def projects_imported(main_window, result: dict):
+    """
+    Reloads the project tree after an import, and reports what was created.
+    :param main_window:
+    :param result:
+    :return:
+    """
+    populate_project_tree(db_filename=main_window.db, main_window=main_window)
+
+    main_window.statusBar().showMessage(
+        "Imported %s projects (%s new countries, %s new states) in %.2f seconds." % (
+            result["rows"],
+            result["countries"],
+            result["states"],
+            result["seconds"]
+        ),
+        10000
+    )
+
+
+def _flush(connection, pending: dict):
+    # Parents are inserted before the rows that reference them.
+    for table in (CountryTable, StateTable, LOBTable, ProjectTable):
+        rows = pending[table]
+        if rows:
+            connection.execute(sa.insert(table), rows)
+            rows.clear()
+
+
+def _get_column_positions(header: list) -> list:
+    names = [_clean(name).lower() for name in header]
+
+    positions = []
+    for column, aliases in MANIFEST_COLUMNS.items():
+        matches = [i for i, name in enumerate(names) if name in aliases]
+        if not matches:
+            raise ValueError("Manifest has no " + column + " column. Expected one of: " + ", ".join(aliases))
+        positions.append(matches[0])
+
+    return positions
+
+
+def _read_csv_rows(manifest_path: str):
+    # utf-8-sig drops the byte order mark that Excel writes at the start of CSV files.
+    with open(manifest_path, newline='', encoding='utf-8-sig') as manifest:
+        yield from csv.reader(manifest)
+
+
+def _read_excel_rows(manifest_path: str):
+    openpyxl = _import_openpyxl()
+
+    workbook = openpyxl.load_workbook(manifest_path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _import_openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("Importing Excel manifests requires openpyxl, e.g., pip install openpyxl.")
+    return openpyxl
+
+
+def _clean(value) -> str:
+    if value is None:
+        return ""
+    return str(value).strip()
@@ -0,0 +1,305 @@
+"""
+Model and view for the project hierarchy shown in the navigation pane. Only the countries are read when a
+database is opened; the states and LOBs beneath a node are read from the database the first time it is
+expanded, off the GUI thread.
+"""
+from PyQt5.QtCore import (
+    QAbstractItemModel,
+    QModelIndex,
+    Qt,
+    QThreadPool
+)
+
+from PyQt5.QtGui import (
+    QColor,
+    QFont,
+    QKeySequence
+)
+
+from PyQt5.QtWidgets import (
+    QAction,
+    QMenu,
+    QTreeView
+)
+
+from worker import Worker
+
+COUNTRY = 0
+STATE = 1
+LOB = 2
+
+HEADER_LABELS = ["Project", "Project_UUID"]
+
+
+class ProjectNode:
+    """
+    A country, state or LOB in the project tree. Children are only populated once the node has been
+    fetched; until then, has_children tells the view whether to draw an expansion arrow. loading is set while
+    the children are being read, so that they are not requested twice.
+    """
+    __slots__ = (
+        "level",
+        "node_id",
+        "name",
+        "uuid",
+        "parent",
+        "row",
+        "children",
+        "has_children",
+        "loaded",
+        "loading"
+    )
+
+    def __init__(self, level=None, node_id=None, name="", uuid="", parent=None, row=0, has_children=False):
+        self.level = level
+        self.node_id = node_id
+        self.name = name
+        self.uuid = uuid
+        self.parent = parent
+        self.row = row
+        self.children = []
+        self.has_children = has_children
+        self.loaded = False
+        self.loading = False
+
+
+class ProjectTreeModel(QAbstractItemModel):
+    def __init__(self, parent=None, run_task=None):
+        """
+        :param parent:
+        :param run_task: Runs the queries of nodes being expanded, e.g., MainWindow.run_task. Defaults to
+        starting a Worker on the global thread pool.
+        """
+        super(ProjectTreeModel, self).__init__(parent)
+
+        self.run_task = run_task
+        self.workers = set()
+
+        self.db_filename = None
+        self.root = ProjectNode()
+        self.root.loaded = True
+
+        # Maps the project_tree_uuid of every loaded node to the node.
+        self.nodes = {}
+
+        # Fonts and colors are shared by all nodes of a level rather than created per node.
+        country_font = QFont('Open Sans', 12)
+        country_font.setBold(True)
+        self.fonts = {
+            COUNTRY: country_font,
+            STATE: QFont('Open Sans', 12),
+            LOB: QFont('Open Sans', 12)
+        }
+        self.colors = {
+            COUNTRY: QColor(0, 0, 0),
+            STATE: QColor(0, 0, 0),
+            LOB: QColor(155, 0, 0)
+        }
+
+    def set_database(self, db_filename, countries: list):
+        """
+        Replaces the contents of the model with the countries of a database, as returned by
+        fetch_project_nodes.
+        :param db_filename:
+        :param countries:
+        :return:
+        """
+        self.beginResetModel()
+        self.db_filename = db_filename
+        self.root = ProjectNode()
+        self.root.loaded = True
+        self.nodes = {}
+        self._append_nodes(self.root, COUNTRY, countries)
+        self.endResetModel()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column, self.node_from_index(parent).children[row])
+
+    def parent(self, index=QModelIndex()):
+        if not index.isValid():
+            return QModelIndex()
+
+        parent_node = index.internalPointer().parent
+        if parent_node is self.root or parent_node is None:
+            return QModelIndex()
+
+        return self.createIndex(parent_node.row, 0, parent_node)
+
+    def rowCount(self, parent=QModelIndex(), *args, **kwargs):
+        if parent.column() > 0:
+            return 0
+        return len(self.node_from_index(parent).children)
+
+    def columnCount(self, parent=QModelIndex(), *args, **kwargs):
+        return len(HEADER_LABELS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        node = self.node_from_index(parent)
+        if node.loaded:
+            return bool(node.children)
+        return node.has_children
+
+    def canFetchMore(self, parent=QModelIndex()):
+        node = self.node_from_index(parent)
+        return node is not self.root and not node.loaded and not node.loading and node.has_children
+
+    def fetchMore(self, parent=QModelIndex()):
+        """
+        Reads the children of a node on the thread pool. They are inserted once the query returns; if it fails,
+        the node can be expanded again to retry.
+        :param parent:
+        :return:
+        """
+        # Imported here so that SQLAlchemy is not loaded until a database is opened.
+        from connection import fetch_project_nodes
+
+        node = self.node_from_index(parent)
+        if node.loading:
+            return
+
+        node.loading = True
+
+        if node.level == COUNTRY:
+            args = (self.db_filename, STATE)
+            kwargs = {"country_id": node.node_id}
+        else:
+            args = (self.db_filename, LOB)
+            kwargs = {"country_id": node.parent.node_id, "state_id": node.node_id}
+
+        self.start_task(
+            fetch_project_nodes,
+            *args,
+            on_result=lambda rows: self.nodes_fetched(node, rows),
+            on_finished=lambda: setattr(node, "loading", False),
+            message="Loading " + node.name + "...",
+            **kwargs
+        )
+
+    def nodes_fetched(self, node: ProjectNode, rows: list):
+        # The database may have been replaced while the query ran, leaving the node out of the model.
+        if self.nodes.get(node.uuid) is not node:
+            return
+
+        node.loaded = True
+
+        if rows:
+            first_row = len(node.children)
+            self.beginInsertRows(self.index_from_node(node), first_row, first_row + len(rows) - 1)
+            self._append_nodes(node, node.level + 1, rows)
+            self.endInsertRows()
+
+    def start_task(self, fn, *args, on_result=None, on_finished=None, message: str = None, **kwargs):
+        if self.run_task is not None:
+            return self.run_task(fn, *args, on_result=on_result, on_finished=on_finished, message=message, **kwargs)
+
+        # The model is used on its own, e.g., outside of the main window.
+        worker = Worker(fn, *args, **kwargs)
+        worker.setAutoDelete(False)
+        self.workers.add(worker)
+        if on_result is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.result.connect(on_result)
+        if on_finished is not None:
+            # noinspection PyUnresolvedReferences
+            worker.signals.finished.connect(on_finished)
+        # noinspection PyUnresolvedReferences
+        worker.signals.finished.connect(lambda: self.workers.discard(worker))
+        QThreadPool.globalInstance().start(worker)
+
+        return worker
+
+    def data(self, index, role=None):
+        if not index.isValid():
+            return None
+
+        node = index.internalPointer()
+
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return node.name
+            return node.uuid
+
+        if role == Qt.FontRole and index.column() == 0:
+            return self.fonts[node.level]
+
+        if role == Qt.ForegroundRole and index.column() == 0:
+            return self.colors[node.level]
+
+    def headerData(self, p_int, qt_orientation, role=None):
+        if role == Qt.DisplayRole and qt_orientation == Qt.Horizontal:
+            return HEADER_LABELS[p_int]
+
+    def node_from_index(self, index: QModelIndex) -> ProjectNode:
+        if index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    def index_from_node(self, node: ProjectNode, column=0) -> QModelIndex:
+        if node is self.root:
+            return QModelIndex()
+        return self.createIndex(node.row, column, node)
+
+    def add_node(self, parent: ProjectNode, node_id: int, name: str, uuid: str):
+        """
+        Adds a node that has just been written to the database. If the parent has children that have not
+        been fetched yet, the new node is left to be read along with them.
+        :param parent:
+        :param node_id:
+        :param name:
+        :param uuid:
+        :return:
+        """
+        if parent is not self.root and not parent.loaded and parent.has_children:
+            return
+
+        parent.loaded = True
+        row = len(parent.children)
+
+        if parent is self.root:
+            level = COUNTRY
+        else:
+            level = parent.level + 1
+
+        self.beginInsertRows(self.index_from_node(parent), row, row)
+        self._append_nodes(parent, level, [(node_id, name, uuid, False)])
+        self.endInsertRows()
+
+    def _append_nodes(self, parent: ProjectNode, level: int, rows: list):
+        first_row = len(parent.children)
+        for offset, (node_id, name, uuid, has_children) in enumerate(rows):
+            node = ProjectNode(
+                level=level,
+                node_id=node_id,
+                name=name,
+                uuid=uuid,
+                parent=parent,
+                row=first_row + offset,
+                has_children=bool(has_children)
+            )
+            # LOBs are the leaves of the tree.
+            node.loaded = level == LOB
+            parent.children.append(node)
+            self.nodes[uuid] = node
+
+
+class ProjectTreeView(QTreeView):
+    def __init__(self):
+        super().__init__()
+
+        self.new_analysis_action = QAction("&New Analysis", self)
+        self.new_analysis_action.setShortcut(QKeySequence("Ctrl+Shit+a"))
+        self.new_analysis_action.setStatusTip("Create a new reserve analysis.")
+
+    def contextMenuEvent(self, event):
+        """
+        When right clicking a cell, activate context menu.
+        :param event:
+        :return:
+        """
+        menu = QMenu()
+        menu.addAction(self.new_analysis_action)
+        menu.exec(event.globalPos())
@@ -1,13 +1,22 @@
+import logging
+
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
+    Boolean,
     Column,
     DateTime,
+    Float,
+    Index,
     Integer,
     ForeignKey,
-    String
+    LargeBinary,
+    String,
+    Text
 )
 
+from sqlalchemy.exc import IntegrityError
+
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
@@ -16,6 +25,10 @@ Base = declarative_base()
 class ProjectTable(Base):
     __tablename__ = 'project'
 
+    __table_args__ = (
+        Index('ix_project_lob_id', 'lob_id'),
+    )
+
     project_id = Column(
         Integer,
         primary_key=True
@@ -44,6 +57,10 @@ class ProjectTable(Base):
         "UserTable", back_populates="project"
     )
 
+    triangle = relationship(
+        "TriangleTable", back_populates="project"
+    )
+
     def __repr__(self):
         return "<ProjectTable(" \
                "lob_id='%s', " \
@@ -57,6 +74,11 @@ class ProjectTable(Base):
 class CountryTable(Base):
     __tablename__ = 'country'
 
+    __table_args__ = (
+        Index('ix_country_country_name', 'country_name', unique=True),
+        Index('ix_country_project_tree_uuid', 'project_tree_uuid', unique=True),
+    )
+
     country_id = Column(
         Integer,
         primary_key=True
@@ -89,6 +111,11 @@ class CountryTable(Base):
 class StateTable(Base):
     __tablename__ = 'state'
 
+    __table_args__ = (
+        Index('ix_state_country_id_state_name', 'country_id', 'state_name', unique=True),
+        Index('ix_state_project_tree_uuid', 'project_tree_uuid', unique=True),
+    )
+
     state_id = Column(
         Integer,
         primary_key=True
@@ -120,6 +147,11 @@ class StateTable(Base):
 class LOBTable(Base):
     __tablename__ = 'lob'
 
+    __table_args__ = (
+        Index('ix_lob_country_id_state_id', 'country_id', 'state_id'),
+        Index('ix_lob_project_tree_uuid', 'project_tree_uuid', unique=True),
+    )
+
     lob_id = Column(
         Integer,
         primary_key=True
@@ -153,6 +185,10 @@ class LOBTable(Base):
         "ProjectTable", back_populates="lob"
     )
 
+    triangle = relationship(
+        "TriangleTable", back_populates="lob"
+    )
+
     def __repr__(self):
         return "LOBTable(" \
                "lob_type='%s', " \
@@ -163,6 +199,211 @@ class LOBTable(Base):
                )
 
 
+class TriangleTable(Base):
+    """
+    Stores a whole triangle as one binary block of its dense values, with axes (index, column, origin,
+    development) as in chainladder, alongside the axis labels needed to interpret it. See triangle_store.py.
+    """
+    __tablename__ = 'triangle'
+
+    __table_args__ = (
+        Index('ix_triangle_lob_id', 'lob_id'),
+        Index('ix_triangle_project_id', 'project_id'),
+    )
+
+    triangle_id = Column(
+        Integer,
+        primary_key=True
+    )
+
+    project_id = Column(
+        Integer,
+        ForeignKey('project.project_id')
+    )
+
+    lob_id = Column(
+        Integer,
+        ForeignKey('lob.lob_id')
+    )
+
+    name = Column(String)
+
+    # Values are stored as raw bytes in C order. Compression is either 'none' or 'zlib'.
+    dtype = Column(String)
+
+    shape = Column(String)
+
+    compression = Column(String)
+
+    values_blob = Column(LargeBinary)
+
+    # Axis labels, stored as JSON.
+    key_labels = Column(Text)
+
+    keys = Column(Text)
+
+    columns = Column(Text)
+
+    origins = Column(Text)
+
+    origin_labels = Column(Text)
+
+    developments = Column(Text)
+
+    origin_grain = Column(String)
+
+    development_grain = Column(String)
+
+    is_cumulative = Column(Boolean)
+
+    created_on = Column(
+        DateTime,
+        default=datetime.now
+    )
+
+    project = relationship(
+        "ProjectTable", back_populates="triangle"
+    )
+
+    lob = relationship(
+        "LOBTable", back_populates="triangle"
+    )
+
+    def __repr__(self):
+        return "TriangleTable(" \
+               "name='%s', " \
+               "shape='%s', " \
+               ")>" % (
+                   self.name,
+                   self.shape
+               )
+
+
+class DevelopmentFactorTable(Base):
+    """
+    Age-to-age and age-to-ultimate factors fitted by a reserving run, one row per triangle, index key, column
+    and age. See portfolio.py.
+    """
+    __tablename__ = 'development_factor'
+
+    __table_args__ = (
+        Index('ix_development_factor_run_id', 'run_id'),
+        Index('ix_development_factor_triangle_id', 'triangle_id'),
+    )
+
+    development_factor_id = Column(
+        Integer,
+        primary_key=True
+    )
+
+    # Identifies the rows written by one run, as a UUID.
+    run_id = Column(String)
+
+    triangle_id = Column(
+        Integer,
+        ForeignKey('triangle.triangle_id')
+    )
+
+    lob_id = Column(
+        Integer,
+        ForeignKey('lob.lob_id')
+    )
+
+    method = Column(String)
+
+    # Index key, stored as JSON.
+    key = Column(Text)
+
+    column = Column(String)
+
+    development = Column(Integer)
+
+    ldf = Column(Float)
+
+    cdf = Column(Float)
+
+    created_on = Column(
+        DateTime,
+        default=datetime.now
+    )
+
+    def __repr__(self):
+        return "DevelopmentFactorTable(" \
+               "column='%s', " \
+               "development='%s', " \
+               "ldf='%s', " \
+               ")>" % (
+                   self.column,
+                   self.development,
+                   self.ldf
+               )
+
+
+class ReserveResultTable(Base):
+    """
+    Projected ultimates and IBNR of a reserving run, one row per triangle, index key, column and origin. See
+    portfolio.py.
+    """
+    __tablename__ = 'reserve_result'
+
+    __table_args__ = (
+        Index('ix_reserve_result_run_id', 'run_id'),
+        Index('ix_reserve_result_triangle_id', 'triangle_id'),
+    )
+
+    reserve_result_id = Column(
+        Integer,
+        primary_key=True
+    )
+
+    run_id = Column(String)
+
+    triangle_id = Column(
+        Integer,
+        ForeignKey('triangle.triangle_id')
+    )
+
+    lob_id = Column(
+        Integer,
+        ForeignKey('lob.lob_id')
+    )
+
+    method = Column(String)
+
+    key = Column(Text)
+
+    column = Column(String)
+
+    origin = Column(String)
+
+    # Age of the latest diagonal.
+    development = Column(Integer)
+
+    latest = Column(Float)
+
+    cdf = Column(Float)
+
+    ultimate = Column(Float)
+
+    ibnr = Column(Float)
+
+    created_on = Column(
+        DateTime,
+        default=datetime.now
+    )
+
+    def __repr__(self):
+        return "ReserveResultTable(" \
+               "column='%s', " \
+               "origin='%s', " \
+               "ultimate='%s', " \
+               ")>" % (
+                   self.column,
+                   self.origin,
+                   self.ultimate
+               )
+
+
 class UserTable(Base):
     __tablename__ = 'user'
 
@@ -180,3 +421,22 @@ class UserTable(Base):
                ")>" % (
 
                )
+
+
+def upgrade_schema(engine):
+    """
+    Brings a database file created by an earlier version of FASLR up to date by creating any tables and
+    indexes declared above that it lacks. Uniqueness is declared through unique indexes rather than table
+    constraints, since SQLite cannot add constraints to an existing table. If the existing data violate one of
+    them, the index is skipped and a warning is logged.
+    :param engine:
+    :return:
+    """
+    Base.metadata.create_all(engine)
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except IntegrityError:
+                logging.warning("Could not create index " + index.name + " due to duplicate values.")
@@ -9,7 +9,10 @@ import os
 from constants import (
     CONFIG_PATH,
     QT_FILEPATH_OPTION,
-    SETTINGS_LIST
+    SETTINGS_LIST,
+    SQLITE_JOURNAL_MODES,
+    SQLITE_PROFILES,
+    SQLITE_SYNCHRONOUS_LEVELS
 )
 
 from PyQt5.QtCore import (
@@ -19,14 +22,17 @@ from PyQt5.QtCore import (
 )
 
 from PyQt5.QtWidgets import (
+    QComboBox,
     QDialog,
     QDialogButtonBox,
     QFileDialog,
+    QFormLayout,
     QLabel,
     QListView,
     QPushButton,
     QWidget,
     QVBoxLayout,
+    QSpinBox,
     QSplitter,
     QStackedWidget
 )
@@ -85,14 +91,17 @@ class SettingsDialog(QDialog):
         self.startup_connected_container = QWidget()
         self.startup_unconnected_container = QWidget()
         self.user_container = QWidget()
+        self.database_container = QWidget()
 
         self.startup_unconnected_layout()
         self.startup_connected_layout()
         self.user_layout()
+        self.database_layout()
 
         self.configuration_layout.addWidget(self.startup_connected_container)
         self.configuration_layout.addWidget(self.startup_unconnected_container)
         self.configuration_layout.addWidget(self.user_container)
+        self.configuration_layout.addWidget(self.database_container)
         self.configuration_layout.setCurrentIndex(0)
         self.list_pane.setCurrentIndex(self.list_model.index(0))
         self.update_config_layout(self.list_pane.currentIndex())
@@ -127,6 +136,8 @@ class SettingsDialog(QDialog):
                 self.configuration_layout.setCurrentIndex(1)
         elif index.data() == "User":
             self.configuration_layout.setCurrentIndex(2)
+        elif index.data() == "Database":
+            self.configuration_layout.setCurrentIndex(3)
 
     def startup_unconnected_layout(self):
         """
@@ -171,6 +182,106 @@ class SettingsDialog(QDialog):
         delete_configuration_button.clicked.connect(self.delete_configuration)
         self.user_container.setLayout(layout)
 
+    def database_layout(self):
+        """
+        Layout for the SQLite connection profile. Picking a profile fills in its settings, which can then be
+        adjusted before saving. Sizes are shown in MB.
+        :return:
+        """
+        # Imported here, as connection loads SQLAlchemy, which is not needed until a database is opened.
+        from connection import get_database_config
+
+        database_config = get_database_config(self.config_path)
+
+        self.profile_box = QComboBox()
+        self.profile_box.addItems(list(SQLITE_PROFILES))
+        self.profile_box.setCurrentText(database_config["profile"])
+
+        self.journal_mode_box = QComboBox()
+        self.journal_mode_box.addItems(list(SQLITE_JOURNAL_MODES))
+        self.journal_mode_box.setStatusTip(
+            "WAL lets readers work while another user writes. Avoid it on network drives."
+        )
+
+        self.synchronous_box = QComboBox()
+        self.synchronous_box.addItems(list(SQLITE_SYNCHRONOUS_LEVELS))
+
+        self.busy_timeout_box = QSpinBox()
+        self.busy_timeout_box.setRange(0, 600000)
+        self.busy_timeout_box.setSingleStep(1000)
+        self.busy_timeout_box.setSuffix(" ms")
+
+        self.cache_size_box = QSpinBox()
+        self.cache_size_box.setRange(1, 4096)
+        self.cache_size_box.setSuffix(" MB")
+
+        self.mmap_size_box = QSpinBox()
+        self.mmap_size_box.setRange(0, 65536)
+        self.mmap_size_box.setSuffix(" MB")
+
+        self.set_database_fields(database_config["pragmas"])
+
+        save_button = QPushButton("Save")
+        note = QLabel("Changes apply the next time FASLR connects to a database.")
+
+        form = QFormLayout()
+        form.addRow("Profile: ", self.profile_box)
+        form.addRow("Journal mode: ", self.journal_mode_box)
+        form.addRow("Synchronous: ", self.synchronous_box)
+        form.addRow("Busy timeout: ", self.busy_timeout_box)
+        form.addRow("Cache size: ", self.cache_size_box)
+        form.addRow("Memory map size: ", self.mmap_size_box)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(note)
+        layout.addWidget(save_button)
+        layout.setAlignment(Qt.AlignTop)
+        # noinspection PyUnresolvedReferences
+        self.profile_box.currentTextChanged.connect(self.profile_changed)
+        # noinspection PyUnresolvedReferences
+        save_button.clicked.connect(self.save_database_config)
+        self.database_container.setLayout(layout)
+
+    def set_database_fields(self, pragmas: dict):
+        self.journal_mode_box.setCurrentText(pragmas["journal_mode"])
+        self.synchronous_box.setCurrentText(pragmas["synchronous"])
+        self.busy_timeout_box.setValue(pragmas["busy_timeout"])
+        # A negative cache_size is in KiB, a positive one in pages.
+        cache_size = pragmas["cache_size"]
+        self.cache_size_box.setValue(max(1, -cache_size // 1000 if cache_size < 0 else cache_size * 4 // 1000))
+        self.mmap_size_box.setValue(pragmas["mmap_size"] // 2 ** 20)
+
+    def database_pragmas(self) -> dict:
+        return {
+            "busy_timeout": self.busy_timeout_box.value(),
+            "journal_mode": self.journal_mode_box.currentText(),
+            "synchronous": self.synchronous_box.currentText(),
+            "cache_size": -self.cache_size_box.value() * 1000,
+            "mmap_size": self.mmap_size_box.value() * 2 ** 20
+        }
+
+    def profile_changed(self, profile):
+        self.set_database_fields(SQLITE_PROFILES[profile])
+
+    def save_database_config(self):
+        """
+        Writes the profile to the configuration file, along with only those settings that differ from it.
+        :return:
+        """
+        profile = self.profile_box.currentText()
+        overrides = {
+            pragma: value for pragma, value in self.database_pragmas().items()
+            if value != SQLITE_PROFILES[profile][pragma]
+        }
+        from connection import set_database_config
+
+        set_database_config(profile, overrides, config_path=self.config_path)
+
+        # Reloaded, so that the startup settings do not write back a stale DATABASE section.
+        self.config = configparser.ConfigParser()
+        self.config.read(self.config_path)
+
     def reset_connection(self):
         """
         This method decouples the database from automatic connection upon startup, and returns the layout
@@ -212,3 +323,13 @@ class SettingsDialog(QDialog):
         self.parent().close()
         os.remove(CONFIG_PATH)
         QCoreApplication.instance().quit()
+
+
+def get_startup_db_path():
+    config_path = CONFIG_PATH
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    config.sections()
+    startup_db = config['STARTUP_CONNECTION']['startup_db']
+
+    return startup_db
@@ -0,0 +1,261 @@
+"""
+Bootstrap simulation of reserve ranges with the over-dispersed Poisson (ODP) model of England and Verrall, as in
+chainladder.BootstrapODPSample. The scaled Pearson residuals of a chainladder fit are resampled to build pseudo
+triangles, each pseudo triangle is developed with its own factors, and gamma process noise is added to the
+projected future increments.
+
+Simulations are generated in batches, each one a single set of vectorized operations on arrays with axes
+(simulation, origin, development). Batches are independent, so they are distributed over the reserving engine's
+pool. Every batch draws from its own random stream, spawned from one seed by segment and batch number, so results
+are reproducible whichever backend and number of workers run them.
+
+summaries = run_bootstrap([("wkcomp", wkcomp), ("ppauto", ppauto)], n_sims=10000, seed=42)
+"""
+import numpy as np
+import time
+
+from engine import get_reserving_engine
+
+from native import (
+    cumulative_values,
+    diagonal_index,
+    fit_development,
+    segment_total
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Percentiles of the total IBNR reported in each summary.
+PERCENTILES = (50, 75, 90, 95, 99, 99.5)
+
+
+def fit_odp(values: np.ndarray, hat_adj: bool = True) -> dict:
+    """
+    Fits the ODP model of a cumulative triangle with axes (origin, development): the expected increments implied
+    by volume-weighted chainladder factors, the scaled Pearson residuals, and the scale parameter.
+    :param values:
+    :param hat_adj: Adjust the residuals with the hat matrix, as chainladder does by default, rather than only
+    for the degrees of freedom.
+    :return:
+    """
+    n_origins, n_ages = values.shape
+
+    diagonal = diagonal_index(values)
+    ages = np.arange(n_ages)
+    observed = ages[np.newaxis, :] <= diagonal[:, np.newaxis]
+
+    ldf, cdf = fit_development(values)
+
+    # Expected cumulative values, backed out from the latest diagonal with the fitted factors.
+    latest = values[np.arange(n_origins), diagonal]
+    expected = latest[:, np.newaxis] * cdf[diagonal][:, np.newaxis] / cdf[np.newaxis, :]
+    expected_increments = np.diff(expected, axis=1, prepend=0)
+    expected_increments = np.where(observed, np.nan_to_num(expected_increments), np.nan)
+
+    increments = np.diff(np.nan_to_num(values), axis=1, prepend=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residuals = (increments - expected_increments) / np.sqrt(np.abs(expected_increments))
+
+    residuals = np.where(observed, residuals, np.nan)
+
+    n_params = n_origins + n_ages - 1
+    degrees_of_freedom = observed.sum() - n_params
+    if degrees_of_freedom <= 0:
+        raise ValueError("The triangle has too few cells to fit the ODP model.")
+
+    scale = np.nansum(residuals ** 2) / degrees_of_freedom
+
+    if hat_adj:
+        residuals = residuals * _hat_adjustment(expected_increments, observed)
+    else:
+        residuals = residuals * np.sqrt(observed.sum() / degrees_of_freedom)
+
+    # Zero residuals, e.g., of the corner cells, carry no information. The rest are centered.
+    distribution = residuals[np.isfinite(residuals) & (residuals != 0)]
+    if not len(distribution):
+        raise ValueError("The triangle has no non-zero residuals to resample.")
+    distribution = distribution - distribution.mean()
+
+    return {
+        "observed": observed,
+        "diagonal": diagonal,
+        "expected_increments": expected_increments,
+        "residuals": distribution,
+        "scale": float(scale)
+    }
+
+
+def simulate_batch(batch: dict) -> dict:
+    """
+    Runs one batch of bootstrap simulations of a fitted ODP model. A top-level function, so that it can be run
+    on a process pool.
+    :param batch: The model from fit_odp, the number of simulations and a numpy.random.SeedSequence, along with
+    the segment's label and the batch number, which are returned unchanged.
+    :return: The total IBNR of each simulation, and the sum and sum of squares of each origin's IBNR.
+    """
+    rng = np.random.default_rng(batch["seed"])
+    model = batch["model"]
+    n_sims = batch["n_sims"]
+
+    observed = model["observed"]
+    diagonal = model["diagonal"]
+    expected_increments = np.nan_to_num(model["expected_increments"])
+    scale = model["scale"]
+
+    n_origins, n_ages = observed.shape
+
+    # Pseudo triangles, with axes (simulation, origin, development).
+    resampled = rng.choice(model["residuals"], size=(n_sims, n_origins, n_ages))
+    pseudo_increments = expected_increments + resampled * np.sqrt(np.abs(expected_increments))
+    pseudo = np.cumsum(np.where(observed, pseudo_increments, 0), axis=-1)
+    pseudo[:, ~observed] = np.nan
+
+    ldf, cdf = fit_development(pseudo)
+
+    # Each pseudo triangle is developed from its own latest diagonal with its own factors.
+    latest = pseudo[:, np.arange(n_origins), diagonal]
+    projected = latest[..., np.newaxis] * cdf[:, diagonal][..., np.newaxis] / cdf[:, np.newaxis, :]
+    future_increments = np.diff(projected, axis=-1, prepend=0)
+    future_increments[:, observed] = 0
+
+    # Process variance: gamma noise with the ODP mean-variance relationship.
+    process = rng.gamma(shape=np.abs(future_increments) / scale, scale=scale) * np.sign(future_increments)
+
+    ibnr = np.nansum(process, axis=-1)
+
+    return {
+        "label": batch["label"],
+        "batch": batch["batch"],
+        "n_sims": n_sims,
+        "total_ibnr": ibnr.sum(axis=-1),
+        "origin_sum": ibnr.sum(axis=0),
+        "origin_sum_squares": (ibnr ** 2).sum(axis=0)
+    }
+
+
+def run_bootstrap(
+        segments: list,
+        n_sims: int = 1000,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        seed: int = None,
+        hat_adj: bool = True,
+        engine=None,
+        progress_callback=None,
+        partial_result_callback=None
+) -> list:
+    """
+    Simulates the IBNR of each segment. Meant to be run with MainWindow.run_task, which passes the callbacks.
+    :param segments: (label, triangle) pairs, where each triangle is a chainladder Triangle or an ArrayTriangle.
+    Index keys are summed, and the first column is used.
+    :param n_sims: Simulations per segment.
+    :param batch_size: Simulations per batch, i.e., per task sent to the engine.
+    :param seed: Seed of the random streams. None draws a fresh one.
+    :param hat_adj:
+    :param engine: Defaults to the engine selected in the configuration file.
+    :param progress_callback: Called with (batches completed, total batches).
+    :param partial_result_callback: Called with each segment's summary as soon as all its batches are done.
+    :return: The summary of each segment, see summarize. Segments that cannot be fitted have an error entry
+    instead of statistics.
+    """
+    start_time = time.perf_counter()
+    engine = engine or get_reserving_engine()
+
+    segments = list(segments)
+    segment_seeds = np.random.SeedSequence(seed).spawn(len(segments))
+
+    batches = []
+    summaries = []
+    for (label, triangle), segment_seed in zip(segments, segment_seeds):
+        try:
+            model = fit_odp(segment_total(cumulative_values(triangle)), hat_adj=hat_adj)
+        except ValueError as error:
+            summary = {"label": label, "error": str(error), "seconds": time.perf_counter() - start_time}
+            summaries.append(summary)
+            if partial_result_callback is not None:
+                partial_result_callback(summary)
+            continue
+
+        sizes = [batch_size] * (n_sims // batch_size) + ([n_sims % batch_size] if n_sims % batch_size else [])
+        for number, (size, batch_seed) in enumerate(zip(sizes, segment_seed.spawn(len(sizes)))):
+            batches.append({
+                "label": label,
+                "batch": number,
+                "n_sims": size,
+                "seed": batch_seed,
+                "model": model
+            })
+
+    n_batches = {}
+    for batch in batches:
+        n_batches[batch["label"]] = n_batches.get(batch["label"], 0) + 1
+
+    pending = {}
+
+    for completed, result in enumerate(engine.map(simulate_batch, batches), start=1):
+        results = pending.setdefault(result["label"], [])
+        results.append(result)
+
+        if len(results) == n_batches[result["label"]]:
+            summary = summarize(pending.pop(result["label"]))
+            summary["seconds"] = time.perf_counter() - start_time
+            summaries.append(summary)
+            if partial_result_callback is not None:
+                partial_result_callback(summary)
+
+        if progress_callback is not None:
+            progress_callback(completed, len(batches))
+
+    return summaries
+
+
+def summarize(results: list) -> dict:
+    """
+    Combines the batches of one segment into summary statistics. Batches are put back in order first, so the
+    statistics do not depend on the order in which they completed.
+    :param results: Outputs of simulate_batch for one segment.
+    :return: The label, number of simulations, mean, standard deviation and PERCENTILES of the total IBNR,
+    and the mean and standard deviation of each origin's IBNR.
+    """
+    results = sorted(results, key=lambda result: result["batch"])
+
+    n_sims = sum(result["n_sims"] for result in results)
+    total_ibnr = np.concatenate([result["total_ibnr"] for result in results])
+    origin_sum = np.sum([result["origin_sum"] for result in results], axis=0)
+    origin_sum_squares = np.sum([result["origin_sum_squares"] for result in results], axis=0)
+
+    origin_mean = origin_sum / n_sims
+    origin_variance = (origin_sum_squares - n_sims * origin_mean ** 2) / max(n_sims - 1, 1)
+
+    return {
+        "label": results[0]["label"],
+        "n_sims": n_sims,
+        "mean": float(total_ibnr.mean()),
+        "std": float(total_ibnr.std(ddof=1)) if n_sims > 1 else 0.0,
+        "percentiles": dict(zip(PERCENTILES, np.percentile(total_ibnr, PERCENTILES).tolist())),
+        "origin_mean": origin_mean.tolist(),
+        "origin_std": np.sqrt(np.clip(origin_variance, 0, None)).tolist()
+    }
+
+
+def _hat_adjustment(expected_increments: np.ndarray, observed: np.ndarray) -> np.ndarray:
+    # Shapland's hat matrix adjustment, sqrt(1 / (1 - h)), of the GLM with one parameter per origin and one per
+    # development age after the first, weighted by the expected increments.
+    n_origins, n_ages = observed.shape
+    origin_positions, age_positions = np.nonzero(observed)
+
+    design = np.zeros((len(origin_positions), n_origins + n_ages - 1))
+    design[np.arange(len(origin_positions)), origin_positions] = 1
+    later = age_positions > 0
+    design[np.nonzero(later)[0], n_origins + age_positions[later] - 1] = 1
+
+    weights = np.abs(expected_increments[observed])
+    weighted = design * weights[:, np.newaxis]
+    hat = np.einsum('ij,jk,ik->i', design, np.linalg.pinv(design.T @ weighted), weighted)
+
+    with np.errstate(divide='ignore'):
+        adjustment = np.where(hat != 1, np.sqrt(1 / np.abs(1 - hat)), 0)
+
+    result = np.full(observed.shape, np.nan)
+    result[observed] = adjustment
+    return result
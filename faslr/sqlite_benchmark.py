@@ -0,0 +1,214 @@
+"""
+Concurrency benchmark of the SQLite connection profiles in SQLITE_PROFILES. For each profile, a fresh database is
+opened by several reader processes and writer processes at once, each connection set up the way FASLR sets up
+its own, and the throughput of each side is measured over a fixed period. Readers run the kind of aggregate query
+the analysis tabs issue, and writers commit small batches of rows, as when saving selections.
+
+Run it against the drive the department database lives on, since results differ most between local disks and
+network shares:
+
+python sqlite_benchmark.py --readers 4 --writers 2 --seconds 10 --directory //server/share/faslr
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from connection import set_sqlite_pragmas
+
+from constants import (
+    SQLITE_PRAGMAS,
+    SQLITE_PROFILES
+)
+
+SEED_ROWS = 10000
+WRITE_BATCH_SIZE = 10
+
+# Seconds allowed for the worker processes to start, so that they all begin measuring at the same time.
+START_DELAY = 1.0
+
+
+def connect(path: str, pragmas: dict) -> sqlite3.Connection:
+    # Autocommit, so that transactions are only those the workers begin themselves.
+    db_connection = sqlite3.connect(path, timeout=0, isolation_level=None)
+    set_sqlite_pragmas(db_connection, pragmas=dict(SQLITE_PRAGMAS, **pragmas))
+    return db_connection
+
+
+def create_database(path: str, pragmas: dict, seed_rows: int = SEED_ROWS):
+    db_connection = connect(path, pragmas)
+    db_connection.execute(
+        "CREATE TABLE benchmark (id INTEGER PRIMARY KEY, origin INTEGER, development INTEGER, value REAL)"
+    )
+    db_connection.execute("CREATE INDEX benchmark_origin ON benchmark (origin)")
+    db_connection.execute("BEGIN")
+    db_connection.executemany(
+        "INSERT INTO benchmark (origin, development, value) VALUES (?, ?, ?)",
+        ((row % 100, row % 120, float(row)) for row in range(seed_rows))
+    )
+    db_connection.execute("COMMIT")
+    db_connection.close()
+
+
+def run_worker(job: dict) -> dict:
+    """
+    Runs reads or writes until the end of the measured period. A top-level function, so that it can be run on a
+    process pool.
+    :param job: The role, either "read" or "write", the database path, the pragmas of the profile, the worker
+    number, and the start and end of the measured period, as time.time() values.
+    :return: The role, the number of operations completed, and the number that gave up on a locked database.
+    """
+    db_connection = connect(job["path"], job["pragmas"])
+    operations = 0
+    busy = 0
+
+    while time.time() < job["start"]:
+        time.sleep(0.001)
+
+    while time.time() < job["end"]:
+        origin = (operations + job["worker"]) % 100
+        try:
+            if job["role"] == "read":
+                db_connection.execute(
+                    "SELECT development, SUM(value) FROM benchmark WHERE origin = ? GROUP BY development",
+                    (origin,)
+                ).fetchall()
+            else:
+                db_connection.execute("BEGIN IMMEDIATE")
+                db_connection.executemany(
+                    "INSERT INTO benchmark (origin, development, value) VALUES (?, ?, ?)",
+                    [(origin, development, 1.0) for development in range(WRITE_BATCH_SIZE)]
+                )
+                db_connection.execute("COMMIT")
+            operations += 1
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error) and "busy" not in str(error):
+                raise
+            if db_connection.in_transaction:
+                db_connection.execute("ROLLBACK")
+            busy += 1
+
+    db_connection.close()
+
+    return {
+        "role": job["role"],
+        "operations": operations,
+        "busy": busy
+    }
+
+
+def run_profile(
+        profile: str,
+        readers: int = 4,
+        writers: int = 1,
+        seconds: float = 5.0,
+        directory: str = None
+) -> dict:
+    """
+    Benchmarks one profile on a new database file, which is removed afterwards.
+    :param profile: One of SQLITE_PROFILES.
+    :param readers: Number of reader processes.
+    :param writers: Number of writer processes.
+    :param seconds: Length of the measured period.
+    :param directory: Where the database file is created. Defaults to the temporary directory.
+    :return: Reads and writes per second, along with the totals they are based on.
+    """
+    pragmas = SQLITE_PROFILES[profile]
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        path = os.path.join(tmp_dir, "benchmark.db")
+        create_database(path, pragmas)
+
+        start = time.time() + START_DELAY
+        jobs = [
+            {
+                "role": role,
+                "path": path,
+                "pragmas": pragmas,
+                "worker": worker,
+                "start": start,
+                "end": start + seconds
+            }
+            for worker, role in enumerate(["read"] * readers + ["write"] * writers)
+        ]
+
+        with multiprocessing.Pool(len(jobs)) as pool:
+            results = pool.map(run_worker, jobs)
+
+    totals = {
+        role: sum(result["operations"] for result in results if result["role"] == role)
+        for role in ("read", "write")
+    }
+
+    return {
+        "profile": profile,
+        "readers": readers,
+        "writers": writers,
+        "seconds": seconds,
+        "reads": totals["read"],
+        "writes": totals["write"],
+        "busy": sum(result["busy"] for result in results),
+        "reads_per_second": totals["read"] / seconds,
+        "writes_per_second": totals["write"] / seconds
+    }
+
+
+def run_benchmark(
+        profiles: list = None,
+        readers: int = 4,
+        writers: int = 1,
+        seconds: float = 5.0,
+        directory: str = None,
+        progress_callback=None
+) -> list:
+    """
+    Benchmarks each profile in turn, see run_profile.
+    :param profiles: Defaults to every profile in SQLITE_PROFILES.
+    :param readers:
+    :param writers:
+    :param seconds:
+    :param directory:
+    :param progress_callback: Called with (profiles completed, total profiles).
+    :return: The results of each profile.
+    """
+    profiles = list(profiles or SQLITE_PROFILES)
+
+    results = []
+    for completed, profile in enumerate(profiles, start=1):
+        results.append(run_profile(profile, readers=readers, writers=writers, seconds=seconds, directory=directory))
+        if progress_callback is not None:
+            progress_callback(completed, len(profiles))
+
+    return results
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Measure SQLite reader/writer throughput under each profile.")
+    parser.add_argument("--profiles", nargs="+", choices=list(SQLITE_PROFILES), help="default: all profiles")
+    parser.add_argument("--readers", type=int, default=4, help="reader processes, default: %(default)s")
+    parser.add_argument("--writers", type=int, default=1, help="writer processes, default: %(default)s")
+    parser.add_argument("--seconds", type=float, default=5.0, help="measured period, default: %(default)s")
+    parser.add_argument("--directory", help="where the database file is created, default: the temporary directory")
+
+    args = parser.parse_args(argv)
+
+    print("%-15s %12s %12s %8s" % ("profile", "reads/s", "writes/s", "busy"))
+    for result in run_benchmark(
+        profiles=args.profiles,
+        readers=args.readers,
+        writers=args.writers,
+        seconds=args.seconds,
+        directory=args.directory
+    ):
+        print("%-15s %12.1f %12.1f %8d" % (
+            result["profile"],
+            result["reads_per_second"],
+            result["writes_per_second"],
+            result["busy"]
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import chainladder as cl
+import numpy as np
+import pandas as pd
+
+from utilities.accessors import (
+    get_cell_scalar,
+    get_link_ratio_matrix,
+    LinkRatioLookup
+)
+
+df_uspp = pd.read_csv("faslr/samples/friedland_us_industry_auto.csv")
+
+
+us_auto = cl.Triangle(
+    data=df_uspp,
+    origin="Accident Year",
+    development="Calendar Year",
+    columns=["Paid Claims", "Reported Claims"],
+    cumulative=True
+)
+
+lookup = LinkRatioLookup(us_auto)
+
+
+def test_lookup_reported_12_24():
+    assert round(lookup.get(origin="1998", age=12, column="Reported Claims"), 3) == 1.166
+    assert round(lookup.get(origin="2006", age=12, column="Reported Claims"), 3) == 1.173
+
+
+def test_lookup_getitem():
+    assert round(lookup["2001", 36, "Reported Claims"], 3) == 1.027
+    assert round(lookup["1998", 108, "Reported Claims"], 3) == 1.000
+
+
+def test_lookup_matches_cell_scalar():
+    for origin in ["1998", "2001", "2004"]:
+        for age in [12, 24, 36]:
+            for column in ["Paid Claims", "Reported Claims"]:
+                assert np.isclose(
+                    lookup.get(origin=origin, age=age, column=column),
+                    get_cell_scalar(us_auto, origin=origin, age=age, column=column)
+                )
+
+
+def test_matrix_matches_chainladder():
+    matrix = get_link_ratio_matrix(us_auto)
+    expected = us_auto.link_ratio.values
+
+    # chainladder drops the last origin, which has no factors.
+    assert matrix.shape == (1, 2, 10, 9)
+    assert np.allclose(matrix[..., :-1, :], expected, equal_nan=True)
+    assert np.isnan(matrix[..., -1, :]).all()
+
+
+def test_block():
+    block = lookup.block(origins=["1999", "2000"], ages=[24, 36], column="Reported Claims")
+    assert block.shape == (2, 2)
+    assert np.allclose(block.round(3), [[1.062, 1.027], [1.061, 1.027]])
+
+
+def test_matrix_block():
+    block = get_link_ratio_matrix(us_auto, columns=["Reported Claims"], origins=["1998"], ages=[12, 24])
+    assert block.shape == (1, 1, 1, 2)
+    assert np.allclose(block.round(3), [[[[1.166, 1.056]]]])
+
+
+def test_multi_key_triangle():
+    clrd = cl.load_sample('clrd')
+    clrd_lookup = LinkRatioLookup(clrd)
+    key = ('State Farm Mut Grp', 'ppauto')
+    expected = clrd.loc[key]['CumPaidLoss'].link_ratio
+    assert np.isclose(
+        clrd_lookup.get(origin="1988", age=12, column="CumPaidLoss", key=key),
+        expected.values[0, 0, 0, 0]
+    )
+    assert np.allclose(
+        clrd_lookup.block(column="CumPaidLoss", key=key)[:-1],
+        expected.values[0, 0],
+        equal_nan=True
+    )
@@ -0,0 +1,89 @@
+import chainladder as cl
+import numpy as np
+
+from connection import (
+    create_db,
+    get_session_factory
+)
+
+from project import (
+    create_project,
+    open_lob_triangle
+)
+
+from triangle_store import (
+    ArrayTriangle,
+    load_lob_triangle,
+    load_triangle,
+    save_triangle
+)
+
+raa = cl.load_sample('raa')
+clrd = cl.load_sample('clrd').iloc[:20]
+
+
+def round_trip(tmp_path, triangle, compression="none"):
+    session = get_session_factory(db_path=str(tmp_path / "triangles.db"))()
+    row = save_triangle(session, triangle, name="test", compression=compression)
+    session.commit()
+    stored = load_triangle(session, row.triangle_id)
+    session.close()
+    return stored
+
+
+def test_round_trip_values(tmp_path):
+    stored = round_trip(tmp_path, raa)
+    assert stored.shape == raa.shape
+    assert np.allclose(stored.values, raa.values, equal_nan=True)
+    assert list(stored.ddims) == list(raa.ddims)
+    assert list(stored.origin) == [str(origin) for origin in raa.origin]
+
+
+def test_round_trip_is_zero_copy(tmp_path):
+    stored = round_trip(tmp_path, raa)
+    assert not stored.values.flags.owndata
+    assert not stored.values.flags.writeable
+
+
+def test_round_trip_compressed_multi_index(tmp_path):
+    stored = round_trip(tmp_path, clrd, compression="zlib")
+    assert np.allclose(stored.values, clrd.values, equal_nan=True)
+    assert stored.key_labels == ['GRNAME', 'LOB']
+    assert stored.kdims.tolist() == clrd.kdims.tolist()
+    assert list(stored.vdims) == list(clrd.vdims)
+
+
+def test_to_frame():
+    stored = ArrayTriangle.from_triangle(raa)
+    assert np.allclose(stored.to_frame().values, raa.to_frame().values, equal_nan=True)
+
+
+def test_to_chainladder():
+    rebuilt = ArrayTriangle.from_triangle(clrd).to_chainladder()
+    assert rebuilt.shape == clrd.shape
+    assert rebuilt.kdims.tolist() == clrd.kdims.tolist()
+    assert np.allclose(rebuilt.values, clrd.values, equal_nan=True)
+
+    rebuilt = ArrayTriangle.from_triangle(raa).to_chainladder()
+    assert np.allclose(rebuilt.values, raa.values, equal_nan=True)
+
+
+def test_lob_triangle_opens_as_chainladder(tmp_path):
+    db_path = str(tmp_path / "triangles.db")
+    create_db(db_path)
+    lob_id = create_project(db_path, "USA", "Texas", "Auto")["lob"][0]
+
+    session = get_session_factory(db_path=db_path)()
+    save_triangle(session, clrd, name="old", lob_id=lob_id)
+    save_triangle(session, raa, name="raa", lob_id=lob_id, compression="zlib")
+    session.commit()
+
+    assert load_lob_triangle(session, lob_id + 1) is None
+    session.close()
+
+    # The most recently saved triangle is opened.
+    name, triangle = open_lob_triangle(db_path, lob_id)
+
+    assert name == "raa"
+    assert isinstance(triangle, cl.Triangle)
+    assert np.allclose(triangle.values, raa.values, equal_nan=True)
@@ -0,0 +1,132 @@
+import csv
+import pytest
+import sqlalchemy as sa
+
+from connection import (
+    create_db,
+    fetch_project_nodes,
+    get_engine,
+    get_session_factory
+)
+
+from project import create_project
+
+from project_import import (
+    count_manifest_rows,
+    import_projects
+)
+
+from schema import (
+    CountryTable,
+    LOBTable,
+    ProjectTable,
+    StateTable
+)
+
+
+def write_manifest(path, rows, header=("Country", "State", "LOB")):
+    with open(path, 'w', newline='') as manifest:
+        writer = csv.writer(manifest)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "projects.db")
+    create_db(path)
+    return path
+
+
+def test_import_creates_hierarchy(tmp_path, db_path):
+    rows = [
+        ("USA", "Texas", "Auto"),
+        ("USA", "Texas", "Home"),
+        ("USA", "Ohio", "Auto"),
+        ("Canada", "Ontario", "Auto"),
+        ("", "", ""),
+        ("Canada", "Ontario", "Auto")
+    ]
+    manifest = write_manifest(tmp_path / "manifest.csv", rows)
+
+    progress = []
+    result = import_projects(
+        db_path,
+        manifest,
+        progress_callback=lambda completed, total: progress.append((completed, total)),
+        batch_size=2
+    )
+
+    assert result["rows"] == 5
+    assert result["countries"] == 2
+    assert result["states"] == 3
+    assert result["lobs"] == 5
+    assert progress[-1] == (5, 5)
+
+    session = get_session_factory(db_path)()
+    assert session.query(CountryTable).count() == 2
+    assert session.query(StateTable).count() == 3
+    assert session.query(LOBTable).count() == 5
+    assert session.query(ProjectTable).count() == 5
+    session.close()
+
+    countries = fetch_project_nodes(db_path, 0)
+    assert [country[1] for country in countries] == ["USA", "Canada"]
+    usa_states = fetch_project_nodes(db_path, 1, country_id=countries[0][0])
+    assert [state[1] for state in usa_states] == ["Texas", "Ohio"]
+    texas_lobs = fetch_project_nodes(db_path, 2, country_id=countries[0][0], state_id=usa_states[0][0])
+    assert [lob[1] for lob in texas_lobs] == ["Auto", "Home"]
+
+
+def test_import_reuses_existing_projects(tmp_path, db_path):
+    existing = create_project(db_path, "USA", "Texas", "Auto")
+    manifest = write_manifest(
+        tmp_path / "manifest.csv",
+        [("USA", "Texas", "Home"), ("USA", "Utah", "Auto")],
+        header=("country_name", "state_name", "Line of Business")
+    )
+
+    result = import_projects(db_path, manifest)
+
+    assert result["countries"] == 0
+    assert result["states"] == 1
+
+    states = fetch_project_nodes(db_path, 1, country_id=existing["country"][0])
+    assert [state[1] for state in states] == ["Texas", "Utah"]
+    lobs = fetch_project_nodes(db_path, 2, country_id=existing["country"][0], state_id=existing["state"][0])
+    assert [lob[1] for lob in lobs] == ["Auto", "Home"]
+
+
+def test_failed_import_is_rolled_back(tmp_path, db_path):
+    manifest = write_manifest(tmp_path / "manifest.csv", [("USA", "Texas", "Auto"), ("USA", "", "Home")])
+
+    with pytest.raises(ValueError):
+        import_projects(db_path, manifest, batch_size=1)
+
+    assert fetch_project_nodes(db_path, 0) == []
+
+
+def test_existing_rows_are_read_under_the_write_lock(tmp_path, db_path):
+    # The ids and get-or-create caches are read before the first insert. Another writer must not be able to
+    # insert rows in between, so the transaction has to be open by then.
+    manifest = write_manifest(tmp_path / "manifest.csv", [("USA", "Texas", "Auto")])
+    engine = get_engine(db_path)
+    in_transaction = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            in_transaction.append(connection.connection.dbapi_connection.in_transaction)
+
+    sa.event.listen(engine, "before_cursor_execute", record)
+    try:
+        import_projects(db_path, manifest)
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", record)
+
+    assert in_transaction and all(in_transaction)
+
+
+def test_count_manifest_rows(tmp_path):
+    manifest = write_manifest(tmp_path / "manifest.csv", [("USA", "Texas", "Auto")] * 7)
+    assert count_manifest_rows(manifest) == 7
@@ -0,0 +1,138 @@
+import chainladder as cl
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingestion
+
+from ingestion import (
+    aggregate_claims_csv,
+    ingest_claims_csv
+)
+
+rng = np.random.default_rng(2022)
+n_claims = 5000
+
+accident_dates = pd.Timestamp('2016-01-01') + pd.to_timedelta(rng.integers(0, 365 * 5, n_claims), unit='D')
+transaction_dates = accident_dates + pd.to_timedelta(rng.integers(0, 365 * 3, n_claims), unit='D')
+
+claims = pd.DataFrame({
+    'LOB': rng.choice(['Auto', 'Home'], n_claims),
+    'Accident Date': accident_dates,
+    'Transaction Date': transaction_dates,
+    'Paid': rng.gamma(2, 500, n_claims).round(2),
+    'Incurred': rng.gamma(2, 800, n_claims).round(2)
+})
+claims = claims[claims['Transaction Date'] < pd.Timestamp('2021-01-01')]
+
+
+@pytest.fixture(scope='module')
+def claims_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('claims') / 'claims.csv'
+    claims.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return str(path)
+
+
+@pytest.mark.parametrize('origin_grain, development_grain', [('Y', 'Y'), ('Y', 'Q'), ('Q', 'M')])
+def test_matches_chainladder(claims_csv, origin_grain, development_grain):
+    triangle = ingest_claims_csv(
+        claims_csv,
+        origin='Accident Date',
+        development='Transaction Date',
+        columns=['Paid', 'Incurred'],
+        index=['LOB'],
+        origin_grain=origin_grain,
+        development_grain=development_grain,
+        chunk_size=700,
+        date_format='%Y-%m-%d',
+        as_array=True
+    )
+
+    expected = cl.Triangle(
+        claims,
+        origin='Accident Date',
+        development='Transaction Date',
+        columns=['Paid', 'Incurred'],
+        index=['LOB'],
+        cumulative=False
+    ).grain('O' + origin_grain + 'D' + development_grain).incr_to_cum()
+
+    assert triangle.shape == expected.shape
+    assert list(triangle.ddims) == list(expected.ddims)
+    assert np.allclose(triangle.values, expected.values, equal_nan=True)
+
+
+def test_incremental_without_index(claims_csv):
+    triangle = ingest_claims_csv(
+        claims_csv,
+        origin='Accident Date',
+        development='Transaction Date',
+        columns=['Paid'],
+        cumulative=False,
+        chunk_size=1000
+    )
+
+    assert triangle.shape[0] == 1
+    assert not triangle.is_cumulative
+    assert np.isclose(np.nansum(triangle.values), claims['Paid'].sum())
+
+
+def test_progress_and_dropped_dates(tmp_path):
+    path = tmp_path / 'claims.csv'
+    pd.DataFrame({
+        'Accident Date': ['2020-01-15', 'not a date', '2020-03-01'],
+        'Transaction Date': ['2020-02-01', '2020-05-01', '2021-01-10'],
+        'Paid': [100.0, 50.0, 25.0]
+    }).to_csv(path, index=False)
+
+    progress = []
+    cells = aggregate_claims_csv(
+        str(path),
+        origin='Accident Date',
+        development='Transaction Date',
+        columns=['Paid'],
+        chunk_size=1,
+        progress_callback=lambda completed, total: progress.append((completed, total))
+    )
+
+    assert cells['Paid'].tolist() == [100.0, 25.0]
+    assert progress[-1][0] == progress[-1][1]
+
+
+@pytest.mark.parametrize('rows', [[], [('not a date', '2020-05-01', 50.0)]])
+def test_no_valid_claims_is_reported(tmp_path, rows):
+    path = tmp_path / 'claims.csv'
+    pd.DataFrame(rows, columns=['Accident Date', 'Transaction Date', 'Paid']).to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match="claims with valid dates"):
+        ingest_claims_csv(str(path), origin='Accident Date', development='Transaction Date', columns=['Paid'])
+
+
+def test_file_is_closed_when_the_header_is_rejected(tmp_path, monkeypatch):
+    path = tmp_path / 'claims.csv'
+    pd.DataFrame({'Accident Date': ['2020-01-15'], 'Paid': [100.0]}).to_csv(path, index=False)
+
+    opened = []
+
+    def record_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(ingestion, "open", record_open, raising=False)
+
+    with pytest.raises(ValueError):
+        aggregate_claims_csv(str(path), origin='Accident Date', development='Transaction Date', columns=['Paid'])
+
+    assert opened and all(file.closed for file in opened)
+
+
+def test_coarser_development_grain_is_rejected(claims_csv):
+    with pytest.raises(ValueError):
+        aggregate_claims_csv(
+            claims_csv,
+            origin='Accident Date',
+            development='Transaction Date',
+            columns=['Paid'],
+            origin_grain='Q',
+            development_grain='Y'
+        )
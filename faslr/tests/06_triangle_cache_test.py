@@ -0,0 +1,104 @@
+import chainladder as cl
+import numpy as np
+import os
+import pandas as pd
+
+from triangle_cache import (
+    TriangleCache,
+    cache_key,
+    hash_frame,
+    main,
+    parse_size,
+    triangle_from_csv,
+    triangle_from_frame
+)
+
+from triangle_model import create_triangle_model
+
+friedland_path = "faslr/samples/friedland_us_industry_auto.csv"
+
+friedland_params = dict(
+    origin="Accident Year",
+    development="Calendar Year",
+    columns=["Paid Claims", "Reported Claims"]
+)
+
+raa = cl.load_sample('raa')
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    cache = TriangleCache(path=str(tmp_path))
+    cache.put("raa", raa)
+
+    cached = cache.get("raa")
+
+    assert isinstance(cached.values, np.memmap)
+    assert not cached.values.flags.writeable
+    assert np.allclose(cached.values, raa.values, equal_nan=True)
+    assert list(cached.origin) == [str(origin) for origin in raa.origin]
+    assert cache.get("missing") is None
+
+
+def test_csv_is_built_once(tmp_path):
+    cache = TriangleCache(path=str(tmp_path))
+
+    first = triangle_from_csv(friedland_path, cache=cache, **friedland_params)
+    built_on = os.path.getmtime(tmp_path / (cache.entries()[0]["key"] + ".npy"))
+    second = triangle_from_csv(friedland_path, cache=cache, **friedland_params)
+
+    assert len(cache.entries()) == 1
+    assert os.path.getmtime(tmp_path / (cache.entries()[0]["key"] + ".npy")) == built_on
+    assert np.array_equal(first.values, second.values, equal_nan=True)
+
+    expected = cl.Triangle(pd.read_csv(friedland_path), cumulative=True, **friedland_params)
+    assert np.allclose(second.values, expected.values, equal_nan=True)
+
+    triangle_from_csv(friedland_path, cache=cache, cumulative=False, **friedland_params)
+    assert len(cache.entries()) == 2
+
+
+def test_keys_follow_content(tmp_path):
+    data = pd.read_csv(friedland_path)
+    changed = data.copy()
+    changed.loc[0, "Paid Claims"] += 1
+
+    assert hash_frame(data) == hash_frame(data.copy())
+    assert hash_frame(data) != hash_frame(changed)
+    assert cache_key("a", origin="x") != cache_key("a", origin="y")
+
+    cache = TriangleCache(path=str(tmp_path))
+    triangle = triangle_from_frame(changed, cache=cache, **friedland_params)
+    assert triangle.values[0, 0, 0, 0] == data.loc[0, "Paid Claims"] + 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TriangleCache(path=str(tmp_path))
+    for key in ("a", "b", "c"):
+        cache.put(key, raa)
+        os.utime(tmp_path / (key + ".json"), (0, {"a": 100, "b": 300, "c": 200}[key]))
+
+    # Room for the two most recently used entries.
+    sizes = {entry["key"]: entry["size"] for entry in cache.entries()}
+    removed = cache.evict(max_bytes=sizes["b"] + sizes["c"])
+
+    assert removed == ["a"]
+    assert [entry["key"] for entry in cache.entries()] == ["b", "c"]
+
+
+def test_model_from_cached_triangle(tmp_path):
+    cache = TriangleCache(path=str(tmp_path))
+    model = create_triangle_model(cache.put("raa", raa))
+    assert model.rowCount() == 10
+    assert model.headerData(0, 2, 0) == "1981"
+
+
+def test_command_line(tmp_path, capsys):
+    cache = TriangleCache(path=str(tmp_path))
+    cache.put("raa", raa)
+
+    main(["--path", str(tmp_path), "info"])
+    assert "1 entries" in capsys.readouterr().out
+
+    main(["--path", str(tmp_path), "clear"])
+    assert cache.entries() == []
+    assert parse_size("500M") == 500 << 20
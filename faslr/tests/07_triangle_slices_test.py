@@ -0,0 +1,69 @@
+import chainladder as cl
+import numpy as np
+
+from analysis import TriangleSlices
+
+from native import (
+    cumulative_values,
+    segment_total
+)
+
+clrd = cl.load_sample('clrd')
+
+
+def test_slice_matches_boolean_mask():
+    slices = TriangleSlices(clrd, level="lob")
+    expected = clrd[clrd['LOB'] == 'wkcomp']['CumPaidLoss']
+
+    triangle = slices.get('wkcomp', 'CumPaidLoss')
+
+    assert triangle.shape == expected.shape
+    assert (triangle.kdims == expected.kdims).all()
+    assert np.allclose(triangle.values, expected.values, equal_nan=True)
+
+
+def test_slices_and_frames_are_reused():
+    slices = TriangleSlices(clrd, level="LOB")
+
+    assert sorted(slices.lobs) == sorted(set(clrd.index['LOB']))
+    assert slices.get('ppauto', 'IncurLoss') is slices.get('ppauto', 'IncurLoss')
+    assert slices.frame('ppauto', 'IncurLoss') is slices.frame('ppauto', 'IncurLoss')
+    assert slices.frame('ppauto', 'IncurLoss').equals(
+        clrd[clrd['LOB'] == 'ppauto']['IncurLoss'].iloc[0].to_frame()
+    )
+
+
+def test_total_sums_the_companies_of_an_lob():
+    slices = TriangleSlices(clrd, level="LOB")
+
+    total = slices.total('wkcomp', 'CumPaidLoss')
+
+    assert total.shape == (1, 1, 10, 10)
+    assert total is slices.total('wkcomp', 'CumPaidLoss')
+    assert total.values[0, 0, 0, 0] == 285804
+    assert np.allclose(
+        total.values[0, 0],
+        segment_total(cumulative_values(slices.get('wkcomp', 'CumPaidLoss'))),
+        equal_nan=True
+    )
+
+
+def test_total_of_a_single_company():
+    # chainladder's sum() reduces the first axis longer than one, i.e., the origins when there is one key.
+    one_company = clrd.iloc[:1]
+    slices = TriangleSlices(one_company, level="LOB")
+    lob = slices.lobs[0]
+
+    assert np.allclose(
+        slices.total(lob, 'CumPaidLoss').values,
+        one_company['CumPaidLoss'].values,
+        equal_nan=True
+    )
+
+
+def test_triangle_without_the_level_is_one_slice():
+    raa = cl.load_sample('raa')
+    slices = TriangleSlices(raa, level="LOB")
+
+    assert slices.lobs == ["Total"]
+    assert np.allclose(slices.total("Total", "values").values, raa.values, equal_nan=True)
@@ -0,0 +1,78 @@
+import chainladder as cl
+import numpy as np
+import pytest
+
+from connection import get_session_factory
+
+from native import (
+    fit_development,
+    project_ultimates,
+    to_cumulative
+)
+
+from portfolio import run_portfolio
+
+from schema import (
+    DevelopmentFactorTable,
+    ReserveResultTable
+)
+
+from triangle_store import save_triangle
+
+raa = cl.load_sample('raa')
+abc = cl.load_sample('abc')
+clrd = cl.load_sample('clrd').iloc[:40]
+
+
+@pytest.mark.parametrize('triangle', [raa, abc, clrd], ids=['raa', 'abc', 'clrd'])
+def test_matches_chainladder(triangle):
+    values = np.asarray(triangle.values, dtype=float)
+
+    ldf, cdf = fit_development(values)
+    results = project_ultimates(values, cdf)
+
+    development = cl.Development().fit(triangle)
+    model = cl.Chainladder().fit(triangle)
+
+    assert np.allclose(ldf, np.nan_to_num(development.ldf_.values[:, :, 0], nan=1.0))
+    assert np.allclose(np.nan_to_num(results["ultimate"]), np.nan_to_num(model.ultimate_.values[..., 0]))
+    assert np.allclose(np.nan_to_num(results["ibnr"]), np.nan_to_num(model.ibnr_.values[..., 0]))
+
+
+def test_simple_average_matches_chainladder():
+    ldf, cdf = fit_development(np.asarray(raa.values, dtype=float), average="simple")
+    expected = cl.Development(average='simple').fit(raa).ldf_.values[0, 0, 0]
+    assert np.allclose(ldf[0, 0], expected)
+
+
+def test_to_cumulative():
+    incremental = np.asarray(raa.cum_to_incr().values, dtype=float)
+    assert np.allclose(to_cumulative(incremental), raa.values, equal_nan=True)
+
+
+def test_run_portfolio(tmp_path):
+    db_path = str(tmp_path / "portfolio.db")
+    session = get_session_factory(db_path)()
+    save_triangle(session, raa, name="raa")
+    save_triangle(session, raa.cum_to_incr(), name="raa incremental")
+    save_triangle(session, clrd, name="clrd")
+    session.commit()
+
+    progress = []
+    summary = run_portfolio(db_path, progress_callback=lambda completed, total: progress.append((completed, total)))
+
+    assert summary["triangles"] == 3
+    assert summary["segments"] == 2 + clrd.shape[0] * clrd.shape[1]
+    assert progress[-1] == (2, 2)
+
+    expected_ibnr = cl.Chainladder().fit(raa).ibnr_.sum()
+    rows = session.query(ReserveResultTable).filter(ReserveResultTable.run_id == summary["run_id"]).all()
+    raa_ibnr = [sum(row.ibnr for row in rows if row.triangle_id == triangle_id) for triangle_id in (1, 2)]
+    assert np.allclose(raa_ibnr, expected_ibnr)
+
+    factors = session.query(DevelopmentFactorTable).filter(
+        DevelopmentFactorTable.triangle_id == 1
+    ).order_by(DevelopmentFactorTable.development).all()
+    assert [row.development for row in factors] == list(raa.ddims)
+    assert np.allclose([row.cdf for row in factors[:-1]], cl.Development().fit(raa).cdf_.values[0, 0, 0])
+    session.close()
@@ -0,0 +1,119 @@
+import chainladder as cl
+import numpy as np
+import os
+import pytest
+import subprocess
+import sys
+
+from analysis import TriangleSlices
+
+from engine import (
+    get_engine_config,
+    ReservingEngine,
+    ReservingTask,
+    run_tasks,
+    set_engine_config
+)
+
+clrd = cl.load_sample('clrd')
+slices = TriangleSlices(clrd, level="LOB")
+
+
+def lob_tasks(method="chainladder", exposure=None):
+    return [
+        ReservingTask(
+            label=lob,
+            triangle=slices.get(lob, 'CumPaidLoss'),
+            method=method,
+            exposure=slices.get(lob, exposure) if exposure else None
+        )
+        for lob in slices.lobs
+    ]
+
+
+def expected_ibnr(lob):
+    return cl.Chainladder().fit(slices.get(lob, 'CumPaidLoss').sum()).ibnr_.values[0, 0, :, -1]
+
+
+@pytest.mark.parametrize("backend", ["in_process", "thread", "process"])
+def test_backends_match_chainladder(backend):
+    with ReservingEngine(backend=backend, max_workers=2) as engine:
+        results = list(engine.run(lob_tasks()))
+
+    assert sorted(result["label"] for result in results) == sorted(slices.lobs)
+
+    for result in results:
+        assert "error" not in result
+        assert np.allclose(
+            np.array(result["ibnr"], dtype=float),
+            expected_ibnr(result["label"]),
+            equal_nan=True
+        )
+
+
+def test_exposure_methods():
+    results = run_tasks(
+        lob_tasks("bornhuetter_ferguson", exposure='EarnedPremNet')[:2],
+        engine=ReservingEngine(backend="in_process")
+    )
+
+    for result in results:
+        expected = cl.BornhuetterFerguson(apriori=1.0).fit(
+            slices.get(result["label"], 'CumPaidLoss').sum(),
+            sample_weight=slices.get(result["label"], 'EarnedPremNet').sum().latest_diagonal
+        )
+        assert np.allclose(
+            np.array(result["ultimate"], dtype=float),
+            expected.ultimate_.values[0, 0, :, -1],
+            equal_nan=True
+        )
+
+    # Without an exposure, the error is reported in the result rather than raised.
+    missing = run_tasks(lob_tasks("cape_cod")[:1], engine=ReservingEngine(backend="in_process"))
+    assert "requires an exposure" in missing[0]["error"]
+
+
+def test_run_tasks_reports_each_result():
+    partial_results = []
+    progress = []
+
+    results = run_tasks(
+        lob_tasks("mack"),
+        engine=ReservingEngine(backend="thread", max_workers=3),
+        progress_callback=lambda completed, total: progress.append((completed, total)),
+        partial_result_callback=partial_results.append
+    )
+
+    assert partial_results == results
+    assert progress[-1] == (len(slices.lobs), len(slices.lobs))
+    assert all("mack_std_err" in result for result in results)
+
+
+def test_engine_config(tmp_path):
+    config_path = str(tmp_path / "config.ini")
+
+    with open(config_path, 'w') as config_file:
+        config_file.write("[STARTUP_CONNECTION]\nstartup_db = None\n")
+
+    # Configuration files without an ENGINE section get the defaults.
+    assert get_engine_config(config_path) == {"backend": "in_process", "max_workers": 0}
+
+    set_engine_config("process", 8, config_path=config_path)
+
+    assert get_engine_config(config_path) == {"backend": "process", "max_workers": 8}
+
+    with open(config_path) as config_file:
+        assert "startup_db = None" in config_file.read()
+
+
+def test_engine_does_not_load_qt():
+    # Worker processes import engine, so it should not pull in Qt, e.g., through constants.
+    result = subprocess.run(
+        [sys.executable, "-c", "import engine, sys; print(any(name.startswith('PyQt5') for name in sys.modules))"],
+        cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    assert result.stdout.strip() == "False"
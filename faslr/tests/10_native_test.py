@@ -0,0 +1,124 @@
+import chainladder as cl
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import (
+    fit_task,
+    ReservingTask
+)
+
+from native import (
+    cumulative_values,
+    fit_development,
+    fit_triangle,
+    project_ultimates
+)
+
+from triangle_store import ArrayTriangle
+
+raa = cl.load_sample('raa')
+abc = cl.load_sample('abc')
+
+us_auto = cl.Triangle(
+    data=pd.read_csv("faslr/samples/friedland_us_industry_auto.csv"),
+    origin="Accident Year",
+    development="Calendar Year",
+    columns=["Paid Claims", "Reported Claims"],
+    cumulative=True
+)
+
+wkcomp = cl.load_sample('clrd').groupby('LOB').sum().loc['wkcomp']
+
+SAMPLES = {
+    "raa": raa,
+    "abc": abc,
+    "us_auto_paid": us_auto["Paid Claims"],
+    "us_auto_reported": us_auto["Reported Claims"]
+}
+
+
+def last_age(triangle) -> np.ndarray:
+    return triangle.values[0, 0, :, -1]
+
+
+@pytest.mark.parametrize('average', ['volume', 'simple'])
+@pytest.mark.parametrize('name', list(SAMPLES))
+def test_development_matches_chainladder(name, average):
+    triangle = SAMPLES[name]
+
+    ldf, cdf = fit_development(cumulative_values(triangle), average=average)
+    development = cl.Development(average=average).fit(triangle)
+
+    assert np.allclose(ldf[0, 0], development.ldf_.values[0, 0, 0])
+    assert np.allclose(cdf[0, 0, :-1], development.cdf_.values[0, 0, 0])
+
+
+@pytest.mark.parametrize('name', list(SAMPLES))
+def test_chainladder_matches_chainladder(name):
+    triangle = SAMPLES[name]
+
+    result = fit_triangle(triangle)
+    model = cl.Chainladder().fit(triangle)
+
+    assert result["origins"] == [str(origin) for origin in triangle.origin]
+    assert np.allclose(np.array(result["ultimate"], dtype=float), last_age(model.ultimate_), equal_nan=True)
+    assert np.allclose(np.array(result["ibnr"], dtype=float), last_age(model.ibnr_), equal_nan=True)
+
+
+def test_both_columns_at_once():
+    values = cumulative_values(us_auto)
+    ldf, cdf = fit_development(values)
+    results = project_ultimates(values, cdf)
+
+    model = cl.Chainladder().fit(us_auto)
+
+    assert np.allclose(results["ultimate"], model.ultimate_.values[..., 0])
+
+
+def test_bornhuetter_ferguson_and_cape_cod():
+    losses = wkcomp['CumPaidLoss']
+    premium = wkcomp['EarnedPremDIR']
+
+    bf = cl.BornhuetterFerguson(apriori=0.7).fit(losses, sample_weight=premium.latest_diagonal)
+    result = fit_triangle(losses, method="bornhuetter_ferguson", exposure=premium, apriori=0.7)
+    assert np.allclose(result["ultimate"], last_age(bf.ultimate_))
+
+    cape_cod = cl.CapeCod().fit(losses, sample_weight=premium.latest_diagonal)
+    result = fit_triangle(losses, method="cape_cod", exposure=premium)
+    assert np.allclose(result["ultimate"], last_age(cape_cod.ultimate_))
+
+    with pytest.raises(ValueError):
+        fit_triangle(losses, method="cape_cod")
+
+
+def test_incremental_array_triangle():
+    incremental = ArrayTriangle.from_triangle(raa.cum_to_incr())
+
+    assert not incremental.is_cumulative
+    assert np.allclose(
+        np.array(fit_triangle(incremental)["ibnr"], dtype=float),
+        np.array(fit_triangle(raa)["ibnr"], dtype=float),
+        equal_nan=True
+    )
+
+
+@pytest.mark.parametrize('method', ['development', 'chainladder', 'cape_cod'])
+def test_native_engine_matches_chainladder_engine(method):
+    task = ReservingTask(
+        label="wkcomp",
+        triangle=wkcomp['CumPaidLoss'],
+        method=method,
+        exposure=wkcomp['EarnedPremDIR']
+    )
+
+    native = fit_task(task, native=True)
+    expected = fit_task(task)
+
+    for name in ("ldf", "cdf", "latest", "ultimate", "ibnr"):
+        if name in expected:
+            assert np.allclose(
+                np.array(native[name], dtype=float),
+                np.array(expected[name], dtype=float),
+                equal_nan=True
+            )
@@ -0,0 +1,115 @@
+import chainladder as cl
+import numpy as np
+import pandas as pd
+import pytest
+import time
+
+from analysis_state import DevelopmentState
+
+from triangle_store import ArrayTriangle
+
+raa = cl.load_sample('raa')
+wkcomp = cl.load_sample('clrd').groupby('LOB').sum().loc['wkcomp']['CumPaidLoss']
+
+
+def last_age(triangle) -> np.ndarray:
+    return triangle.values[0, 0, :, -1]
+
+
+@pytest.mark.parametrize('average', ['volume', 'simple'])
+def test_matches_chainladder(average):
+    state = DevelopmentState(raa, average=average)
+    development = cl.Development(average=average).fit(raa)
+    model = cl.Chainladder().fit(development.transform(raa))
+
+    assert np.allclose(state.selected, development.ldf_.values[0, 0, 0])
+    assert np.allclose(state.ultimate, last_age(model.ultimate_))
+
+
+@pytest.mark.parametrize('average', ['volume', 'simple'])
+def test_exclusions_match_chainladder_drop(average):
+    drop = [('1982', 12), ('1985', 36), ('1981', 96)]
+
+    state = DevelopmentState(raa, average=average)
+    for origin, age in drop:
+        state.exclude(origin, age)
+
+    development = cl.Development(average=average, drop=drop).fit(raa)
+    model = cl.Chainladder().fit(development.transform(raa))
+
+    assert np.allclose(state.selected, development.ldf_.values[0, 0, 0])
+    assert np.allclose(state.cdf[:-1], development.cdf_.values[0, 0, 0])
+    assert np.allclose(state.ultimate, last_age(model.ultimate_))
+
+    # Including the link ratios again returns to the unedited analysis.
+    for origin, age in drop:
+        state.exclude(origin, age, excluded=False)
+
+    assert np.allclose(state.ultimate, DevelopmentState(raa, average=average).ultimate)
+
+
+def test_edits_only_change_downstream_values():
+    state = DevelopmentState(wkcomp)
+    ultimate = state.ultimate.copy()
+    cdf = state.cdf.copy()
+
+    # The 60-72 factor affects the CDFs up to age 60, and the origins whose latest age is 60 or less.
+    changes = state.exclude('1990', 60)
+
+    assert changes["ages"] == [0, 1, 2, 3, 4]
+    assert np.allclose(state.cdf[5:], cdf[5:])
+    assert not np.allclose(state.cdf[:5], cdf[:5])
+
+    unchanged = np.setdiff1d(np.arange(len(state.origins)), changes["origins"])
+    assert np.allclose(state.ultimate[unchanged], ultimate[unchanged], equal_nan=True)
+
+    # Excluding from an overridden age leaves the selection, and everything after it, alone.
+    state.override(12, 2.0)
+    ultimate = state.ultimate.copy()
+    assert state.exclude('1988', 12) == {"origins": [], "ages": [0]}
+    assert np.allclose(state.ultimate, ultimate)
+
+    # Reverting the override selects the new average.
+    state.override(12, None)
+    assert state.selected[0] == state.averages[0]
+
+
+def test_override_matches_full_recompute():
+    state = DevelopmentState(raa)
+    state.override(24, 1.5)
+    state.exclude('1983', 12)
+
+    rebuilt = DevelopmentState(raa)
+    rebuilt.excluded[:] = state.excluded
+    rebuilt.overrides = dict(state.overrides)
+    rebuilt.recompute()
+
+    assert np.allclose(state.cdf, rebuilt.cdf)
+    assert np.allclose(state.ibnr, rebuilt.ibnr, equal_nan=True)
+
+
+def test_edits_are_fast():
+    # A monthly triangle of 400 origins and ages.
+    values = np.cumsum(np.random.default_rng(0).lognormal(size=(1, 1, 400, 400)), axis=-1)
+    values[..., np.add.outer(np.arange(400), np.arange(400)) >= 400] = np.nan
+
+    triangle = ArrayTriangle(
+        values=values,
+        key_labels=["Total"],
+        keys=[["Total"]],
+        columns=["values"],
+        origins=pd.period_range("1990-01", periods=400, freq="M").start_time,
+        origin_labels=[str(origin) for origin in pd.period_range("1990-01", periods=400, freq="M")],
+        developments=list(range(1, 401)),
+        origin_grain="M",
+        development_grain="M"
+    )
+
+    state = DevelopmentState(triangle)
+
+    start_time = time.perf_counter()
+    for origin_position in range(100):
+        state.toggle_exclusion(origin_position, 1)
+    elapsed = (time.perf_counter() - start_time) / 100
+
+    assert elapsed < 0.016
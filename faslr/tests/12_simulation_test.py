@@ -0,0 +1,71 @@
+import chainladder as cl
+import numpy as np
+import pytest
+
+from engine import ReservingEngine
+
+from native import (
+    cumulative_values,
+    segment_total
+)
+
+from simulation import (
+    fit_odp,
+    run_bootstrap
+)
+
+raa = cl.load_sample('raa')
+abc = cl.load_sample('abc')
+
+
+@pytest.mark.parametrize('triangle', [raa, abc], ids=['raa', 'abc'])
+def test_scale_matches_chainladder(triangle):
+    model = fit_odp(segment_total(cumulative_values(triangle)))
+    expected = cl.BootstrapODPSample(n_sims=1, random_state=0).fit(triangle)
+
+    assert np.isclose(model["scale"], expected.scale_)
+    assert np.isclose(model["residuals"].mean(), 0)
+
+
+@pytest.mark.parametrize('triangle', [raa, abc], ids=['raa', 'abc'])
+def test_distribution_matches_chainladder(triangle):
+    summary = run_bootstrap([("sample", triangle)], n_sims=5000, seed=1, engine=ReservingEngine("in_process"))[0]
+
+    simulations = cl.BootstrapODPSample(n_sims=5000, random_state=1).fit_transform(triangle)
+    ibnr = cl.Chainladder().fit(simulations).ibnr_.sum('origin').values.ravel()
+
+    # Both are estimates from 5,000 simulations, so they agree only up to sampling error.
+    assert summary["mean"] == pytest.approx(np.nanmean(ibnr), rel=0.03)
+    assert summary["std"] == pytest.approx(np.nanstd(ibnr), rel=0.05)
+    assert summary["percentiles"][50] < summary["percentiles"][95] < summary["percentiles"][99.5]
+
+
+def test_results_do_not_depend_on_backend():
+    segments = [("raa", raa), ("abc", abc)]
+
+    in_process = run_bootstrap(segments, n_sims=1000, batch_size=300, seed=7, engine=ReservingEngine("in_process"))
+    summaries = []
+    threaded = run_bootstrap(
+        segments,
+        n_sims=1000,
+        batch_size=300,
+        seed=7,
+        engine=ReservingEngine("thread", max_workers=3),
+        partial_result_callback=summaries.append
+    )
+
+    assert len(summaries) == 2
+
+    by_label = {summary["label"]: summary for summary in threaded}
+    for summary in in_process:
+        other = by_label[summary["label"]]
+        assert summary["n_sims"] == other["n_sims"] == 1000
+        assert summary["mean"] == other["mean"]
+        assert summary["percentiles"] == other["percentiles"]
+        assert np.allclose(summary["origin_mean"], other["origin_mean"])
+
+    # Origin means add up to the mean of the total.
+    assert np.isclose(sum(in_process[0]["origin_mean"]), in_process[0]["mean"])
+
+    different_seed = run_bootstrap(segments[:1], n_sims=1000, seed=8, engine=ReservingEngine("in_process"))
+    assert different_seed[0]["mean"] != in_process[0]["mean"]
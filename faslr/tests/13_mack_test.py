@@ -0,0 +1,158 @@
+import chainladder as cl
+import numpy as np
+import pytest
+import warnings
+
+from analysis import LinkRatioModel
+
+from analysis_state import (
+    DevelopmentState,
+    fit_mack
+)
+
+from engine import (
+    fit_task,
+    ReservingTask
+)
+
+from native import (
+    cumulative_values,
+    mack_chainladder,
+    segment_total
+)
+
+raa = cl.load_sample('raa')
+abc = cl.load_sample('abc')
+ukmotor = cl.load_sample('ukmotor')
+
+clrd = cl.load_sample('clrd').groupby('LOB').sum()['CumPaidLoss']
+
+SAMPLES = {
+    "raa": raa,
+    "abc": abc,
+    "ukmotor": ukmotor
+}
+
+
+def last_age(triangle) -> np.ndarray:
+    return triangle.values[..., -1]
+
+
+@pytest.mark.parametrize('average', ['volume', 'simple'])
+@pytest.mark.parametrize('name', list(SAMPLES))
+def test_matches_chainladder(name, average):
+    triangle = SAMPLES[name]
+
+    results = mack_chainladder(segment_total(cumulative_values(triangle)), average=average)
+    model = cl.MackChainladder().fit(cl.Development(average=average).fit_transform(triangle))
+
+    assert np.allclose(results["mack_std_err"], last_age(model.mack_std_err_)[0, 0], equal_nan=True)
+    assert np.isclose(results["total_mack_std_err"], model.total_mack_std_err_.values[0, 0])
+
+
+def test_stacked_lobs_match_chainladder():
+    # Every LOB is fitted in one pass, from an array with axes (LOB, origin, development).
+    results = mack_chainladder(cumulative_values(clrd)[:, 0])
+    model = cl.MackChainladder().fit(clrd)
+
+    assert np.allclose(results["mack_std_err"], last_age(model.mack_std_err_)[:, 0], equal_nan=True)
+    assert np.allclose(results["total_mack_std_err"], model.total_mack_std_err_.values.ravel())
+
+
+def test_exclusions_match_chainladder_drop():
+    drop = [('1982', 12), ('1985', 36)]
+
+    state = DevelopmentState(raa)
+    for origin, age in drop:
+        state.exclude(origin, age)
+    fit_mack([state])
+
+    model = cl.MackChainladder().fit(cl.Development(drop=drop).fit_transform(raa))
+
+    assert np.allclose(state.mack_std_err, last_age(model.mack_std_err_)[0, 0], equal_nan=True)
+    assert np.isclose(state.total_mack_std_err, model.total_mack_std_err_.values[0, 0])
+
+
+def test_results_are_kept_until_the_fit_changes():
+    states = [DevelopmentState(clrd.loc[lob]) for lob in clrd.index['LOB']]
+
+    assert len(fit_mack(states)) == len(states)
+    assert fit_mack(states) == []
+
+    total = states[0].total_mack_std_err
+    states[0].exclude('1990', 12)
+
+    assert fit_mack(states) == [states[0]]
+    assert states[0].total_mack_std_err != total
+
+    states[0].exclude('1990', 12, excluded=False)
+    fit_mack(states)
+    assert np.isclose(states[0].total_mack_std_err, total)
+
+
+def test_native_engine_matches_chainladder_engine():
+    task = ReservingTask(label="raa", triangle=raa, method="mack")
+
+    native = fit_task(task, native=True)
+    expected = fit_task(task)
+
+    for name in ("ultimate", "ibnr", "mack_std_err"):
+        assert np.allclose(
+            np.array(native[name], dtype=float),
+            np.array(expected[name], dtype=float),
+            equal_nan=True
+        )
+    assert np.isclose(native["total_mack_std_err"], expected["total_mack_std_err"])
+
+
+def test_negative_and_sparse_segments_give_empty_errors():
+    values = segment_total(cumulative_values(raa))
+
+    # A negative latest value, as after salvage, and a sparse segment of one company, whose extrapolated sigmas
+    # are too large to square.
+    negative = values.copy()
+    negative[-2, 1] = -500.0
+    sparse = np.full(values.shape, np.nan)
+    sparse[3, 1:7] = [15, 24, 28, 5, 5, 5]
+    sparse[4, 3:6] = 6
+    sparse[5, 2:5] = [32, 103, 103]
+    sparse[6, 1:4] = 1
+    sparse[7, 2] = 3
+    sparse[9, 0] = 1
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results = mack_chainladder(np.stack([negative, sparse]))
+
+    assert np.isfinite(results["mack_std_err"][0, -2])
+    assert not np.isinf(results["mack_std_err"]).any()
+    assert np.isfinite(results["total_mack_std_err"][0])
+    assert np.isnan(results["total_mack_std_err"][1])
+
+
+def test_link_ratio_model_refits_and_repaints_every_origin():
+    state = DevelopmentState(raa)
+    model = LinkRatioModel(state)
+    fit_mack([state])
+    mack_column = model.columnCount() - 1
+
+    repainted = []
+    # noinspection PyUnresolvedReferences
+    model.dataChanged.connect(lambda top_left, bottom_right: repainted.append(
+        (top_left.row(), bottom_right.row(), top_left.column(), bottom_right.column())
+    ))
+
+    model.toggle_exclusion(model.index(2, 3))
+
+    assert (0, len(state.origins) - 1, mack_column, mack_column) in repainted
+    assert state.mack_is_current
+
+    expected = DevelopmentState(raa)
+    expected.exclude(state.origins[2], state.ages[3])
+    fit_mack([expected])
+    assert model.index(1, mack_column).data() == "{:,.0f}".format(expected.mack_std_err[1])
+
+    # Edits made to the state directly are not fitted while painting.
+    state.exclude(state.origins[4], state.ages[0])
+    assert model.index(1, mack_column).data() == ""
+    assert not state.mack_is_current
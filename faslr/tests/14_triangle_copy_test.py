@@ -0,0 +1,50 @@
+import chainladder as cl
+import numpy as np
+
+from PyQt5.QtCore import QItemSelectionRange
+
+from triangle_model import (
+    create_triangle_model,
+    LazyTriangleModel,
+    selection_table,
+    to_tsv
+)
+
+raa = cl.load_sample('raa')
+
+
+def test_rectangular_selection():
+    model = create_triangle_model(raa)
+    ranges = [QItemSelectionRange(model.index(0, 0), model.index(1, 2))]
+
+    assert to_tsv(selection_table(model, ranges)) == "5,012\t8,269\t10,907\r\n106\t4,285\t5,396\r\n"
+    assert to_tsv(selection_table(model, ranges, raw=True)) == "5012.0\t8269.0\t10907.0\r\n106.0\t4285.0\t5396.0\r\n"
+
+
+def test_raw_values_keep_full_precision():
+    values = np.array([[1 / 3, np.nan], [2.5e-7, 1234567.891]])
+    model = LazyTriangleModel(values, origins=["a", "b"], developments=["1", "2"], units=1000)
+    ranges = [QItemSelectionRange(model.index(0, 0), model.index(1, 1))]
+
+    table = selection_table(model, ranges, raw=True)
+    assert float(table[0, 0]) == 1 / 3
+    assert table[0, 1] == ""
+    assert float(table[1, 1]) == 1234567.891
+
+    # Display strings are in the model's units.
+    assert selection_table(model, ranges)[1, 1] == "1,235"
+
+
+def test_cells_outside_a_split_selection_are_blank():
+    model = create_triangle_model(raa)
+    ranges = [
+        QItemSelectionRange(model.index(0, 0), model.index(0, 0)),
+        QItemSelectionRange(model.index(2, 3), model.index(2, 3))
+    ]
+
+    table = selection_table(model, ranges)
+
+    assert table.shape == (3, 4)
+    assert table[0, 0] == "5,012"
+    assert table[2, 3] == "16,141"
+    assert (table == "").sum() == 10
@@ -0,0 +1,127 @@
+import chainladder as cl
+import csv
+import numpy as np
+import pytest
+
+from analysis_state import DevelopmentState
+
+from connection import get_session_factory
+
+from export import (
+    export_analysis,
+    export_project,
+    state_segments,
+    table_path,
+    write_export
+)
+
+from triangle_store import save_triangle
+
+raa = cl.load_sample('raa')
+clrd = cl.load_sample('clrd').iloc[:20]
+
+
+def read_table(path, table: str) -> list:
+    with open(table_path(str(path), table, ".csv"), newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def test_analysis_keeps_exclusions_and_selections(tmp_path):
+    state = DevelopmentState(raa)
+    state.exclude('1982', 12)
+    state.override(24, 1.5)
+
+    path = tmp_path / "review.csv"
+    progress = []
+    summary = write_export(
+        state_segments({("raa", "values"): state}),
+        str(path),
+        "csv",
+        chunk_size=7,
+        progress_callback=lambda completed, total: progress.append((completed, total))
+    )
+
+    assert progress == [(1, 1)]
+    assert summary["rows"] == {"triangles": 55, "link_ratios": 45, "selections": 9, "results": 10}
+
+    triangles = read_table(path, "triangles")
+    assert len(triangles) == 55
+    assert float(triangles[0]["value"]) == 5012
+
+    excluded = [row for row in read_table(path, "link_ratios") if row["excluded"] == "True"]
+    assert [(row["origin"], row["development"]) for row in excluded] == [("1982", "12")]
+
+    selections = read_table(path, "selections")
+    assert [row["development"] for row in selections if row["overridden"] == "True"] == ["24"]
+    assert np.allclose([float(row["selected"]) for row in selections], state.selected)
+
+    results = read_table(path, "results")
+    assert np.allclose([float(row["ultimate"]) for row in results], state.ultimate)
+    assert results[0]["mack_std_err"] == ""
+    assert np.isclose(float(results[-1]["mack_std_err"]), state.mack_std_err[-1])
+
+
+def test_analysis_is_exported_from_a_copy(tmp_path):
+    state = DevelopmentState(raa)
+    snapshot = state.copy()
+
+    # Edits made after the copy is taken, e.g., while the export runs, are not exported.
+    state.exclude('1982', 12)
+
+    path = tmp_path / "review.csv"
+    export_analysis({("raa", "values"): snapshot}, str(path), "csv")
+
+    assert all(row["excluded"] == "False" for row in read_table(path, "link_ratios"))
+    assert snapshot.mack_is_current and not state.mack_is_current
+    assert np.isnan(state.mack_std_err).all()
+
+
+def test_project_is_written_one_triangle_at_a_time(tmp_path):
+    db_path = str(tmp_path / "project.db")
+    session = get_session_factory(db_path)()
+    save_triangle(session, raa, name="raa")
+    save_triangle(session, clrd, name="clrd", compression="zlib")
+    session.commit()
+    session.close()
+
+    path = tmp_path / "project.csv"
+    progress = []
+    summary = export_project(db_path, str(path), "csv", progress_callback=lambda *args: progress.append(args))
+
+    assert progress == [(1, 2), (2, 2)]
+
+    triangles = read_table(path, "triangles")
+    assert summary["rows"]["triangles"] == len(triangles)
+    assert len(triangles) == np.count_nonzero(~np.isnan(raa.values)) + np.count_nonzero(~np.isnan(clrd.values))
+    assert {row["source"] for row in triangles} == {"raa", "clrd"}
+
+    # Each index key and column of a triangle is exported on its own.
+    segments = {(row["key"], row["column"]) for row in triangles if row["source"] == "clrd"}
+    assert len(segments) == np.count_nonzero((~np.isnan(clrd.values)).any(axis=(2, 3)))
+
+    expected = cl.MackChainladder().fit(raa).mack_std_err_.values[0, 0, -1, -1]
+    raa_results = [row for row in read_table(path, "results") if row["source"] == "raa"]
+    assert np.isclose(float(raa_results[-1]["mack_std_err"]), expected)
+
+
+def test_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    path = tmp_path / "review.parquet"
+    write_export(state_segments({("raa", "values"): DevelopmentState(raa)}), str(path), "parquet", chunk_size=10)
+
+    table = pq.read_table(table_path(str(path), "triangles", ".parquet"))
+    assert table.num_rows == 55
+    assert pq.ParquetFile(table_path(str(path), "triangles", ".parquet")).num_row_groups > 1
+
+
+def test_missing_dependency_is_reported(tmp_path):
+    try:
+        import openpyxl
+    except ImportError:
+        with pytest.raises(ImportError, match="openpyxl"):
+            write_export([], str(tmp_path / "review.xlsx"), "xlsx")
+    else:
+        summary = write_export([], str(tmp_path / "review.xlsx"), "xlsx")
+        assert openpyxl.load_workbook(summary["files"][0]).sheetnames == list(summary["rows"])
@@ -0,0 +1,72 @@
+import connection
+import sqlite3
+
+from connection import (
+    get_database_config,
+    set_database_config,
+    set_sqlite_pragmas
+)
+
+from constants import SQLITE_PROFILES
+
+from sqlite_benchmark import run_benchmark
+
+
+def test_profile_round_trip(tmp_path):
+    config_path = str(tmp_path / "faslr.ini")
+
+    assert get_database_config(config_path) == {"profile": "personal", "pragmas": SQLITE_PROFILES["personal"]}
+
+    set_database_config("shared", {"busy_timeout": 10000}, config_path=config_path)
+    database_config = get_database_config(config_path)
+
+    assert database_config["profile"] == "shared"
+    assert database_config["pragmas"] == dict(SQLITE_PROFILES["shared"], busy_timeout=10000)
+
+    # Overrides do not carry over to another profile.
+    set_database_config("network_share", config_path=config_path)
+    assert get_database_config(config_path)["pragmas"] == SQLITE_PROFILES["network_share"]
+
+
+def test_invalid_values_fall_back_to_the_profile(tmp_path):
+    config_path = tmp_path / "faslr.ini"
+    config_path.write_text("[DATABASE]\nprofile = shared\njournal_mode = WAL; DROP TABLE\ncache_size = lots\n")
+
+    assert get_database_config(str(config_path))["pragmas"] == SQLITE_PROFILES["shared"]
+
+
+def test_engine_applies_the_configured_profile(tmp_path, monkeypatch):
+    config_path = str(tmp_path / "faslr.ini")
+    set_database_config("shared", config_path=config_path)
+    monkeypatch.setattr(connection, "CONFIG_PATH", config_path)
+
+    engine = connection.get_engine(str(tmp_path / "shared.db"))
+    try:
+        with engine.connect() as db_connection:
+            assert db_connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert db_connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 30000
+            assert db_connection.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+    finally:
+        connection.dispose_engine(str(tmp_path / "shared.db"))
+
+    # The pragmas also apply to plain sqlite3 connections, as used by the benchmark.
+    db_connection = sqlite3.connect(str(tmp_path / "personal.db"))
+    set_sqlite_pragmas(db_connection, pragmas=SQLITE_PROFILES["personal"])
+    assert db_connection.execute("PRAGMA synchronous").fetchone()[0] == 2
+    db_connection.close()
+
+
+def test_benchmark(tmp_path):
+    progress = []
+    results = run_benchmark(
+        profiles=["personal", "shared"],
+        readers=2,
+        writers=1,
+        seconds=0.5,
+        directory=str(tmp_path),
+        progress_callback=lambda *args: progress.append(args)
+    )
+
+    assert progress == [(1, 2), (2, 2)]
+    assert [result["profile"] for result in results] == ["personal", "shared"]
+    assert all(result["reads"] > 0 and result["writes"] > 0 for result in results)
@@ -0,0 +1,58 @@
+import csv
+
+from connection import (
+    create_db,
+    fetch_project_nodes
+)
+
+from project_import import import_projects
+
+from project_tree import ProjectTreeModel
+
+
+class DeferredTasks:
+    """
+    Stands in for MainWindow.run_task, holding each task until run_pending is called, as if it were still
+    running on the thread pool.
+    """
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self, fn, *args, on_result=None, on_finished=None, message=None, **kwargs):
+        self.pending.append((fn, args, kwargs, on_result, on_finished))
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        for fn, args, kwargs, on_result, on_finished in pending:
+            on_result(fn(*args, **kwargs))
+            on_finished()
+
+
+def test_children_are_fetched_once_off_the_gui_thread(tmp_path):
+    db_path = str(tmp_path / "projects.db")
+    create_db(db_path)
+    manifest = tmp_path / "manifest.csv"
+    with open(manifest, 'w', newline='') as file:
+        csv.writer(file).writerows([("Country", "State", "LOB"), ("USA", "Texas", "Auto"), ("USA", "Ohio", "Auto")])
+    import_projects(db_path, str(manifest))
+
+    tasks = DeferredTasks()
+    model = ProjectTreeModel(run_task=tasks)
+    model.set_database(db_path, fetch_project_nodes(db_path, 0))
+
+    usa = model.index(0, 0)
+    assert model.canFetchMore(usa)
+
+    model.fetchMore(usa)
+    model.fetchMore(usa)
+
+    # Nothing is inserted until the query returns, and the node is only queried once.
+    assert len(tasks.pending) == 1
+    assert model.rowCount(usa) == 0
+    assert not model.canFetchMore(usa)
+
+    tasks.run_pending()
+
+    assert [model.index(row, 0, usa).data() for row in range(model.rowCount(usa))] == ["Texas", "Ohio"]
+    assert not model.canFetchMore(usa)
+    assert model.canFetchMore(model.index(0, 0, usa))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The application modules import each other by their bare names, e.g., "from connection import ...", since
+# main.py is run from within the faslr directory. Put that directory on the path so tests can do the same.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
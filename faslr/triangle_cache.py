@@ -0,0 +1,441 @@
+"""
+Content-addressed, on-disk cache of triangles. Entries are keyed by a SHA-256 hash of the source data and of the
+parameters the triangle was built with, so a triangle is only rebuilt when either changes. Each entry is an .npy
+file holding the dense values, which is opened memory-mapped so that tabs showing the same triangle share the
+same pages, plus a .json file holding the axes. The least recently used entries are removed once the cache
+grows past its size limit.
+
+The cache can be inspected and cleared from the command line:
+
+python triangle_cache.py list
+python triangle_cache.py evict --max-size 500M
+python triangle_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import pandas as pd
+import threading
+import time
+
+from constants import (
+    CACHE_MAX_BYTES,
+    CACHE_PATH
+)
+
+from triangle_store import ArrayTriangle
+
+# Part of every key, so that entries written in an older layout are never read back.
+CACHE_FORMAT_VERSION = 1
+
+SIZE_UNITS = {
+    "K": 1 << 10,
+    "M": 1 << 20,
+    "G": 1 << 30
+}
+
+
+class TriangleCache:
+    """
+    A directory of cached triangles.
+
+    cache = TriangleCache()
+    key = cache_key(hash_file("claims.csv"), origin="Accident Year", development="Calendar Year")
+    triangle = cache.get_or_build(key, lambda: ArrayTriangle.from_triangle(build_triangle()))
+    """
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Returns the cached triangle with the given key, with read-only, memory-mapped values, or None if there
+        is no such entry.
+        :param key:
+        :return:
+        """
+        values_path, metadata_path = self._entry_paths(key)
+
+        try:
+            with open(metadata_path) as metadata_file:
+                metadata = json.load(metadata_file)
+            values = np.load(values_path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as error:
+            logging.warning("Discarding unreadable cache entry " + key + ": " + str(error))
+            self.remove(key)
+            return None
+
+        # The modification time of the metadata file records the last use, for eviction.
+        try:
+            os.utime(metadata_path)
+        except OSError:
+            pass
+
+        return ArrayTriangle.from_metadata(values, metadata["axes"])
+
+    def put(self, key: str, triangle) -> ArrayTriangle:
+        """
+        Stores a chainladder Triangle or an ArrayTriangle under key, then trims the cache to its size limit.
+        Files are written under temporary names and renamed, so readers never see a partial entry.
+        :param key:
+        :param triangle:
+        :return: The stored triangle, memory-mapped from the cache.
+        """
+        if not isinstance(triangle, ArrayTriangle):
+            triangle = ArrayTriangle.from_triangle(triangle)
+
+        os.makedirs(self.path, exist_ok=True)
+
+        values_path, metadata_path = self._entry_paths(key)
+        suffix = ".%s-%s.tmp" % (os.getpid(), threading.get_ident())
+
+        with open(values_path + suffix, 'wb') as values_file:
+            np.save(values_file, np.ascontiguousarray(triangle.values, dtype=float))
+
+        with open(metadata_path + suffix, 'w') as metadata_file:
+            json.dump(
+                {
+                    "key": key,
+                    "shape": list(triangle.shape),
+                    "created_on": int(time.time()),
+                    "axes": triangle.axis_metadata()
+                },
+                metadata_file,
+                default=str
+            )
+
+        os.replace(values_path + suffix, values_path)
+        os.replace(metadata_path + suffix, metadata_path)
+
+        self.evict(keep=key)
+
+        return self.get(key)
+
+    def get_or_build(self, key: str, build) -> ArrayTriangle:
+        """
+        Returns the cached triangle with the given key, calling build() to create and store it on a miss.
+        :param key:
+        :param build: Function returning a chainladder Triangle or an ArrayTriangle.
+        :return:
+        """
+        triangle = self.get(key)
+
+        if triangle is None:
+            logging.info("Triangle cache miss for " + key + ".")
+            triangle = self.put(key, build())
+
+        return triangle
+
+    def entries(self) -> list:
+        """
+        Returns a dictionary for each entry, holding its key, shape, size in bytes and the time it was last used,
+        most recently used first.
+        :return:
+        """
+        if not os.path.isdir(self.path):
+            return []
+
+        entries = []
+
+        for file_name in os.listdir(self.path):
+            if not file_name.endswith(".json"):
+                continue
+
+            key = file_name[:-len(".json")]
+            values_path, metadata_path = self._entry_paths(key)
+
+            try:
+                with open(metadata_path) as metadata_file:
+                    metadata = json.load(metadata_file)
+                size = os.path.getsize(values_path) + os.path.getsize(metadata_path)
+                last_used = os.path.getmtime(metadata_path)
+            except (ValueError, OSError):
+                continue
+
+            entries.append({
+                "key": key,
+                "shape": tuple(metadata.get("shape", ())),
+                "size": size,
+                "last_used": last_used
+            })
+
+        entries.sort(key=lambda entry: entry["last_used"], reverse=True)
+
+        return entries
+
+    def size(self) -> int:
+        return sum(entry["size"] for entry in self.entries())
+
+    def evict(self, max_bytes: int = None, keep: str = None) -> list:
+        """
+        Removes the least recently used entries until the cache is no larger than max_bytes.
+        :param max_bytes: Defaults to the cache's size limit.
+        :param keep: Key of an entry that is never removed, e.g., the one just written.
+        :return: The keys removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            removed = []
+
+            for entry in reversed(entries):
+                if total <= max_bytes:
+                    break
+                if entry["key"] == keep:
+                    continue
+                self.remove(entry["key"])
+                total -= entry["size"]
+                removed.append(entry["key"])
+
+        if removed:
+            logging.info("Evicted %s entries from the triangle cache." % len(removed))
+
+        return removed
+
+    def remove(self, key: str):
+        # On Windows, a file cannot be removed while it is memory-mapped. It is left for a later eviction.
+        for path in self._entry_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                logging.warning("Could not remove " + path + ": " + str(error))
+
+    def clear(self) -> int:
+        """
+        Removes every entry.
+        :return: The number of entries removed.
+        """
+        entries = self.entries()
+        for entry in entries:
+            self.remove(entry["key"])
+        return len(entries)
+
+    def _entry_paths(self, key: str) -> tuple:
+        return os.path.join(self.path, key + ".npy"), os.path.join(self.path, key + ".json")
+
+
+def cache_key(source: str, **params) -> str:
+    """
+    Combines the hash of a triangle's source data with the parameters it is built with into a cache key.
+    :param source: Hash of the source data, e.g., from hash_file or hash_frame.
+    :param params: Construction parameters, e.g., origin, development, columns and cumulative.
+    :return:
+    """
+    description = json.dumps(
+        {
+            "format": CACHE_FORMAT_VERSION,
+            "source": source,
+            "params": params
+        },
+        sort_keys=True,
+        default=str
+    )
+
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """
+    Returns the SHA-256 hash of a file's contents, read in blocks.
+    :param path:
+    :return:
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def hash_frame(data: pd.DataFrame) -> str:
+    """
+    Returns a SHA-256 hash of a DataFrame's values, index, column names and dtypes.
+    :param data:
+    :return:
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in data.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in data.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def triangle_from_frame(
+        data: pd.DataFrame,
+        origin: str,
+        development: str,
+        columns: list,
+        index: list = None,
+        cumulative: bool = True,
+        cache: TriangleCache = None
+) -> ArrayTriangle:
+    """
+    Returns the triangle built from a DataFrame with chainladder.Triangle, from the cache if it has been built
+    from the same data and parameters before.
+    :param data:
+    :param origin:
+    :param development:
+    :param columns:
+    :param index:
+    :param cumulative:
+    :param cache: Defaults to the cache in CACHE_PATH.
+    :return:
+    """
+    cache = cache or TriangleCache()
+
+    params = {
+        "origin": origin,
+        "development": development,
+        "columns": list(columns),
+        "index": list(index) if index else None,
+        "cumulative": cumulative
+    }
+
+    def build():
+        import chainladder as cl
+
+        return cl.Triangle(data, **params)
+
+    return cache.get_or_build(cache_key(hash_frame(data), **params), build)
+
+
+def triangle_from_csv(
+        path: str,
+        origin: str,
+        development: str,
+        columns: list,
+        index: list = None,
+        cumulative: bool = True,
+        cache: TriangleCache = None,
+        **read_csv_kwargs
+) -> ArrayTriangle:
+    """
+    As triangle_from_frame, for a CSV file. On a hit, the file is hashed but not parsed.
+    :param path:
+    :param origin:
+    :param development:
+    :param columns:
+    :param index:
+    :param cumulative:
+    :param cache:
+    :param read_csv_kwargs: Passed on to pandas.read_csv.
+    :return:
+    """
+    cache = cache or TriangleCache()
+
+    params = {
+        "origin": origin,
+        "development": development,
+        "columns": list(columns),
+        "index": list(index) if index else None,
+        "cumulative": cumulative
+    }
+
+    def build():
+        import chainladder as cl
+
+        return cl.Triangle(pd.read_csv(path, **read_csv_kwargs), **params)
+
+    key = cache_key(hash_file(path), read_csv_kwargs=read_csv_kwargs, **params)
+
+    return cache.get_or_build(key, build)
+
+
+def get_sample_triangle(name: str, cache: TriangleCache = None) -> ArrayTriangle:
+    """
+    Returns one of chainladder's sample triangles. On a hit, chainladder is not imported.
+    :param name: e.g., raa or abc.
+    :param cache:
+    :return:
+    """
+    from importlib.metadata import version
+
+    cache = cache or TriangleCache()
+
+    def build():
+        import chainladder as cl
+
+        return cl.load_sample(name)
+
+    return cache.get_or_build(cache_key("chainladder.load_sample", name=name, version=version("chainladder")), build)
+
+
+def parse_size(size: str) -> int:
+    """
+    Converts a size such as 500M or 2G into bytes.
+    :param size:
+    :return:
+    """
+    size = size.strip().upper().rstrip("B")
+
+    if size and size[-1] in SIZE_UNITS:
+        return int(float(size[:-1]) * SIZE_UNITS[size[-1]])
+
+    return int(size)
+
+
+def format_size(n_bytes: int) -> str:
+    for unit in ("G", "M", "K"):
+        if n_bytes >= SIZE_UNITS[unit]:
+            return "%.1f %sB" % (n_bytes / SIZE_UNITS[unit], unit)
+    return "%s B" % n_bytes
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the FASLR triangle cache.")
+    parser.add_argument("--path", default=CACHE_PATH, help="cache directory, default: %(default)s")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list entries, most recently used first")
+    commands.add_parser("info", help="show the number of entries and their total size")
+    commands.add_parser("clear", help="remove every entry")
+    evict_parser = commands.add_parser("evict", help="remove least recently used entries")
+    evict_parser.add_argument(
+        "--max-size",
+        default=format_size(CACHE_MAX_BYTES).replace(" ", ""),
+        help="size to trim the cache to, e.g., 500M, default: %(default)s"
+    )
+
+    args = parser.parse_args(argv)
+
+    cache = TriangleCache(path=args.path)
+
+    if args.command == "list":
+        for entry in cache.entries():
+            print("%s  %-20s %10s  %s" % (
+                entry["key"][:16],
+                "x".join(str(n) for n in entry["shape"]),
+                format_size(entry["size"]),
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["last_used"]))
+            ))
+
+    elif args.command == "info":
+        entries = cache.entries()
+        print("%s: %s entries, %s" % (
+            cache.path,
+            len(entries),
+            format_size(sum(entry["size"] for entry in entries))
+        ))
+
+    elif args.command == "clear":
+        print("Removed %s entries." % cache.clear())
+
+    elif args.command == "evict":
+        print("Removed %s entries." % len(cache.evict(max_bytes=parse_size(args.max_size))))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
-import csv
-import io
+import numpy as np
+import profiler
+
+from collections import OrderedDict
 
 from PyQt5.QtCore import (
     QAbstractTableModel,
     QEvent,
-    Qt,
-    QVariant
+    QModelIndex,
+    Qt
 )
 
 from PyQt5.QtGui import (
@@ -20,34 +22,121 @@ from PyQt5.QtWidgets import (
     QTableView
 )
 
+# Background of the cells beneath the latest diagonal.
+SHADED_COLOR = QColor(238, 237, 238)
 
-class TriangleModel(QAbstractTableModel):
+# Triangles with more cells than this are displayed with a LazyTriangleModel.
+LAZY_MODEL_THRESHOLD = 40000
 
-    def __init__(self, data):
+
+class TriangleModel(QAbstractTableModel):
+    """
+    Table model for a triangle held in a DataFrame. The display strings and cell shading are computed once,
+    when the data or the display settings change, so that repainting the view only does array lookups.
+    """
+    def __init__(self, data, decimals=0, units=1):
         super(TriangleModel, self).__init__()
         self._data = data
 
+        self.decimals = decimals
+        self.units = units
+
+        self._values = None
+        self._display = None
+        self._shaded = None
+        self._row_headers = None
+        self._column_headers = None
+
+        self.n_rows = self.rowCount()
+        self.n_columns = self.columnCount()
+
+        with profiler.span("TriangleModel.build_display_cache", category="model", cells=self._data.size):
+            self.build_display_cache()
+
+    def build_display_cache(self):
+        """
+        Formats every cell of the triangle and determines which ones are shaded, i.e., those below the
+        latest diagonal.
+        :return:
+        """
+        values = self._data.to_numpy(dtype=float, na_value=np.nan)
+
+        self._values = values
+        self._display = format_values(values, decimals=self.decimals, units=self.units)
+
+        rows, columns = np.indices(values.shape)
+        self._shaded = columns >= self.n_rows - rows
+
+        self._row_headers = [str(label) for label in self._data.index]
+        self._column_headers = [str(label) for label in self._data.columns]
+
+    def set_display_options(self, decimals=None, units=None):
+        """
+        Changes the number of decimals and the units, e.g., 1,000 for display in thousands, and refreshes
+        the view.
+        :param decimals:
+        :param units:
+        :return:
+        """
+        if decimals is not None:
+            self.decimals = decimals
+        if units is not None:
+            self.units = units
+
+        self.build_display_cache()
+
+        # noinspection PyUnresolvedReferences
+        self.dataChanged.emit(
+            self.index(0, 0),
+            self.index(self.n_rows - 1, self.n_columns - 1),
+            [Qt.DisplayRole]
+        )
+
+    def update_data(self, data):
+        """
+        Replaces the underlying DataFrame, e.g., when switching to another column of the triangle.
+        :param data:
+        :return:
+        """
+        self.beginResetModel()
+        self._data = data
         self.n_rows = self.rowCount()
         self.n_columns = self.columnCount()
+        self.build_display_cache()
+        self.endResetModel()
 
     def data(self, index, role=None):
         if role == Qt.DisplayRole:
-            value = self._data.iloc[index.row(), index.column()]
-            if str(value) == "nan":
-                display_value = ""
-            else:
-                display_value = "{0:,.0f}".format(value)
-                display_value = str(display_value)
-            self.setData(self.index(index.row(), index.column()), QVariant(Qt.AlignRight),
-                         Qt.TextAlignmentRole)
-
-            return display_value
+            return self._display[index.row(), index.column()]
 
         if role == Qt.TextAlignmentRole:
             return Qt.AlignRight
 
-        if role == Qt.BackgroundRole and (index.column() >= self.n_rows - index.row()):
-            return QColor(238, 237, 238)
+        if role == Qt.BackgroundRole and self._shaded[index.row(), index.column()]:
+            return SHADED_COLOR
+
+    def raw_block(self, top: int, left: int, bottom: int, right: int) -> np.ndarray:
+        """
+        Returns the values of a rectangle of cells, from (top, left) up to but excluding (bottom, right), at full
+        precision and in the original units.
+        :param top:
+        :param left:
+        :param bottom:
+        :param right:
+        :return:
+        """
+        return self._values[top:bottom, left:right]
+
+    def display_block(self, top: int, left: int, bottom: int, right: int) -> np.ndarray:
+        """
+        As raw_block, but returns the display strings.
+        :param top:
+        :param left:
+        :param bottom:
+        :param right:
+        :return:
+        """
+        return self._display[top:bottom, left:right]
 
     def rowCount(self, parent=None, *args, **kwargs):
         return self._data.shape[0]
@@ -59,10 +148,244 @@ class TriangleModel(QAbstractTableModel):
         # section is the index of the column/row.
         if role == Qt.DisplayRole:
             if qt_orientation == Qt.Horizontal:
-                return str(self._data.columns[p_int])
+                return self._column_headers[p_int]
+
+            if qt_orientation == Qt.Vertical:
+                return self._row_headers[p_int]
+
+
+class LazyTriangleModel(QAbstractTableModel):
+    """
+    Table model that reads cells straight from a 2D array view of a chainladder triangle rather than from a
+    DataFrame produced by to_frame(). Rows are handed to the view in batches through canFetchMore/fetchMore,
+    and display strings are formatted one block of cells at a time when the view first paints them. Only the
+    most recently used blocks are kept, so memory stays flat regardless of the size of the triangle.
+    """
+    def __init__(
+            self,
+            values,
+            origins: list,
+            developments: list,
+            decimals=0,
+            units=1,
+            fetch_size=256,
+            block_size=64,
+            max_blocks=64
+    ):
+        super(LazyTriangleModel, self).__init__()
+
+        self._values = values
+        self._row_headers = origins
+        self._column_headers = developments
+
+        self.decimals = decimals
+        self.units = units
+
+        self.fetch_size = fetch_size
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+
+        self.n_rows = values.shape[0]
+        self.n_columns = values.shape[1]
+
+        self._loaded_rows = min(fetch_size, self.n_rows)
+        self._blocks = OrderedDict()
+
+    @classmethod
+    def from_triangle(cls, triangle, key=0, column=0, **kwargs):
+        """
+        Creates a model for one index key and column of a chainladder triangle, given by position, without
+        copying its values.
+        :param triangle:
+        :param key:
+        :param column:
+        :param kwargs:
+        :return:
+        """
+        return cls(
+            triangle.values[key, column],
+            origins=[str(origin) for origin in triangle.origin],
+            developments=[str(age) for age in triangle.ddims],
+            **kwargs
+        )
+
+    def set_display_options(self, decimals=None, units=None):
+        if decimals is not None:
+            self.decimals = decimals
+        if units is not None:
+            self.units = units
+
+        self._blocks.clear()
+
+        # noinspection PyUnresolvedReferences
+        self.dataChanged.emit(
+            self.index(0, 0),
+            self.index(self._loaded_rows - 1, self.n_columns - 1),
+            [Qt.DisplayRole]
+        )
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded_rows < self.n_rows
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        n_fetched = min(self.fetch_size, self.n_rows - self._loaded_rows)
+        self.beginInsertRows(QModelIndex(), self._loaded_rows, self._loaded_rows + n_fetched - 1)
+        self._loaded_rows += n_fetched
+        self.endInsertRows()
+
+    def data(self, index, role=None):
+        row = index.row()
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            block = self.get_block(row // self.block_size, column // self.block_size)
+            return block[row % self.block_size, column % self.block_size]
+
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight
+
+        if role == Qt.BackgroundRole and (column >= self.n_rows - row):
+            return SHADED_COLOR
+
+    def get_block(self, block_row: int, block_column: int) -> np.ndarray:
+        """
+        Returns the display strings of a block of cells, formatting it if it is not already cached.
+        :param block_row:
+        :param block_column:
+        :return:
+        """
+        key = (block_row, block_column)
+
+        if key in self._blocks:
+            self._blocks.move_to_end(key)
+            return self._blocks[key]
+
+        top = block_row * self.block_size
+        left = block_column * self.block_size
+        values = self._values[top:top + self.block_size, left:left + self.block_size]
+
+        # Arrays with a sparse backend need to be densified, but only for the block being displayed.
+        if hasattr(values, "todense"):
+            values = values.todense()
+
+        block = format_values(np.asarray(values, dtype=float), decimals=self.decimals, units=self.units)
+
+        self._blocks[key] = block
+        if len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+        return block
+
+    def raw_block(self, top: int, left: int, bottom: int, right: int) -> np.ndarray:
+        """
+        Returns the values of a rectangle of cells, from (top, left) up to but excluding (bottom, right), at full
+        precision and in the original units. They are sliced from the backing array, bypassing the block cache.
+        :param top:
+        :param left:
+        :param bottom:
+        :param right:
+        :return:
+        """
+        values = self._values[top:bottom, left:right]
+
+        if hasattr(values, "todense"):
+            values = values.todense()
+
+        return np.asarray(values, dtype=float)
+
+    def display_block(self, top: int, left: int, bottom: int, right: int) -> np.ndarray:
+        """
+        As raw_block, but returns the display strings. The rectangle is formatted in one pass rather than block
+        by block, and is not cached.
+        :param top:
+        :param left:
+        :param bottom:
+        :param right:
+        :return:
+        """
+        return format_values(self.raw_block(top, left, bottom, right), decimals=self.decimals, units=self.units)
+
+    def rowCount(self, parent=None, *args, **kwargs):
+        return self._loaded_rows
+
+    def columnCount(self, parent=None, *args, **kwargs):
+        return self.n_columns
+
+    def headerData(self, p_int, qt_orientation, role=None):
+        if role == Qt.DisplayRole:
+            if qt_orientation == Qt.Horizontal:
+                return self._column_headers[p_int]
 
             if qt_orientation == Qt.Vertical:
-                return str(self._data.index[p_int])
+                return self._row_headers[p_int]
+
+
+def create_triangle_model(triangle, key=0, column=0, **kwargs):
+    """
+    Returns a TriangleModel for one index key and column of a chainladder triangle or an ArrayTriangle, or a
+    LazyTriangleModel if the triangle is too large to materialize in full.
+    :param triangle:
+    :param key:
+    :param column:
+    :param kwargs:
+    :return:
+    """
+    n_cells = triangle.shape[2] * triangle.shape[3]
+
+    if n_cells > LAZY_MODEL_THRESHOLD:
+        return LazyTriangleModel.from_triangle(triangle, key=key, column=column, **kwargs)
+    elif hasattr(triangle, 'iloc'):
+        return TriangleModel(triangle.iloc[key, column].to_frame(), **kwargs)
+    else:
+        return TriangleModel(triangle.to_frame(key=key, column=column), **kwargs)
+
+
+def format_values(values: np.ndarray, decimals=0, units=1) -> np.ndarray:
+    """
+    Returns an array of display strings with thousands separators, leaving missing values blank.
+    :param values:
+    :param decimals:
+    :param units:
+    :return:
+    """
+    template = "{0:,.%sf}" % decimals
+
+    display = np.full(values.shape, "", dtype=object)
+    filled = ~np.isnan(values)
+    display[filled] = [template.format(value) for value in (values[filled] / units).tolist()]
+
+    return display
+
+
+def format_raw_values(values: np.ndarray) -> np.ndarray:
+    """
+    Returns an array of strings with the shortest representation that round-trips each value, e.g., for pasting
+    into a spreadsheet at full precision, leaving missing values blank.
+    :param values:
+    :return:
+    """
+    display = np.full(values.shape, "", dtype=object)
+    filled = ~np.isnan(values)
+    display[filled] = [repr(value) for value in values[filled].tolist()]
+
+    return display
+
+
+def to_tsv(table) -> str:
+    """
+    Joins a 2D array or list of strings into tab-separated text, one line per row, as Excel expects on the
+    clipboard.
+    :param table:
+    :return:
+    """
+    if isinstance(table, np.ndarray):
+        table = table.tolist()
+
+    return "".join("\t".join(row) + "\r\n" for row in table)
 
 
 class TriangleView(QTableView):
@@ -75,8 +398,18 @@ class TriangleView(QTableView):
         # noinspection PyUnresolvedReferences
         self.copy_action.triggered.connect(self.copy_selection)
 
+        self.copy_raw_action = QAction("Copy &Values", self)
+        self.copy_raw_action.setShortcut(QKeySequence("Ctrl+Alt+c"))
+        self.copy_raw_action.setStatusTip("Copy selection to clipboard at full precision, without formatting.")
+        # noinspection PyUnresolvedReferences
+        self.copy_raw_action.triggered.connect(lambda: self.copy_selection(raw=True))
+
         self.installEventFilter(self)
 
+    def paintEvent(self, event):
+        with profiler.span("TriangleView.paintEvent", category="paint"):
+            super().paintEvent(event)
+
     def contextMenuEvent(self, event):
         """
         When right clicking a cell, activate context menu.
@@ -85,25 +418,26 @@ class TriangleView(QTableView):
         """
         menu = QMenu()
         menu.addAction(self.copy_action)
+        menu.addAction(self.copy_raw_action)
         menu.exec(event.globalPos())
 
-    def copy_selection(self):
-        """Method to copy selected values to clipboard so they can be pasted elsewhere, like Excel."""
-        selection = self.selectedIndexes()
-        if selection:
-            rows = sorted(index.row() for index in selection)
-            columns = sorted(index.column() for index in selection)
-            rowcount = rows[-1] - rows[0] + 1
-            colcount = columns[-1] - columns[0] + 1
-            table = [[''] * colcount for _ in range(rowcount)]
-            for index in selection:
-                row = index.row() - rows[0]
-                column = index.column() - columns[0]
-                table[row][column] = index.data()
-            stream = io.StringIO()
-            csv.writer(stream, delimiter='\t').writerows(table)
-            qApp.clipboard().setText(stream.getvalue())
-        return
+    def copy_selection(self, raw: bool = False):
+        """
+        Method to copy selected values to clipboard so they can be pasted elsewhere, like Excel.
+        :param raw: Copy the values at full precision, rather than as displayed.
+        :return:
+        """
+        model = self.model()
+        selection_model = self.selectionModel()
+        if model is None or selection_model is None:
+            return
+
+        ranges = list(selection_model.selection())
+        if not ranges:
+            return
+
+        with profiler.span("TriangleView.copy_selection", category="copy", raw=raw):
+            qApp.clipboard().setText(to_tsv(selection_table(model, ranges, raw=raw)))
 
     def eventFilter(self, source, event):
         """
@@ -116,4 +450,48 @@ class TriangleView(QTableView):
         if event.type() == QEvent.KeyPress and event.matches(QKeySequence.Copy):
             self.copy_selection()
             return True
+        # noinspection PyUnresolvedReferences
+        if event.type() == QEvent.KeyPress and QKeySequence(event.key() | int(event.modifiers())) == \
+                self.copy_raw_action.shortcut():
+            self.copy_selection(raw=True)
+            return True
         return super().eventFilter(source, event)
+
+
+def selection_table(model, ranges: list, raw: bool = False) -> np.ndarray:
+    """
+    Returns the cells of the bounding rectangle of a selection as strings, leaving cells outside the selection
+    blank. Models with raw_block and display_block have the rectangle sliced from their arrays in one go; the
+    cells of other models are read one by one through data().
+    :param model:
+    :param ranges: The QItemSelectionRanges of the selection.
+    :param raw: Values at full precision rather than display strings.
+    :return:
+    """
+    top = min(selection_range.top() for selection_range in ranges)
+    left = min(selection_range.left() for selection_range in ranges)
+    bottom = max(selection_range.bottom() for selection_range in ranges) + 1
+    right = max(selection_range.right() for selection_range in ranges) + 1
+
+    if hasattr(model, "raw_block"):
+        if raw:
+            table = format_raw_values(model.raw_block(top, left, bottom, right))
+        else:
+            table = np.array(model.display_block(top, left, bottom, right), dtype=object)
+    else:
+        table = np.array(
+            [[model.index(row, column).data() or "" for column in range(left, right)] for row in range(top, bottom)],
+            dtype=object
+        )
+
+    # A selection of several ranges, e.g., made with Ctrl, is not rectangular.
+    if len(ranges) > 1:
+        selected = np.zeros(table.shape, dtype=bool)
+        for selection_range in ranges:
+            selected[
+                selection_range.top() - top:selection_range.bottom() + 1 - top,
+                selection_range.left() - left:selection_range.right() + 1 - left
+            ] = True
+        table = np.where(selected, table, "")
+
+    return table
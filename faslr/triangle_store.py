@@ -0,0 +1,276 @@
+"""
+Persistence of triangles in the project database. A triangle is stored as a single binary block holding its
+dense values, plus JSON axis metadata, so that opening it is one row read followed by a zero-copy array view.
+"""
+import json
+import numpy as np
+import pandas as pd
+import zlib
+
+from schema import TriangleTable
+
+
+class ArrayTriangle:
+    """
+    Lightweight, read-only triangle backed by a NumPy array with axes (index, column, origin, development),
+    as in chainladder. It exposes the attributes that FASLR's models read from a chainladder Triangle, i.e.,
+    values, shape, kdims, vdims, odims, ddims and origin, without chainladder's construction overhead.
+    """
+    def __init__(
+            self,
+            values: np.ndarray,
+            key_labels: list,
+            keys: list,
+            columns: list,
+            origins: list,
+            origin_labels: list,
+            developments: list,
+            origin_grain: str = "Y",
+            development_grain: str = "Y",
+            is_cumulative: bool = True
+    ):
+        self.values = values
+        self.key_labels = list(key_labels)
+        self.kdims = np.array(keys, dtype=object).reshape(len(keys), len(self.key_labels))
+        self.vdims = np.array(columns, dtype=object)
+        self.odims = np.array(origins, dtype="datetime64[ns]")
+        self.origin_labels = list(origin_labels)
+        self.ddims = np.array(developments)
+        self.origin_grain = origin_grain
+        self.development_grain = development_grain
+        self.is_cumulative = is_cumulative
+
+    @classmethod
+    def from_triangle(cls, triangle):
+        """
+        Copies the values and axes of a chainladder triangle.
+        :param triangle:
+        :return:
+        """
+        if triangle.array_backend != 'numpy':
+            triangle = triangle.set_backend('numpy')
+
+        return cls(
+            values=np.ascontiguousarray(triangle.values, dtype=float),
+            key_labels=list(triangle.key_labels),
+            keys=triangle.kdims.tolist(),
+            columns=list(triangle.vdims),
+            origins=triangle.odims,
+            origin_labels=[str(origin) for origin in triangle.origin],
+            developments=[int(age) for age in triangle.ddims],
+            origin_grain=triangle.origin_grain,
+            development_grain=triangle.development_grain,
+            is_cumulative=bool(triangle.is_cumulative)
+        )
+
+    @classmethod
+    def from_metadata(cls, values: np.ndarray, metadata: dict):
+        """
+        Creates a triangle from its values and the output of axis_metadata.
+        :param values:
+        :param metadata:
+        :return:
+        """
+        return cls(values=values, **metadata)
+
+    def axis_metadata(self) -> dict:
+        """
+        Returns everything but the values, as JSON-serializable types.
+        :return:
+        """
+        return {
+            "key_labels": self.key_labels,
+            "keys": self.kdims.tolist(),
+            "columns": list(self.vdims),
+            "origins": [str(origin) for origin in self.odims.astype("datetime64[D]")],
+            "origin_labels": self.origin_labels,
+            "developments": [int(age) for age in self.ddims],
+            "origin_grain": self.origin_grain,
+            "development_grain": self.development_grain,
+            "is_cumulative": bool(self.is_cumulative)
+        }
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    @property
+    def origin(self) -> pd.Index:
+        return pd.Index(self.origin_labels, name='origin')
+
+    @property
+    def columns(self) -> list:
+        return list(self.vdims)
+
+    def to_frame(self, key=0, column=0) -> pd.DataFrame:
+        """
+        Returns one index key and column, given by position, as an origin by development DataFrame.
+        :param key:
+        :param column:
+        :return:
+        """
+        return pd.DataFrame(
+            self.values[key, column],
+            index=self.origin,
+            columns=self.ddims
+        )
+
+    def to_chainladder(self):
+        """
+        Rebuilds a chainladder Triangle, e.g., to fit one of chainladder's methods. Ages are converted back
+        into valuation dates at the end of each development period.
+        :return:
+        """
+        import chainladder as cl
+
+        key_index, column_index, origin_index, development_index = np.nonzero(~np.isnan(self.values))
+
+        origins = pd.DatetimeIndex(self.odims[origin_index])
+        ages = self.ddims[development_index].astype(int)
+        valuations = pd.DatetimeIndex(
+            [origin + pd.DateOffset(months=int(age)) for origin, age in zip(origins, ages)]
+        ) - pd.Timedelta(days=1)
+
+        frame = pd.DataFrame({'origin': origins, 'valuation': valuations})
+
+        for level, label in enumerate(self.key_labels):
+            frame[label] = self.kdims[key_index, level]
+
+        frame['column'] = self.vdims[column_index]
+        frame['value'] = self.values[key_index, column_index, origin_index, development_index]
+
+        # chainladder labels a triangle without an index as 'Total'.
+        index = None if self.key_labels == ['Total'] else self.key_labels
+
+        frame = frame.pivot_table(
+            index=(index or []) + ['origin', 'valuation'],
+            columns='column',
+            values='value',
+            aggfunc='sum'
+        ).reset_index()
+
+        triangle = cl.Triangle(
+            frame,
+            origin='origin',
+            development='valuation',
+            columns=list(self.vdims),
+            index=index,
+            cumulative=self.is_cumulative
+        )
+
+        # chainladder does not keep the order of the index keys, so restore it.
+        positions = {tuple(key): i for i, key in enumerate(triangle.kdims.tolist())}
+        order = [positions[tuple(key)] for key in self.kdims.tolist() if tuple(key) in positions]
+        if order != list(range(len(order))):
+            triangle = triangle.iloc[order]
+
+        return triangle
+
+
+def save_triangle(
+        session,
+        triangle,
+        name: str = None,
+        lob_id: int = None,
+        project_id: int = None,
+        compression: str = "none"
+) -> TriangleTable:
+    """
+    Adds a chainladder Triangle or an ArrayTriangle to the session as a new row of the triangle table. The
+    caller is responsible for committing. zlib compression makes the row smaller, at the cost of a copy when
+    it is loaded.
+    :param session:
+    :param triangle:
+    :param name:
+    :param lob_id:
+    :param project_id:
+    :param compression: 'none' or 'zlib'
+    :return:
+    """
+    if not isinstance(triangle, ArrayTriangle):
+        triangle = ArrayTriangle.from_triangle(triangle)
+
+    values = np.ascontiguousarray(triangle.values, dtype=float)
+    values_blob = values.tobytes()
+
+    if compression == "zlib":
+        values_blob = zlib.compress(values_blob, 1)
+    elif compression != "none":
+        raise ValueError("Unsupported compression: " + str(compression))
+
+    row = TriangleTable(
+        name=name,
+        lob_id=lob_id,
+        project_id=project_id,
+        dtype=values.dtype.str,
+        shape=json.dumps(list(values.shape)),
+        compression=compression,
+        values_blob=values_blob,
+        key_labels=json.dumps(triangle.key_labels),
+        keys=json.dumps(triangle.kdims.tolist()),
+        columns=json.dumps(list(triangle.vdims)),
+        origins=json.dumps([str(origin) for origin in triangle.odims.astype("datetime64[D]")]),
+        origin_labels=json.dumps(triangle.origin_labels),
+        developments=json.dumps([int(age) for age in triangle.ddims]),
+        origin_grain=triangle.origin_grain,
+        development_grain=triangle.development_grain,
+        is_cumulative=triangle.is_cumulative
+    )
+
+    session.add(row)
+
+    return row
+
+
+def load_triangle(session, triangle_id: int) -> ArrayTriangle:
+    """
+    Reads a triangle from the database. Uncompressed values are returned as a read-only view of the row's
+    bytes rather than a copy.
+    :param session:
+    :param triangle_id:
+    :return:
+    """
+    row = session.query(TriangleTable).filter(TriangleTable.triangle_id == triangle_id).one()
+
+    return triangle_from_row(row)
+
+
+def load_lob_triangle(session, lob_id: int):
+    """
+    Reads the triangle most recently saved for an LOB, as load_triangle does.
+    :param session:
+    :param lob_id:
+    :return: The name and ArrayTriangle of the row, or None if no triangle has been saved for the LOB.
+    """
+    row = session.query(TriangleTable).filter(
+        TriangleTable.lob_id == lob_id
+    ).order_by(
+        TriangleTable.triangle_id.desc()
+    ).first()
+
+    if row is None:
+        return None
+
+    return row.name, triangle_from_row(row)
+
+
+def triangle_from_row(row: TriangleTable) -> ArrayTriangle:
+    values_blob = row.values_blob
+
+    if row.compression == "zlib":
+        values_blob = zlib.decompress(values_blob)
+
+    values = np.frombuffer(values_blob, dtype=np.dtype(row.dtype)).reshape(json.loads(row.shape))
+
+    return ArrayTriangle(
+        values=values,
+        key_labels=json.loads(row.key_labels),
+        keys=json.loads(row.keys),
+        columns=json.loads(row.columns),
+        origins=json.loads(row.origins),
+        origin_labels=json.loads(row.origin_labels),
+        developments=json.loads(row.developments),
+        origin_grain=row.origin_grain,
+        development_grain=row.development_grain,
+        is_cumulative=row.is_cumulative
+    )
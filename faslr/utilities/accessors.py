@@ -1,3 +1,5 @@
+import numpy as np
+
 from typing import Type
 
 from chainladder import Triangle
@@ -9,8 +11,179 @@ def get_cell_scalar(
         age: int,
         column: str
 ) -> float:
+    # Slices the whole triangle for a single factor. When more than a handful of cells are needed,
+    # build a LinkRatioLookup once and query it instead.
     cell_scalar = triangle[triangle.origin == origin][
         (triangle.development >= age) & (triangle.development <= age+12)
         ][column].link_ratio.to_frame().squeeze()
 
     return cell_scalar
+
+
+def get_axis_labels(
+        triangle: Type[Triangle]
+) -> tuple:
+    """
+    Returns the labels of the four axes of a triangle, i.e., index, column, origin and development, in the
+    same order as the axes of triangle.values. Single-level index keys are returned as scalars, multi-level
+    ones as tuples. Origins are returned as strings, e.g., '1998', so that they match triangle.origin == '1998'.
+    :param triangle:
+    :return:
+    """
+    keys = [key[0] if len(key) == 1 else tuple(key) for key in triangle.kdims.tolist()]
+    columns = list(triangle.vdims)
+    origins = [str(origin) for origin in triangle.origin]
+    ages = [int(age) for age in triangle.ddims]
+
+    return keys, columns, origins, ages
+
+
+def get_link_ratio_matrix(
+        triangle: Type[Triangle],
+        keys: list = None,
+        columns: list = None,
+        origins: list = None,
+        ages: list = None
+) -> np.ndarray:
+    """
+    Returns the age-to-age factors of every index key and column of a triangle as a 4D array with axes
+    (index, column, origin, age) in one vectorized pass. The age axis is labeled by the starting age of each
+    factor, i.e., the 12-24 factor sits at age 12. Zero or missing cells yield NaN, as in Triangle.link_ratio.
+
+    Passing lists of labels restricts the result to the corresponding rectangular block, in the order given.
+    :param triangle:
+    :param keys:
+    :param columns:
+    :param origins:
+    :param ages:
+    :return:
+    """
+    if triangle.array_backend != 'numpy':
+        triangle = triangle.set_backend('numpy')
+
+    if not triangle.is_cumulative:
+        triangle = triangle.incr_to_cum()
+
+    values = np.array(triangle.values, dtype=float)
+    values[values == 0] = np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        link_ratios = values[..., 1:] / values[..., :-1]
+
+    if keys is None and columns is None and origins is None and ages is None:
+        return link_ratios
+
+    all_keys, all_columns, all_origins, all_ages = get_axis_labels(triangle)
+
+    return link_ratios[
+        np.ix_(
+            _get_positions(all_keys, keys),
+            _get_positions(all_columns, columns),
+            _get_positions(all_origins, origins, str),
+            _get_positions(all_ages[:-1], ages, int)
+        )
+    ]
+
+
+class LinkRatioLookup:
+    """
+    Holds the full link-ratio matrix of a triangle along with label-to-position dictionaries, so that
+    individual factors can be looked up in constant time without slicing the triangle again.
+
+    lookup = LinkRatioLookup(us_auto)
+    lookup.get(origin="1998", age=12, column="Reported Claims")
+    """
+    def __init__(self, triangle: Type[Triangle]):
+        self.keys, self.columns, self.origins, ages = get_axis_labels(triangle)
+
+        # The last age has no factor attached to it.
+        self.ages = ages[:-1]
+
+        self.values = get_link_ratio_matrix(triangle)
+
+        self._key_positions = {key: i for i, key in enumerate(self.keys)}
+        self._column_positions = {column: i for i, column in enumerate(self.columns)}
+        self._origin_positions = {origin: i for i, origin in enumerate(self.origins)}
+        self._age_positions = {age: i for i, age in enumerate(self.ages)}
+
+    def get(
+            self,
+            origin,
+            age: int,
+            column: str = None,
+            key=None
+    ) -> float:
+        """
+        Returns a single age-to-age factor. The column and index key may be omitted when the triangle only
+        has one of them.
+        :param origin:
+        :param age:
+        :param column:
+        :param key:
+        :return:
+        """
+        return float(
+            self.values[
+                self._get_key_position(key),
+                self._get_column_position(column),
+                self._origin_positions[str(origin)],
+                self._age_positions[int(age)]
+            ]
+        )
+
+    def __getitem__(self, item) -> float:
+        return self.get(*item)
+
+    def block(
+            self,
+            origins: list = None,
+            ages: list = None,
+            column: str = None,
+            key=None
+    ) -> np.ndarray:
+        """
+        Returns a 2D origin by age block of factors for one column and index key, i.e., what a link-ratio
+        exhibit displays. Omitting origins or ages returns all of them.
+        :param origins:
+        :param ages:
+        :param column:
+        :param key:
+        :return:
+        """
+        matrix = self.values[self._get_key_position(key), self._get_column_position(column)]
+
+        return matrix[
+            np.ix_(
+                _get_positions(self.origins, origins, str, self._origin_positions),
+                _get_positions(self.ages, ages, int, self._age_positions)
+            )
+        ]
+
+    def _get_key_position(self, key) -> int:
+        if key is None and len(self.keys) == 1:
+            return 0
+        return self._key_positions[key]
+
+    def _get_column_position(self, column) -> int:
+        if column is None and len(self.columns) == 1:
+            return 0
+        return self._column_positions[column]
+
+
+def _get_positions(
+        labels: list,
+        selection: list = None,
+        cast=None,
+        positions: dict = None
+) -> list:
+    # Translates a list of axis labels into array positions. No selection means the whole axis.
+    if selection is None:
+        return list(range(len(labels)))
+
+    if positions is None:
+        positions = {label: i for i, label in enumerate(labels)}
+
+    if cast is not None:
+        selection = [cast(label) for label in selection]
+
+    return [positions[label] for label in selection]
@@ -0,0 +1,57 @@
+"""
+Runs slow work, such as database queries, on a thread pool so that the GUI thread stays responsive. Results
+are posted back to the GUI thread through Qt signals.
+"""
+import inspect
+import logging
+
+from PyQt5.QtCore import (
+    QObject,
+    QRunnable,
+    pyqtSignal
+)
+
+
+class WorkerSignals(QObject):
+    """
+    Signals emitted by a Worker. Since this object is created on the GUI thread, slots connected to it run
+    on the GUI thread even though the signals are emitted from the pool.
+    """
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+    partial_result = pyqtSignal(object)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Calls fn(*args, **kwargs) on a pool thread. If fn accepts a progress_callback argument, it is given a
+    function taking (completed, total) that emits the progress signal. Likewise, if fn accepts a
+    partial_result_callback argument, it is given a function that emits each intermediate result, e.g., one
+    result per LOB, so that they can be displayed before fn returns.
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super(Worker, self).__init__()
+
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+        if "progress_callback" in inspect.signature(fn).parameters:
+            self.kwargs["progress_callback"] = self.signals.progress.emit
+
+        if "partial_result_callback" in inspect.signature(fn).parameters:
+            self.kwargs["partial_result_callback"] = self.signals.partial_result.emit
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as error:
+            logging.exception("Background task " + self.fn.__name__ + " failed.")
+            self.signals.error.emit(error)
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()